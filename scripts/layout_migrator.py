@@ -0,0 +1,521 @@
+#!/usr/bin/env python3
+"""
+ログ・レポートの保存レイアウトを移行する汎用マイグレーター
+
+移行対象を先にマニフェスト(JSONL)として書き出し、完了した項目をジャーナルに
+記録しながら並列に処理します。途中で中断しても、同じコマンドを再実行すれば
+マニフェストとジャーナルから続きを再開します。
+
+- 同一デバイス内の移動: os.rename によるアトミックな移動
+- デバイスをまたぐ移動: 一時ファイルへコピー → SHA-256で検証 → os.replace
+- フォーマット変換(例: JSONL → gzip圧縮セグメント): 行単位のストリーミング変換 → 検証
+
+Usage:
+    python scripts/layout_migrator.py run monthly-folders [--dry-run] [--workers N]
+    python scripts/layout_migrator.py run jsonl-gzip --dest archive/logs
+    python scripts/layout_migrator.py status monthly-folders
+    python scripts/layout_migrator.py bench --files 100000
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import errno
+import fnmatch
+import shutil
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Set
+
+MANIFEST_DIR_NAME = ".migrations"
+COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+JOURNAL_FLUSH_INTERVAL = 500  # 件ごとにジャーナルをfsync
+
+
+class Migration:
+    """
+    移行の定義
+
+    plan() で移行項目 {"op", "src", "dst", "size"} を列挙する。
+    op は "move"(移動) または "transform"(ストリーミング変換)。
+    """
+
+    name = ""
+    description = ""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def plan(self) -> Iterator[Dict]:
+        raise NotImplementedError
+
+
+def extract_date_from_filename(filename: str) -> str | None:
+    """
+    ファイル名から日付(YYYY-MM-DD)を抽出
+
+    入力: filename - ファイル名
+    出力: YYYY-MM-DD形式の日付、見つからない場合はNone
+    """
+    match = re.search(r"(\d{4}-\d{2}-\d{2})", filename)
+    if match:
+        return match.group(1)
+    return None
+
+
+def get_year_month_from_date(date_str: str) -> tuple[str, str]:
+    """
+    YYYY-MM-DD形式の日付から年と月を取得
+
+    入力: date_str - YYYY-MM-DD形式の日付
+    出力: (year, month) - 年(YYYY)と月(MM)のタプル
+    """
+    date = datetime.strptime(date_str, "%Y-%m-%d")
+    return date.strftime("%Y"), date.strftime("%m")
+
+
+class MonthlyFoldersMigration(Migration):
+    """logs/ と reports/daily/ 直下のファイルを YYYY/MM/ フォルダへ移動"""
+
+    name = "monthly-folders"
+    description = "logs/ と reports/daily/ のファイルを月ごとのフォルダに移行"
+
+    # (ディレクトリ, ファイルパターン)
+    SOURCES = [
+        ("logs", "activity_*.jsonl"),
+        ("logs", "hourly_summary_*.jsonl"),
+        ("reports/daily", "*.md"),
+    ]
+
+    def plan(self) -> Iterator[Dict]:
+        for dir_name, pattern in self.SOURCES:
+            base_dir = self.root / dir_name
+            if not base_dir.exists():
+                continue
+            with os.scandir(base_dir) as entries:
+                for entry in entries:
+                    if not fnmatch.fnmatch(entry.name, pattern) or not entry.is_file():
+                        continue
+                    date_str = extract_date_from_filename(entry.name)
+                    if not date_str:
+                        print(f"⚠ Skipping {entry.name} (no date found)")
+                        continue
+                    year, month = get_year_month_from_date(date_str)
+                    yield {
+                        "op": "move",
+                        "src": str(base_dir / entry.name),
+                        "dst": str(base_dir / year / month / entry.name),
+                        "size": entry.stat().st_size,
+                    }
+
+
+class JsonlGzipMigration(Migration):
+    """
+    過去月の logs/YYYY/MM/*.jsonl を gzip圧縮セグメントとして別の場所へ移行(アーカイブ用)
+
+    レポート生成は非圧縮のJSONLを読むため、当月分は対象外とする。
+    移行元の activity_*.jsonl は削除されるため、ログを直接読む検索インデックス・
+    セッション・クエリ(query_service)・ロールアップの作り直し(rollups.py rebuild)からは
+    アーカイブした日が見えなくなる。作成済みのロールアップ・ダイジェストは残る。
+    """
+
+    name = "jsonl-gzip"
+    description = "過去月のJSONLログをgzip圧縮してアーカイブ先へ移行"
+
+    def __init__(self, root: Path, dest: Path):
+        super().__init__(root)
+        self.dest = dest
+
+    def plan(self) -> Iterator[Dict]:
+        logs_dir = self.root / "logs"
+        current_month = datetime.now().strftime("%Y/%m")
+        for path in sorted(logs_dir.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/*.jsonl")):
+            # ロールアップの辞書など、ログ以外の派生ファイルは対象外
+            if not path.name.startswith(("activity_", "hourly_summary_")):
+                continue
+            month_dir = path.parent.relative_to(logs_dir)
+            if month_dir.as_posix() >= current_month:
+                continue
+            yield {
+                "op": "transform",
+                "transform": "gzip",
+                "src": str(path),
+                "dst": str(self.dest / month_dir / f"{path.name}.gz"),
+                "size": path.stat().st_size,
+            }
+
+
+MIGRATIONS = {
+    MonthlyFoldersMigration.name: MonthlyFoldersMigration,
+    JsonlGzipMigration.name: JsonlGzipMigration,
+}
+
+
+def sha256_file(path: Path) -> str:
+    """
+    ファイルのSHA-256を計算
+
+    入力: path - ファイルパス
+    出力: 16進数のハッシュ文字列
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_verified(src: Path, dst: Path) -> None:
+    """
+    一時ファイルへコピーしてSHA-256を検証し、dstへアトミックに配置
+
+    入力:
+        src - コピー元
+        dst - コピー先
+    """
+    src_digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.", suffix=".part")
+    try:
+        with open(src, "rb") as fin, os.fdopen(fd, "wb") as fout:
+            for chunk in iter(lambda: fin.read(COPY_CHUNK_SIZE), b""):
+                src_digest.update(chunk)
+                fout.write(chunk)
+            fout.flush()
+            os.fsync(fout.fileno())
+        if sha256_file(Path(tmp_path)) != src_digest.hexdigest():
+            raise IOError(f"Checksum mismatch while copying {src}")
+        shutil.copystat(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except Exception:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def transform_gzip(src: Path, dst: Path) -> None:
+    """
+    JSONLを行単位でストリーミングしながらgzip圧縮し、展開結果のSHA-256で検証
+
+    入力:
+        src - 変換元のJSONL
+        dst - 変換先の .jsonl.gz
+    """
+    src_digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.", suffix=".part")
+    try:
+        with open(src, "rb") as fin, os.fdopen(fd, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as fout:
+                for line in fin:
+                    src_digest.update(line)
+                    fout.write(line)
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        out_digest = hashlib.sha256()
+        with gzip.open(tmp_path, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                out_digest.update(chunk)
+        if out_digest.hexdigest() != src_digest.hexdigest():
+            raise IOError(f"Checksum mismatch while compressing {src}")
+        os.replace(tmp_path, dst)
+    except Exception:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+TRANSFORMS = {"gzip": transform_gzip}
+
+
+def apply_item(item: Dict) -> str:
+    """
+    移行項目を1件処理(再実行しても安全)
+
+    入力: item - マニフェストの1項目
+    出力: 処理結果 ("renamed" / "copied" / "transformed" / "skipped")
+    """
+    src = Path(item["src"])
+    dst = Path(item["dst"])
+
+    if not src.exists():
+        # 前回の実行で処理済み(ジャーナル記録前にクラッシュした場合)
+        if dst.exists():
+            return "skipped"
+        raise FileNotFoundError(f"Source missing and destination not found: {src}")
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+
+    if item["op"] == "transform":
+        TRANSFORMS[item["transform"]](src, dst)
+        src.unlink()
+        return "transformed"
+
+    if dst.exists():
+        # 同一内容なら移動済みとみなし、異なる場合は上書きしない
+        if dst.stat().st_size == src.stat().st_size and sha256_file(dst) == sha256_file(src):
+            src.unlink()
+            return "skipped"
+        raise FileExistsError(f"Destination already exists with different content: {dst}")
+
+    try:
+        os.rename(src, dst)
+        return "renamed"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    # デバイスをまたぐ場合はコピーして検証してから元ファイルを削除
+    copy_verified(src, dst)
+    src.unlink()
+    return "copied"
+
+
+class MigrationRunner:
+    """マニフェストとジャーナルを使って移行を実行・再開する"""
+
+    def __init__(self, migration: Migration, state_dir: Path):
+        self.migration = migration
+        self.state_dir = state_dir
+        self.manifest_path = state_dir / f"{migration.name}.manifest.jsonl"
+        self.journal_path = state_dir / f"{migration.name}.journal"
+
+    def build_manifest(self) -> int:
+        """
+        移行項目を列挙してマニフェストを作成
+
+        作成済みの場合は既存の項目(ID)をそのまま使い、中断後に増えた移行元だけを
+        新しいIDで追記する。
+
+        出力: マニフェストの項目数
+        """
+        items: List[Dict] = []
+        if self.manifest_path.exists():
+            items = self.load_manifest()
+        known = {item["src"] for item in items}
+        next_id = max((item["id"] for item in items), default=-1) + 1
+
+        added = []
+        for item in self.migration.plan():
+            if item["src"] in known:
+                continue
+            added.append({"id": next_id, **item})
+            next_id += 1
+        if items and added:
+            print(f"Resuming: {len(added)} new item(s) found since the manifest was created")
+        if self.manifest_path.exists() and not added:
+            return len(items)
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for item in items + added:
+                json.dump(item, f, ensure_ascii=False)
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        # 書き切ったマニフェストだけを有効にする
+        os.replace(tmp_path, self.manifest_path)
+        return len(items) + len(added)
+
+    def load_manifest(self) -> List[Dict]:
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def load_journal(self) -> Set[int]:
+        if not self.journal_path.exists():
+            return set()
+        done = set()
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                # 書きかけの最終行は無視する
+                if line.endswith("\n") and line.strip().isdigit():
+                    done.add(int(line))
+        return done
+
+    def status(self) -> Dict[str, int]:
+        """
+        マニフェストとジャーナルから進捗を取得
+
+        出力: {"total": 件数, "done": 完了件数}
+        """
+        if not self.manifest_path.exists():
+            return {"total": 0, "done": 0}
+        return {"total": len(self.load_manifest()), "done": len(self.load_journal())}
+
+    def run(self, workers: int = 8, dry_run: bool = False, limit: int | None = None) -> Dict[str, int]:
+        """
+        未完了の移行項目を並列に処理
+
+        入力:
+            workers - 並列数
+            dry_run - Trueの場合は移行予定を表示するのみ
+            limit - 今回処理する最大件数(動作確認・ベンチマーク用)
+        出力: 処理結果ごとの件数
+        """
+        if dry_run:
+            count = 0
+            for item in self.migration.plan():
+                print(f"[DRY RUN] {item['src']} → {item['dst']}")
+                count += 1
+            return {"planned": count}
+
+        total = self.build_manifest()
+        done = self.load_journal()
+        pending = [item for item in self.load_manifest() if item["id"] not in done]
+        if limit is not None:
+            pending = pending[:limit]
+
+        print(f"Manifest: {total} item(s), {len(done)} already done, {len(pending)} to process")
+
+        counts: Dict[str, int] = {}
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(apply_item, item): item for item in pending}
+                for i, future in enumerate(as_completed(futures), 1):
+                    item = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"✗ {item['src']}: {e}")
+                        counts["failed"] = counts.get("failed", 0) + 1
+                        continue
+                    counts[result] = counts.get(result, 0) + 1
+                    journal.write(f"{item['id']}\n")
+                    if i % JOURNAL_FLUSH_INTERVAL == 0:
+                        journal.flush()
+                        os.fsync(journal.fileno())
+            journal.flush()
+            os.fsync(journal.fileno())
+
+        if not counts.get("failed") and len(self.load_journal()) >= total:
+            # 全件完了したら状態ファイルを片付ける
+            self.manifest_path.unlink(missing_ok=True)
+            self.journal_path.unlink(missing_ok=True)
+
+        return counts
+
+
+def create_migration(name: str, root: Path, dest: str | None) -> Migration:
+    """
+    移行名からMigrationを生成
+
+    入力:
+        name - 移行名
+        root - プロジェクトルート
+        dest - 移行先(jsonl-gzip用)
+    出力: Migration
+    """
+    if name == JsonlGzipMigration.name:
+        if not dest:
+            print("Error: --dest is required for jsonl-gzip")
+            sys.exit(1)
+        return JsonlGzipMigration(root, Path(dest))
+    return MIGRATIONS[name](root)
+
+
+def run_benchmark(num_files: int, workers: int) -> None:
+    """
+    合成したファイルツリーで monthly-folders 移行の性能を計測
+
+    前半を処理したところで中断し、残りを再開するまでを計測する。
+
+    入力:
+        num_files - 生成するファイル数
+        workers - 並列数
+    """
+    with tempfile.TemporaryDirectory(prefix="maclogger_migrate_bench_") as tmp:
+        root = Path(tmp)
+        logs_dir = root / "logs"
+        logs_dir.mkdir()
+
+        start = time.perf_counter()
+        line = json.dumps({"timestamp": "2025-01-01T00:00:00", "application": "Bench", "ocr_text": "x" * 150})
+        for i in range(num_files):
+            day = datetime.fromordinal(datetime(2023, 1, 1).toordinal() + i % 1095)
+            path = logs_dir / f"activity_{day.strftime('%Y-%m-%d')}-{i:06d}.jsonl"
+            path.write_text(line + "\n", encoding="utf-8")
+        print(f"Generated {num_files} files in {time.perf_counter() - start:.2f}s")
+
+        runner = MigrationRunner(MonthlyFoldersMigration(root), logs_dir / MANIFEST_DIR_NAME)
+
+        start = time.perf_counter()
+        total = runner.build_manifest()
+        plan_time = time.perf_counter() - start
+        print(f"Manifest:   {total} items in {plan_time:.2f}s")
+
+        start = time.perf_counter()
+        runner.run(workers=workers, limit=total // 2)
+        first_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        counts = runner.run(workers=workers)
+        resume_time = time.perf_counter() - start
+
+        apply_time = first_time + resume_time
+        print(f"First half: {first_time:.2f}s")
+        print(f"Resume:     {resume_time:.2f}s {counts}")
+        print(f"Throughput: {total / apply_time:,.0f} files/s ({workers} workers)")
+
+
+def main() -> None:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ログ・レポートの保存レイアウトを移行")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser(
+        "run",
+        help="移行を実行(中断後の再実行で続きから再開)",
+        description=(
+            "移行を実行します。jsonl-gzip は移行元の activity_*.jsonl を削除するため、"
+            "アーカイブした日は検索インデックス・セッション・query_service・"
+            "rollups.py rebuild の対象から外れます。"
+        ),
+    )
+    run_parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    run_parser.add_argument("--root", default=".", help="プロジェクトルート (デフォルト: カレントディレクトリ)")
+    run_parser.add_argument("--dest", help="移行先ディレクトリ (jsonl-gzip用)")
+    run_parser.add_argument("--workers", type=int, default=8, help="並列数")
+    run_parser.add_argument("--dry-run", action="store_true", help="実際には移動せず、移行予定を表示するのみ")
+
+    status_parser = subparsers.add_parser("status", help="中断中の移行の進捗を表示")
+    status_parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    status_parser.add_argument("--root", default=".")
+
+    bench_parser = subparsers.add_parser("bench", help="合成ファイルツリーで性能を計測")
+    bench_parser.add_argument("--files", type=int, default=100_000)
+    bench_parser.add_argument("--workers", type=int, default=8)
+
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_benchmark(args.files, args.workers)
+        return
+
+    root = Path(args.root)
+    state_dir = root / "logs" / MANIFEST_DIR_NAME
+    migration = create_migration(args.migration, root, getattr(args, "dest", None))
+    runner = MigrationRunner(migration, state_dir)
+
+    if args.command == "status":
+        progress = runner.status()
+        if not progress["total"]:
+            print(f"No migration in progress for {migration.name}.")
+        else:
+            print(f"{migration.name}: {progress['done']}/{progress['total']} done")
+        return
+
+    print(f"=== {migration.description} ===")
+    counts = runner.run(workers=args.workers, dry_run=args.dry_run)
+    print(f"\nResult: {counts}")
+    if counts.get("failed"):
+        print("Some items failed. Fix the errors above and re-run to resume.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Capture Queue for Deferred OCR
+
+OCR遅延モードで使用する、ディスク上の上限付きキャプチャキューです。
+キャプチャ画像(JPEG)とウィンドウ情報のメタデータを logs/ocr_queue/ に保存し、
+上限を超えた場合は古いものから破棄し、ログの該当レコードに ocr_dropped を付けます。
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from dotenv import load_dotenv
+
+from log_store import LOGS_DIR, log_write_lock, read_jsonl, write_jsonl_atomic
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+QUEUE_DIR = LOGS_DIR / "ocr_queue"
+IMAGE_SUFFIX = ".jpg"
+META_SUFFIX = ".json"
+MAX_QUEUE_ITEMS = int(os.getenv("OCR_QUEUE_MAX_ITEMS", "1440"))  # 約1日分
+MAX_QUEUE_BYTES = int(os.getenv("OCR_QUEUE_MAX_MB", "500")) * 1024 * 1024
+ORPHAN_GRACE_SECONDS = 600
+MAX_OCR_ATTEMPTS = 3  # OCRが例外で失敗した場合に再試行する回数
+
+
+def new_capture_id(now: datetime) -> str:
+    """
+    キャプチャIDを生成(時系列でソート可能な文字列)
+
+    入力: now - キャプチャ時刻
+    出力: キャプチャID (例: 20260105-143000-123456)
+    """
+    return now.strftime("%Y%m%d-%H%M%S-%f")
+
+
+def get_image_path(capture_id: str) -> Path:
+    """
+    キャプチャIDに対応する画像の保存先を取得
+
+    入力: capture_id - キャプチャID
+    出力: 画像ファイルパス
+    """
+    QUEUE_DIR.mkdir(parents=True, exist_ok=True)
+    return QUEUE_DIR / f"{capture_id}{IMAGE_SUFFIX}"
+
+
+def enqueue(capture_id: str, metadata: Dict) -> List[str]:
+    """
+    キャプチャ済み画像のメタデータをキューに登録
+
+    画像は get_image_path() の場所に保存済みであること。
+    メタデータの書き込みが完了した時点でキューに登録されたとみなす。
+
+    入力:
+        capture_id - キャプチャID
+        metadata - ウィンドウ情報やログファイルパスなど
+    出力: 上限超過により破棄されたキャプチャIDのリスト
+    """
+    meta_path = QUEUE_DIR / f"{capture_id}{META_SUFFIX}"
+    tmp_path = meta_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"capture_id": capture_id, **metadata}, f, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+
+    return enforce_limits()
+
+
+def read_metadata(meta_path: Path) -> Optional[Dict]:
+    """
+    メタデータファイルを読み込み
+
+    入力: meta_path - メタデータファイル
+    出力: メタデータ、読めない場合はNone
+    """
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def list_pending() -> List[Dict]:
+    """
+    未処理のキャプチャを古い順に取得
+
+    出力: メタデータのリスト(画像が存在するもののみ)
+    """
+    if not QUEUE_DIR.exists():
+        return []
+
+    pending = []
+    lost = []
+    for meta_path in sorted(QUEUE_DIR.glob(f"*{META_SUFFIX}")):
+        image_path = meta_path.with_suffix(IMAGE_SUFFIX)
+        metadata = read_metadata(meta_path)
+        if metadata is None:
+            continue
+        if not image_path.exists():
+            # 画像が失われている場合はメタデータだけ残っても処理できない
+            meta_path.unlink(missing_ok=True)
+            lost.append(metadata)
+            continue
+        metadata["image_path"] = str(image_path)
+        pending.append(metadata)
+
+    if lost:
+        mark_dropped(lost)
+    return pending
+
+
+def record_failure(metadata: Dict) -> bool:
+    """
+    OCRの失敗を記録し、上限回数に達したらキューから破棄
+
+    入力: metadata - list_pending() の要素
+    出力: 破棄した場合はTrue(まだ再試行する場合はFalse)
+    """
+    capture_id = metadata["capture_id"]
+    attempts = metadata.get("ocr_attempts", 0) + 1
+    if attempts >= MAX_OCR_ATTEMPTS:
+        complete(capture_id)
+        mark_dropped([metadata])
+        return True
+
+    meta_path = QUEUE_DIR / f"{capture_id}{META_SUFFIX}"
+    tmp_path = meta_path.with_suffix(".tmp")
+    saved = {key: value for key, value in metadata.items() if key != "image_path"}
+    saved["ocr_attempts"] = attempts
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(saved, f, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+    return False
+
+
+def mark_dropped(items: List[Dict]) -> int:
+    """
+    OCRされずに破棄したキャプチャのログレコードに ocr_dropped を付ける
+
+    ocr_pending のまま残らないようにする。log_write_lock を保持していない状態で呼び出すこと。
+
+    入力: items - 破棄したキャプチャのメタデータ
+    出力: 更新したレコード数
+    """
+    by_file: Dict[str, Set[str]] = {}
+    for item in items:
+        if item.get("log_file"):
+            by_file.setdefault(item["log_file"], set()).add(item["capture_id"])
+
+    updated = 0
+    for log_file, capture_ids in by_file.items():
+        try:
+            with log_write_lock():
+                entries = read_jsonl(Path(log_file))
+                changed = 0
+                for entry in entries:
+                    if entry.get("capture_id") in capture_ids and entry.get("ocr_pending"):
+                        entry.pop("ocr_pending", None)
+                        entry["ocr_dropped"] = True
+                        changed += 1
+                if changed:
+                    write_jsonl_atomic(Path(log_file), entries)
+            updated += changed
+        except Exception as e:
+            print(f"Error marking dropped captures in {log_file}: {e}")
+    return updated
+
+
+def complete(capture_id: str) -> None:
+    """
+    処理済みのキャプチャをキューから削除
+
+    入力: capture_id - キャプチャID
+    """
+    (QUEUE_DIR / f"{capture_id}{IMAGE_SUFFIX}").unlink(missing_ok=True)
+    (QUEUE_DIR / f"{capture_id}{META_SUFFIX}").unlink(missing_ok=True)
+
+
+def enforce_limits() -> List[str]:
+    """
+    キューの件数・容量の上限を超えた分を古い順に破棄
+
+    メタデータのない古い画像(登録途中でクラッシュしたもの)も削除する。
+    同じサイクルで登録待ちの画像を消さないよう、作成直後のものは残す。
+
+    出力: 破棄されたキャプチャIDのリスト
+    """
+    if not QUEUE_DIR.exists():
+        return []
+
+    orphan_cutoff = time.time() - ORPHAN_GRACE_SECONDS
+    for image_path in QUEUE_DIR.glob(f"*{IMAGE_SUFFIX}"):
+        if image_path.with_suffix(META_SUFFIX).exists():
+            continue
+        try:
+            if image_path.stat().st_mtime < orphan_cutoff:
+                image_path.unlink(missing_ok=True)
+        except OSError:
+            continue
+
+    # 登録済み(メタデータあり)のものだけを破棄の対象にする
+    items = []
+    total_bytes = 0
+    for meta_path in sorted(QUEUE_DIR.glob(f"*{META_SUFFIX}")):
+        try:
+            size = meta_path.with_suffix(IMAGE_SUFFIX).stat().st_size
+        except OSError:
+            continue
+        items.append((meta_path, size))
+        total_bytes += size
+
+    dropped = []
+    while items and (len(items) > MAX_QUEUE_ITEMS or total_bytes > MAX_QUEUE_BYTES):
+        meta_path, size = items.pop(0)
+        metadata = read_metadata(meta_path) or {"capture_id": meta_path.stem}
+        complete(meta_path.stem)
+        total_bytes -= size
+        dropped.append(metadata)
+
+    if dropped:
+        print(f"OCR queue limit reached. Dropped {len(dropped)} oldest capture(s).")
+        mark_dropped(dropped)
+    return [item["capture_id"] for item in dropped]
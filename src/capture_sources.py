@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Capture Sources
+
+1サイクルでキャプチャする対象(ウィンドウ・ディスプレイ)の列挙と、
+複数対象の並列キャプチャ処理を提供します。
+
+列挙は CaptureSource を実装したクラスが担当するため、
+実機のQuartzの代わりに任意のウィンドウ一覧を返すソースを差し替えられます。
+"""
+
+import sys
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Configuration
+SYSTEM_OWNERS = {"Window Server", "Dock", "SystemUIServer", "Control Center"}
+MIN_WINDOW_SIZE = 50  # px。これより小さいウィンドウ(ツールチップ等)は除外
+
+
+@dataclass
+class CaptureTarget:
+    """
+    キャプチャ対象1件
+
+    kind: "window" または "display"
+    target_id: ウィンドウならCGWindowID、ディスプレイなら screencapture -D の番号
+    """
+
+    kind: str
+    target_id: str
+    application: str
+    window_title: str
+
+
+class CaptureSource:
+    """キャプチャ対象を列挙するインターフェース"""
+
+    def list_targets(self) -> List[CaptureTarget]:
+        """
+        今回のサイクルでキャプチャする対象を前面から順に返す
+
+        出力: CaptureTargetのリスト
+        """
+        raise NotImplementedError
+
+
+# Quartzでオンスクリーンのウィンドウとディスプレイ一覧をJSONで出力するスクリプト
+_QUARTZ_SCRIPT = """
+import json
+import Quartz
+
+window_list = Quartz.CGWindowListCopyWindowInfo(
+    Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements,
+    Quartz.kCGNullWindowID
+)
+windows = []
+for window in window_list:
+    if window.get(Quartz.kCGWindowLayer, 999) != 0:
+        continue
+    bounds = window.get(Quartz.kCGWindowBounds, {})
+    windows.append({
+        "id": str(window.get(Quartz.kCGWindowNumber, "")),
+        "owner": window.get(Quartz.kCGWindowOwnerName, "") or "",
+        "name": window.get(Quartz.kCGWindowName, "") or "",
+        "x": bounds.get("X", 0), "y": bounds.get("Y", 0),
+        "width": bounds.get("Width", 0), "height": bounds.get("Height", 0),
+    })
+
+displays = []
+err, display_ids, count = Quartz.CGGetActiveDisplayList(16, None, None)
+for index, display_id in enumerate(display_ids[:count]):
+    rect = Quartz.CGDisplayBounds(display_id)
+    displays.append({
+        "index": index + 1,
+        "x": rect.origin.x, "y": rect.origin.y,
+        "width": rect.size.width, "height": rect.size.height,
+    })
+
+print(json.dumps({"windows": windows, "displays": displays}))
+"""
+
+
+def query_screen_layout() -> Dict[str, List[Dict]]:
+    """
+    Quartzからオンスクリーンのウィンドウ(前面順)とディスプレイ一覧を取得
+
+    出力: {"windows": [...], "displays": [...]}、取得失敗時は空リスト
+    """
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", _QUARTZ_SCRIPT],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        if result.returncode == 0 and result.stdout.strip():
+            return json.loads(result.stdout)
+    except Exception as e:
+        print(f"Error querying screen layout: {e}")
+
+    return {"windows": [], "displays": []}
+
+
+def filter_user_windows(windows: List[Dict]) -> List[Dict]:
+    """
+    システムUIと小さすぎるウィンドウを除外
+
+    入力: windows - query_screen_layout() のウィンドウ一覧
+    出力: ユーザーのアプリケーションウィンドウのみのリスト(順序は維持)
+    """
+    return [
+        w
+        for w in windows
+        if w["owner"] not in SYSTEM_OWNERS
+        and w["width"] >= MIN_WINDOW_SIZE
+        and w["height"] >= MIN_WINDOW_SIZE
+    ]
+
+
+def find_top_window_on_display(display: Dict, windows: List[Dict]) -> Optional[Dict]:
+    """
+    ディスプレイ上で最前面にあるウィンドウを取得(ウィンドウ中心点で判定)
+
+    入力:
+        display - ディスプレイ情報
+        windows - 前面順のウィンドウ一覧
+    出力: ウィンドウ情報、見つからない場合はNone
+    """
+    for w in windows:
+        center_x = w["x"] + w["width"] / 2
+        center_y = w["y"] + w["height"] / 2
+        if (
+            display["x"] <= center_x < display["x"] + display["width"]
+            and display["y"] <= center_y < display["y"] + display["height"]
+        ):
+            return w
+    return None
+
+
+class VisibleWindowsSource(CaptureSource):
+    """前面から上位N個の可視ウィンドウをキャプチャ対象とするソース"""
+
+    def __init__(self, max_windows: int = 3):
+        self.max_windows = max_windows
+
+    def list_targets(self) -> List[CaptureTarget]:
+        windows = filter_user_windows(query_screen_layout()["windows"])
+        return [
+            CaptureTarget(
+                kind="window",
+                target_id=w["id"],
+                application=w["owner"],
+                window_title=w["name"],
+            )
+            for w in windows[: self.max_windows]
+        ]
+
+
+class DisplaySource(CaptureSource):
+    """接続中の全ディスプレイをキャプチャ対象とするソース"""
+
+    def list_targets(self) -> List[CaptureTarget]:
+        layout = query_screen_layout()
+        windows = filter_user_windows(layout["windows"])
+        targets = []
+        for display in layout["displays"]:
+            # ディスプレイ単位のレコードには、そのディスプレイの最前面ウィンドウの情報を付ける
+            top = find_top_window_on_display(display, windows)
+            if top is None:
+                # 最前面モードでアプリ不明のサイクルを記録しないのと同様に、
+                # ユーザーウィンドウのないディスプレイ(デスクトップのみ)は対象にしない
+                continue
+            targets.append(
+                CaptureTarget(
+                    kind="display",
+                    target_id=str(display["index"]),
+                    application=top["owner"],
+                    window_title=top["name"],
+                )
+            )
+        return targets
+
+
+def create_capture_source(mode: str, max_windows: int = 3) -> Optional[CaptureSource]:
+    """
+    キャプチャモード名からソースを生成
+
+    入力:
+        mode - "windows" または "displays"
+        max_windows - windowsモードでキャプチャするウィンドウ数
+    出力: CaptureSource、未知のモードの場合はNone
+    """
+    if mode == "windows":
+        return VisibleWindowsSource(max_windows)
+    if mode == "displays":
+        return DisplaySource()
+    return None
+
+
+def run_capture_cycle(
+    source: CaptureSource,
+    process: Callable[[int, CaptureTarget], Optional[T]],
+    max_workers: int = 4,
+) -> List[T]:
+    """
+    ソースが列挙した全対象を並列に処理
+
+    1対象の失敗は他の対象に影響させず、結果は列挙順で返す。
+
+    入力:
+        source - キャプチャ対象のソース
+        process - (インデックス, 対象) を受け取り結果を返す関数(失敗時はNone)
+        max_workers - 並列数
+    出力: 成功した対象の結果リスト
+    """
+    targets = source.list_targets()
+    if not targets:
+        return []
+
+    def safe_process(indexed: tuple) -> Optional[T]:
+        index, target = indexed
+        try:
+            return process(index, target)
+        except Exception as e:
+            print(f"Error capturing {target.kind} {target.target_id}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as executor:
+        results = list(executor.map(safe_process, enumerate(targets)))
+
+    return [r for r in results if r is not None]
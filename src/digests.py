@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Daily Digests for macOS Activity Logger
+
+1日分の作業を小さなJSON(ダイジェスト)にまとめ、reports/digests/YYYY/MM/YYYY-MM-DD.json に保存します。
+月報・四半期報告は日報やログを読み直さず、このダイジェストだけを読みます。
+
+- topics: 日報の「本日の主な作業」の項目(日報がない日は作業時間の長いウィンドウタイトル)
+- apps: アプリ別の作業時間(ロールアップから集計)
+- total_seconds: 1日の合計作業時間
+
+過去の日のダイジェストは一度作れば、日報またはその日のロールアップが更新されない限り作り直しません。
+"""
+
+import json
+import hashlib
+import argparse
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from reconcile import extract_list_items
+from rollups import COLUMNS, aggregate, iter_month_dirs, load_columns
+
+# Configuration
+DIGESTS_DIR = Path("reports/digests")
+DAILY_REPORTS_DIR = Path("reports/daily")
+DIGEST_VERSION = 3  # 形式を変えたら上げる(古いダイジェストは作り直される)
+DIGEST_MAX_TOPICS = 5
+DIGEST_MAX_APPS = 10
+TOPICS_SECTION = "本日の主な作業"
+
+
+def get_digest_file(day: datetime) -> Path:
+    """指定日のダイジェストファイルのパス (例: reports/digests/2026/01/2026-01-05.json)"""
+    return DIGESTS_DIR / day.strftime("%Y") / day.strftime("%m") / f"{day.strftime('%Y-%m-%d')}.json"
+
+
+def get_daily_report_file(day: datetime) -> Path:
+    """指定日の日報ファイルのパス (例: reports/daily/2026/01/2026-01-05.md)"""
+    return DAILY_REPORTS_DIR / day.strftime("%Y") / day.strftime("%m") / f"{day.strftime('%Y-%m-%d')}.md"
+
+
+def extract_topics(markdown: str) -> List[str]:
+    """
+    日報の「本日の主な作業」の項目を抽出
+
+    入力: markdown - 日報のMarkdown
+    出力: 項目のリスト(最大DIGEST_MAX_TOPICS件)
+    """
+    section = []
+    in_section = False
+    for line in markdown.splitlines():
+        if line.startswith("#"):
+            if in_section:
+                break
+            in_section = TOPICS_SECTION in line
+            continue
+        if in_section:
+            section.append(line)
+    return extract_list_items("\n".join(section))[:DIGEST_MAX_TOPICS]
+
+
+def file_fingerprint(path: Path) -> Optional[List]:
+    """ファイルの [サイズ, 更新時刻]、存在しなければNone"""
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return [stat.st_size, stat.st_mtime]
+
+
+def rollup_fingerprints(date_from: datetime, date_to: datetime) -> Dict[str, str]:
+    """
+    期間内の各日のロールアップ行のハッシュ
+
+    その日の行(時間帯・アプリ・タイトル・秒数)だけから計算するため、同じ月の他の日が
+    記録されても変わらず、その日の行が後から作られた・作り直された(rollups.py rebuild)場合だけ変わる。
+
+    入力:
+        date_from, date_to - 期間(両端の日を含む)
+    出力: {日付文字列: SHA-1}(ロールアップに行のない日は含まない)
+    """
+    first, last = date_from.toordinal(), date_to.toordinal()
+    rows: Dict[int, array] = {}
+    for month_dir in iter_month_dirs(date_from, date_to):
+        columns = load_columns(month_dir)
+        for row in zip(*(columns[column] for column in COLUMNS)):
+            ordinal = row[0] // 24
+            if first <= ordinal <= last:
+                rows.setdefault(ordinal, array("I")).extend(row)
+    return {
+        datetime.fromordinal(ordinal).strftime("%Y-%m-%d"): hashlib.sha1(data.tobytes()).hexdigest()
+        for ordinal, data in rows.items()
+    }
+
+
+def build_digest(
+    day: datetime, app_totals: Dict[str, int], title_totals: Dict[str, int], rollup: Optional[str]
+) -> Dict:
+    """
+    1日分のダイジェストを作成
+
+    入力:
+        day - 対象日
+        app_totals - {アプリ名: 秒数}
+        title_totals - {"アプリ名 - タイトル": 秒数}(日報がない日のトピックに使用)
+        rollup - その日のロールアップ行のハッシュ(rollup_fingerprints)
+    出力: ダイジェストのdict
+    """
+    report_file = get_daily_report_file(day)
+    topics: List[str] = []
+    topics_source = "none"
+    if report_file.exists():
+        with open(report_file, "r", encoding="utf-8") as f:
+            topics = extract_topics(f.read())
+        topics_source = "daily_report"
+    if not topics and title_totals:
+        topics = [
+            title
+            for title, _ in sorted(title_totals.items(), key=lambda item: item[1], reverse=True)
+        ][:DIGEST_MAX_TOPICS]
+        topics_source = "window_titles"
+
+    apps = sorted(app_totals.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "version": DIGEST_VERSION,
+        "date": day.strftime("%Y-%m-%d"),
+        "topics": topics,
+        "topics_source": topics_source,
+        "apps": [{"application": name, "seconds": seconds} for name, seconds in apps[:DIGEST_MAX_APPS]],
+        "total_seconds": sum(app_totals.values()),
+        "daily_report": file_fingerprint(report_file),
+        "rollup": rollup,
+    }
+
+
+def load_cached_digest(day: datetime, today: datetime, rollup: Optional[str]) -> Optional[Dict]:
+    """
+    キャッシュ済みのダイジェストを読み込み(作り直しが必要ならNone)
+
+    当日以降の日は記録中のため、常に作り直す。
+    日報の [サイズ, 更新時刻] か、その日のロールアップ行のハッシュ(rollup)が変わっていれば作り直す。
+    """
+    digest_file = get_digest_file(day)
+    if day >= today or not digest_file.exists():
+        return None
+    try:
+        with open(digest_file, "r", encoding="utf-8") as f:
+            digest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if digest.get("version") != DIGEST_VERSION:
+        return None
+    if digest.get("daily_report") != file_fingerprint(get_daily_report_file(day)):
+        return None
+    if digest.get("rollup") != rollup:
+        return None
+    return digest
+
+
+def save_digest(day: datetime, digest: Dict) -> None:
+    """ダイジェストをアトミックに保存"""
+    digest_file = get_digest_file(day)
+    digest_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = digest_file.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(digest, f, ensure_ascii=False, indent=1)
+    tmp_path.replace(digest_file)
+
+
+def load_digests(date_from: datetime, date_to: datetime) -> Tuple[List[Dict], int]:
+    """
+    期間内の各日のダイジェストを取得(ないもの・古いものだけを作成)
+
+    ロールアップの集計は作成が必要な日を含む期間に対して1回だけ行う。
+
+    入力:
+        date_from, date_to - 期間(両端の日を含む)
+    出力: (記録のある日のダイジェストのリスト, 新しく作成した件数)
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = []
+    day = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
+    while day <= date_to:
+        days.append(day)
+        day += timedelta(days=1)
+
+    fingerprints = rollup_fingerprints(days[0], days[-1]) if days else {}
+    digests: Dict[str, Dict] = {}
+    missing = []
+    for day in days:
+        cached = load_cached_digest(day, today, fingerprints.get(day.strftime("%Y-%m-%d")))
+        if cached is None:
+            missing.append(day)
+        else:
+            digests[cached["date"]] = cached
+
+    if missing:
+        app_totals: Dict[str, Dict[str, int]] = {}
+        title_totals: Dict[str, Dict[str, int]] = {}
+        for (date_str, name), seconds in aggregate(missing[0], missing[-1], by="app", per_day=True).items():
+            app_totals.setdefault(date_str, {})[name] = seconds
+        for (date_str, name), seconds in aggregate(missing[0], missing[-1], by="title", per_day=True).items():
+            title_totals.setdefault(date_str, {})[name] = seconds
+
+        for day in missing:
+            date_str = day.strftime("%Y-%m-%d")
+            digest = build_digest(
+                day, app_totals.get(date_str, {}), title_totals.get(date_str, {}), fingerprints.get(date_str)
+            )
+            if day < today:
+                save_digest(day, digest)
+            digests[date_str] = digest
+
+    active = [
+        digests[date_str]
+        for date_str in sorted(digests)
+        if digests[date_str]["total_seconds"] or digests[date_str]["topics"]
+    ]
+    return active, len(missing)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="日ごとのダイジェスト(主な作業・アプリ別の作業時間)を作成・表示します"
+    )
+    parser.add_argument("--from", dest="date_from", required=True, help="開始日 (YYYY-MM-DD)")
+    parser.add_argument(
+        "--to",
+        dest="date_to",
+        help="終了日 (YYYY-MM-DD、デフォルト: 今日)",
+        default=datetime.now().strftime("%Y-%m-%d"),
+    )
+    args = parser.parse_args()
+
+    try:
+        date_from = datetime.strptime(args.date_from, "%Y-%m-%d")
+        date_to = datetime.strptime(args.date_to, "%Y-%m-%d")
+    except ValueError:
+        print("Invalid date format. Please use YYYY-MM-DD format")
+        exit(1)
+
+    digests, created = load_digests(date_from, date_to)
+    for digest in digests:
+        apps = ", ".join(f"{a['application']} {a['seconds'] / 3600:.1f}h" for a in digest["apps"][:3])
+        print(f"{digest['date']} {digest['total_seconds'] / 3600:5.1f}h  {apps}")
+        for topic in digest["topics"]:
+            print(f"    - {topic}")
+    print(f"\n{len(digests)} day(s), {created} digest(s) created")
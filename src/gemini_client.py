@@ -10,6 +10,8 @@ import requests
 from dotenv import load_dotenv
 from google import genai
 
+import gemini_limiter
+
 # Load environment variables
 load_dotenv()
 
@@ -53,19 +55,65 @@ def check_network_connection() -> bool:
         return False
 
 
-def generate_content(client: genai.Client, prompt: str) -> str | None:
+def is_rate_limit_error(error: Exception) -> bool:
+    """APIのレート制限・クォータ超過エラーかどうか"""
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message
+
+
+def generate_content(
+    client: genai.Client,
+    prompt: str,
+    caller: str = "report",
+    priority: str = gemini_limiter.PRIORITY_REPORT,
+) -> str | None:
     """
     Gemini APIでコンテンツを生成
 
+    全プロセス共通のレートリミッタで順番を待ってから呼び出し、利用量を記録する。
+
     入力:
         client - Geminiクライアント
         prompt - プロンプト文字列
+        caller - 利用量の集計に使う呼び出し元の名前
+        priority - 優先度クラス (gemini_limiter.PRIORITY_*)
     出力:
-        生成されたテキスト または None（エラー時）
+        生成されたテキスト または None（エラー時・待機の上限を超えた時）
     """
+    try:
+        waited = gemini_limiter.acquire(priority)
+    except Exception as e:
+        # リミッタが使えなくても呼び出し自体は止めない
+        print(f"Warning: Rate limiter unavailable: {e}")
+        waited = 0.0
+    if waited is None:
+        print(f"Error generating content: rate limit wait exceeded for {caller} ({priority})")
+        return None
+
     try:
         response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt)
-        return response.text
     except Exception as e:
         print(f"Error generating content: {e}")
+        rate_limited = is_rate_limit_error(e)
+        try:
+            if rate_limited:
+                gemini_limiter.report_rate_limited()
+            gemini_limiter.record_usage(
+                caller, priority, error=True, rate_limited=rate_limited, wait_seconds=waited
+            )
+        except Exception as e:
+            print(f"Warning: Failed to record Gemini usage: {e}")
         return None
+
+    usage = getattr(response, "usage_metadata", None)
+    try:
+        gemini_limiter.record_usage(
+            caller,
+            priority,
+            input_tokens=getattr(usage, "prompt_token_count", None) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", None) or 0,
+            wait_seconds=waited,
+        )
+    except Exception as e:
+        print(f"Warning: Failed to record Gemini usage: {e}")
+    return response.text
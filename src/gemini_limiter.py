@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Shared Rate Limiter and Usage Accounting for Gemini API
+
+ロガー本体の毎時要約・日報・週報・突合などのGemini呼び出しで共有する
+プロセス間のトークンバケットと、日別の利用量の記録を提供します。
+
+- バケットとカウンタはリポジトリの logs/.gemini_usage.sqlite3 (GEMINI_USAGE_DB で変更可) に保存し、
+  BEGIN IMMEDIATE のトランザクションでプロセス間の排他を行う
+- 優先度クラスごとにバケットの残量を予約しておき、バッチ処理が
+  リクエストを使い切っても毎時要約(live)が待たされないようにする
+- レート制限エラー(429)を受けたらバケットを空にし、全プロセスが待機する
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from log_store import LOGS_DIR
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+# 作業ディレクトリに依存しないよう、リポジトリの logs/ に固定する
+# (make team-report などはストアに cd して実行するが、ロガー本体と同じバケットを共有する)
+LIMITER_DB = Path(
+    os.getenv("GEMINI_USAGE_DB", Path(__file__).resolve().parent.parent / LOGS_DIR / ".gemini_usage.sqlite3")
+)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "10"))
+
+PRIORITY_LIVE = "live"  # ロガー本体の毎時要約
+PRIORITY_REPORT = "report"  # 日報・週報
+PRIORITY_BATCH = "batch"  # 突合・バックフィルなどのまとめ処理
+
+# 取得後もバケットに残しておく割合(上位の優先度のために予約する分)
+PRIORITY_RESERVE = {
+    PRIORITY_LIVE: 0.0,
+    PRIORITY_REPORT: 0.2,
+    PRIORITY_BATCH: 0.5,
+}
+# 待機の上限(秒)、超えたら呼び出しを諦める
+PRIORITY_MAX_WAIT = {
+    PRIORITY_LIVE: 30,  # キャプチャの周期を崩さない範囲で待つ
+    PRIORITY_REPORT: 300,
+    PRIORITY_BATCH: 3600,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    caller TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    rate_limited INTEGER NOT NULL DEFAULT 0,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    wait_seconds REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, caller)
+);
+"""
+
+
+def connect(db_path: Path = LIMITER_DB) -> sqlite3.Connection:
+    """
+    利用量データベースに接続(なければ作成)
+
+    入力: db_path - データベースファイル
+    出力: 自動コミットモードの接続(トランザクションは明示的に開始する)
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def try_acquire(
+    conn: sqlite3.Connection,
+    priority: str,
+    requests_per_minute: float = GEMINI_REQUESTS_PER_MINUTE,
+) -> float:
+    """
+    バケットからリクエスト1回分を取得
+
+    入力:
+        conn - connect() の接続
+        priority - 優先度クラス
+        requests_per_minute - バケットの容量兼補充レート
+    出力: 取得できたら0、できなければ取得できるまでの待ち時間(秒)
+    """
+    capacity = max(requests_per_minute, 1.0)
+    rate = requests_per_minute / 60
+    needed = 1 + capacity * PRIORITY_RESERVE.get(priority, PRIORITY_RESERVE[PRIORITY_BATCH])
+    now = time.time()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT tokens, updated FROM bucket WHERE name = 'gemini'").fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+        wait = 0.0
+        if tokens >= needed:
+            tokens -= 1
+        else:
+            wait = (needed - tokens) / rate
+        conn.execute(
+            "INSERT OR REPLACE INTO bucket (name, tokens, updated) VALUES ('gemini', ?, ?)",
+            (tokens, now),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return wait
+
+
+def acquire(priority: str, max_wait: Optional[float] = None, db_path: Path = LIMITER_DB) -> Optional[float]:
+    """
+    リクエスト1回分を取得できるまで待機
+
+    入力:
+        priority - 優先度クラス
+        max_wait - 待機の上限(秒)、省略時は優先度ごとの既定値
+        db_path - データベースファイル
+    出力: 取得できたら待った秒数、上限を超えたらNone
+    """
+    if max_wait is None:
+        max_wait = PRIORITY_MAX_WAIT.get(priority, PRIORITY_MAX_WAIT[PRIORITY_BATCH])
+    start = time.monotonic()
+    conn = connect(db_path)
+    try:
+        while True:
+            wait = try_acquire(conn, priority)
+            waited = time.monotonic() - start
+            if wait <= 0:
+                return waited
+            if waited + wait > max_wait:
+                return None
+            # 他のプロセスが先に取得することもあるため、待った後に取り直す
+            time.sleep(min(wait, 5.0))
+    finally:
+        conn.close()
+
+
+def report_rate_limited(db_path: Path = LIMITER_DB) -> None:
+    """
+    APIからレート制限エラーを受けたときにバケットを空にする(全プロセスが補充まで待つ)
+    """
+    conn = connect(db_path)
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO bucket (name, tokens, updated) VALUES ('gemini', 0, ?)",
+            (time.time(),),
+        )
+    finally:
+        conn.close()
+
+
+def record_usage(
+    caller: str,
+    priority: str,
+    input_tokens: int = 0,
+    output_tokens: int = 0,
+    error: bool = False,
+    rate_limited: bool = False,
+    wait_seconds: float = 0.0,
+    db_path: Path = LIMITER_DB,
+) -> None:
+    """
+    1回の呼び出しの利用量を日別・呼び出し元別に加算
+
+    入力:
+        caller - 呼び出し元 (例: hourly_summary, daily_report)
+        priority - 優先度クラス
+        input_tokens / output_tokens - APIが返したトークン数
+        error - エラーになったか
+        rate_limited - レート制限エラーだったか
+        wait_seconds - リミッタで待った秒数
+        db_path - データベースファイル
+    """
+    day = datetime.now().strftime("%Y-%m-%d")
+    conn = connect(db_path)
+    try:
+        conn.execute(
+            """
+            INSERT INTO usage (day, caller, priority, requests, errors, rate_limited,
+                               input_tokens, output_tokens, wait_seconds)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)
+            ON CONFLICT (day, caller) DO UPDATE SET
+                requests = requests + 1,
+                errors = errors + excluded.errors,
+                rate_limited = rate_limited + excluded.rate_limited,
+                input_tokens = input_tokens + excluded.input_tokens,
+                output_tokens = output_tokens + excluded.output_tokens,
+                wait_seconds = wait_seconds + excluded.wait_seconds
+            """,
+            (day, caller, priority, int(error), int(rate_limited), input_tokens, output_tokens, wait_seconds),
+        )
+    finally:
+        conn.close()
+
+
+def get_usage(date_from: str, date_to: str, db_path: Path = LIMITER_DB) -> List[Dict]:
+    """
+    期間内の利用量を取得
+
+    入力:
+        date_from / date_to - 期間 (YYYY-MM-DD、両端を含む)
+        db_path - データベースファイル
+    出力: [{"day", "caller", "priority", "requests", "errors", "rate_limited",
+            "input_tokens", "output_tokens", "wait_seconds"}]
+    """
+    if not db_path.exists():
+        return []
+    conn = connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            "SELECT * FROM usage WHERE day BETWEEN ? AND ? ORDER BY day, caller",
+            (date_from, date_to),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def format_usage(date_from: str, date_to: Optional[str] = None, db_path: Path = LIMITER_DB) -> str:
+    """
+    期間内の利用量を表示用の文字列に整形(日報・週報の生成後に表示する)
+
+    入力:
+        date_from / date_to - 期間 (YYYY-MM-DD、date_to省略時は1日分)
+        db_path - データベースファイル
+    出力: 呼び出し元ごとの利用量と合計
+    """
+    date_to = date_to or date_from
+    rows = get_usage(date_from, date_to, db_path)
+    period = date_from if date_from == date_to else f"{date_from} 〜 {date_to}"
+    if not rows:
+        return f"Gemini usage ({period}): no requests"
+
+    totals: Dict[str, Dict] = {}
+    for row in rows:
+        total = totals.setdefault(
+            row["caller"], {"priority": row["priority"], "requests": 0, "errors": 0, "tokens": 0, "wait": 0.0}
+        )
+        total["requests"] += row["requests"]
+        total["errors"] += row["errors"]
+        total["tokens"] += row["input_tokens"] + row["output_tokens"]
+        total["wait"] += row["wait_seconds"]
+
+    lines = [f"Gemini usage ({period}):"]
+    for caller, total in sorted(totals.items()):
+        lines.append(
+            f"  {caller:<16} {total['priority']:<7} {total['requests']:>5} req "
+            f"{total['tokens']:>9,} tokens  {total['errors']} error(s)  waited {total['wait']:.0f}s"
+        )
+    lines.append(
+        f"  {'total':<16} {'':<7} {sum(t['requests'] for t in totals.values()):>5} req "
+        f"{sum(t['tokens'] for t in totals.values()):>9,} tokens"
+    )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gemini APIの利用量とレート制限の状態を表示します")
+    parser.add_argument("--from", dest="date_from", help="開始日 (YYYY-MM-DD、デフォルト: 7日前)")
+    parser.add_argument("--to", dest="date_to", help="終了日 (YYYY-MM-DD、デフォルト: 今日)")
+    args = parser.parse_args()
+
+    today = datetime.now()
+    date_to = args.date_to or today.strftime("%Y-%m-%d")
+    date_from = args.date_from or (today - timedelta(days=6)).strftime("%Y-%m-%d")
+
+    for day in sorted({row["day"] for row in get_usage(date_from, date_to)}):
+        print(format_usage(day))
+        print()
+    print(format_usage(date_from, date_to))
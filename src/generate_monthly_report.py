@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Monthly / Quarterly Report Generator for macOS Activity Logger
+
+日ごとのダイジェスト(digests.py)から月報・四半期報告を生成します。
+日報を丸ごとプロンプトに入れる週報と違い、1日あたり数行のダイジェストだけを使うため、
+期間が長くてもプロンプトが小さく、日報の読み直し・要約のし直しも発生しません。
+"""
+
+import re
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from digests import load_digests
+from gemini_client import create_gemini_client, generate_content
+from gemini_limiter import format_usage
+
+# Configuration
+MONTHLY_REPORTS_DIR = Path("reports/monthly")
+QUARTERLY_REPORTS_DIR = Path("reports/quarterly")
+REPORT_TOP_APPS = 10
+
+
+def get_month_range(month: str) -> Tuple[datetime, datetime]:
+    """
+    YYYY-MM形式の月の初日と末日を取得
+
+    入力: month - 対象月 (例: 2026-01)
+    出力: (初日, 末日)
+    """
+    first = datetime.strptime(month, "%Y-%m")
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+def get_quarter_range(quarter: str) -> Tuple[datetime, datetime]:
+    """
+    YYYY-QN形式の四半期の初日と末日を取得
+
+    入力: quarter - 対象四半期 (例: 2026-Q1)
+    出力: (初日, 末日)
+    """
+    match = re.fullmatch(r"(\d{4})-Q([1-4])", quarter)
+    if not match:
+        raise ValueError(f"Invalid quarter: {quarter}")
+    year, number = int(match.group(1)), int(match.group(2))
+    first = datetime(year, 3 * number - 2, 1)
+    _, last = get_month_range(datetime(year, 3 * number, 1).strftime("%Y-%m"))
+    return first, last
+
+
+def format_hours(seconds: int) -> str:
+    """秒数を時間表記に整形 (例: 5400 -> 1.5h)"""
+    return f"{seconds / 3600:.1f}h"
+
+
+def format_digest_line(digest: Dict) -> str:
+    """
+    ダイジェスト1日分をプロンプト用の1行に整形
+
+    入力: digest - digests.load_digests() の要素
+    出力: "- 2026-01-05 (6.2h; Code 3.1h, Slack 1.0h): 作業1 / 作業2"
+    """
+    apps = ", ".join(f"{app['application']} {format_hours(app['seconds'])}" for app in digest["apps"][:3])
+    topics = " / ".join(digest["topics"]) or "(主な作業の記録なし)"
+    return f"- {digest['date']} ({format_hours(digest['total_seconds'])}; {apps}): {topics}"
+
+
+def total_app_seconds(digests: List[Dict]) -> Dict[str, int]:
+    """期間内のアプリ別作業時間を合計"""
+    totals: Dict[str, int] = {}
+    for digest in digests:
+        for app in digest["apps"]:
+            totals[app["application"]] = totals.get(app["application"], 0) + app["seconds"]
+    return totals
+
+
+def format_time_table(digests: List[Dict]) -> str:
+    """
+    アプリ別・月別の作業時間の表(LLMを通さずに集計値をそのまま載せる)
+
+    入力: digests - 期間内のダイジェスト
+    出力: Markdownの表
+    """
+    months = sorted({digest["date"][:7] for digest in digests})
+    per_month: Dict[str, Dict[str, int]] = {}
+    for digest in digests:
+        month_totals = per_month.setdefault(digest["date"][:7], {})
+        for app in digest["apps"]:
+            month_totals[app["application"]] = month_totals.get(app["application"], 0) + app["seconds"]
+
+    totals = total_app_seconds(digests)
+    top_apps = sorted(totals, key=lambda name: totals[name], reverse=True)[:REPORT_TOP_APPS]
+
+    show_months = len(months) > 1
+    header = ["アプリ"] + (months if show_months else []) + ["合計"]
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for name in top_apps:
+        row = [name]
+        if show_months:
+            row += [format_hours(per_month[month].get(name, 0)) for month in months]
+        row.append(format_hours(totals[name]))
+        lines.append("| " + " | ".join(row) + " |")
+
+    total_seconds = sum(digest["total_seconds"] for digest in digests)
+    row = ["**合計**"]
+    if show_months:
+        row += [
+            format_hours(sum(d["total_seconds"] for d in digests if d["date"].startswith(month)))
+            for month in months
+        ]
+    row.append(format_hours(total_seconds))
+    lines.append("| " + " | ".join(row) + " |")
+    return "\n".join(lines)
+
+
+def generate_period_report(date_from: datetime, date_to: datetime, title: str, output_file: Path) -> None:
+    """
+    ダイジェストから期間のレポートを生成
+
+    入力:
+        date_from, date_to - 期間(両端の日を含む)
+        title - レポートの見出し (例: 月報 - 2026年01月)
+        output_file - 出力先のMarkdownファイル
+    """
+    client = create_gemini_client()
+    if not client:
+        return
+
+    print(f"Generating {title}")
+    print(f"Period: {date_from.strftime('%Y-%m-%d')} to {date_to.strftime('%Y-%m-%d')}")
+
+    digests, created = load_digests(date_from, date_to)
+    print(f"Loaded {len(digests)} day(s) of digests ({created} created or refreshed)")
+
+    if not digests:
+        print("No activity found for this period. Skipping report generation.")
+        return
+
+    total_seconds = sum(digest["total_seconds"] for digest in digests)
+    app_summary = ", ".join(
+        f"{name} {format_hours(seconds)}"
+        for name, seconds in sorted(total_app_seconds(digests).items(), key=lambda item: item[1], reverse=True)[
+            :REPORT_TOP_APPS
+        ]
+    )
+    digest_lines = "\n".join(format_digest_line(digest) for digest in digests)
+
+    prompt = f"""あなたは月報・四半期報告を作成するアシスタントです。
+
+以下に期間内の各日の作業ダイジェスト(日付、作業時間、主なアプリ、主な作業)を提供します。
+これらを読んで、期間全体の報告をMarkdown形式で作成してください。
+
+重要：
+- 日ごとの羅列ではなく、期間を通したテーマ・プロジェクト単位でまとめてください
+- 複数日にわたる作業は1つのテーマにまとめ、おおよその時期を添えてください
+- 作業時間の数値は提供されたものだけを使い、推測で数値を作らないでください
+
+出力フォーマット:
+# {title}
+
+## 期間の主な成果
+(重要な成果を3〜7項目で簡潔にまとめる)
+
+## 主なテーマ
+- テーマ名(時期)
+  - 内容を1〜3項目で
+
+## 時間の使い方
+(アプリ別の作業時間から読み取れる傾向を2〜4文で)
+
+## 所感
+(期間の振り返りと次の期間に向けて)
+
+---
+
+期間: {date_from.strftime('%Y-%m-%d')} 〜 {date_to.strftime('%Y-%m-%d')}
+記録のある日数: {len(digests)}日
+合計作業時間: {format_hours(total_seconds)}
+アプリ別の作業時間: {app_summary}
+
+各日のダイジェスト:
+{digest_lines}
+"""
+
+    print(f"\nGenerating report... (prompt length: {len(prompt)} chars)")
+
+    report_content = generate_content(client, prompt, caller="monthly_report")
+
+    if report_content:
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_file, "w", encoding="utf-8") as f:
+            f.write(report_content.rstrip())
+            f.write("\n\n## 作業時間(アプリ別)\n\n")
+            f.write(format_time_table(digests))
+            f.write("\n")
+
+        print(f"\nReport generated: {output_file}")
+        print()
+        print(format_usage(date_from.strftime("%Y-%m-%d"), date_to.strftime("%Y-%m-%d")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="日ごとのダイジェストからmacOS Activity Loggerの月報・四半期報告を生成します"
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument(
+        "--month",
+        help="対象月 (YYYY-MM形式、デフォルト: 今月)",
+    )
+    group.add_argument(
+        "--quarter",
+        nargs="?",
+        const="",
+        help="対象四半期 (YYYY-QN形式、例: 2026-Q1。値を省略すると今四半期)",
+    )
+    args = parser.parse_args()
+
+    try:
+        if args.quarter is not None:
+            now = datetime.now()
+            quarter = args.quarter or f"{now.year}-Q{(now.month + 2) // 3}"
+            date_from, date_to = get_quarter_range(quarter)
+            title = f"四半期報告 - {date_from.year}年Q{(date_from.month + 2) // 3}"
+            output_file = QUARTERLY_REPORTS_DIR / f"{quarter}.md"
+        else:
+            month = args.month or datetime.now().strftime("%Y-%m")
+            date_from, date_to = get_month_range(month)
+            title = f"月報 - {date_from.strftime('%Y年%m月')}"
+            output_file = MONTHLY_REPORTS_DIR / f"{date_from.strftime('%Y-%m')}.md"
+    except ValueError:
+        print("Invalid period. Please use --month YYYY-MM or --quarter YYYY-QN")
+        exit(1)
+
+    generate_period_report(date_from, date_to, title, output_file)
@@ -12,10 +12,13 @@ from datetime import datetime
 from pathlib import Path
 
 from gemini_client import create_gemini_client, generate_content, check_network_connection
+from gemini_limiter import format_usage
+from sessions import format_session_line, load_sessions
 
 # Configuration
 LOGS_DIR = Path("logs")
 REPORTS_DIR = Path("reports/daily")
+REPORT_MIN_SESSION_SECONDS = 300  # 日報に載せるセッションの最短時間
 
 # Create directories
 LOGS_DIR.mkdir(exist_ok=True)
@@ -89,10 +92,28 @@ def generate_daily_report(target_date: str) -> None:
     print(f"Generating daily report from {len(hourly_summaries)} hourly summaries...")
 
     # hourly summaryをまとめる
+    # 複数Macのログを集約したストアでは、どのホストの要約かを併記する
     summary_text = "\n\n".join(
-        [f"【{s['hour']}】\n{s['summary']}" for s in hourly_summaries]
+        [
+            f"【{s['hour']} / {s['host']}】\n{s['summary']}"
+            if s.get("host")
+            else f"【{s['hour']}】\n{s['summary']}"
+            for s in hourly_summaries
+        ]
     )
 
+    # 作業セッション(同じアプリでの連続作業)を併記し、時間配分を日報に反映させる
+    try:
+        day_sessions = [
+            session
+            for session in load_sessions(target_date)
+            if session["seconds"] >= REPORT_MIN_SESSION_SECONDS
+        ]
+    except Exception as e:
+        print(f"Warning: Failed to load sessions: {e}")
+        day_sessions = []
+    session_text = "\n".join(format_session_line(session) for session in day_sessions) or "(なし)"
+
     # Parse target_date for display
     try:
         date_obj = datetime.strptime(target_date, "%Y-%m-%d")
@@ -128,9 +149,13 @@ def generate_daily_report(target_date: str) -> None:
 時間ごとの作業要約:
 
 {summary_text}
+
+作業セッション({REPORT_MIN_SESSION_SECONDS // 60}分以上の連続作業):
+
+{session_text}
 """
 
-    report_content = generate_content(client, prompt)
+    report_content = generate_content(client, prompt, caller="daily_report")
 
     if not report_content:
         print("Error: Failed to generate daily report content")
@@ -144,6 +169,8 @@ def generate_daily_report(target_date: str) -> None:
             f.write(report_content)
 
         print(f"Daily report generated: {report_file}")
+        print()
+        print(format_usage(target_date))
     except Exception as e:
         print(f"Error: Failed to write report file: {e}")
         sys.exit(1)
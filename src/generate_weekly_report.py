@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from pathlib import Path
 
 from gemini_client import create_gemini_client, generate_content
+from gemini_limiter import format_usage
 
 # Configuration
 DAILY_REPORTS_DIR = Path("reports/daily")
@@ -173,7 +174,7 @@ def generate_weekly_report(target_date: datetime) -> None:
 
     print(f"\nGenerating weekly report... (prompt length: {len(prompt)} chars)")
 
-    report_content = generate_content(client, prompt)
+    report_content = generate_content(client, prompt, caller="weekly_report")
 
     if report_content:
         report_file = WEEKLY_REPORTS_DIR / f"{week_str}.md"
@@ -182,6 +183,8 @@ def generate_weekly_report(target_date: datetime) -> None:
             f.write(report_content)
 
         print(f"\nWeekly report generated: {report_file}")
+        print()
+        print(format_usage(monday.strftime("%Y-%m-%d"), sunday.strftime("%Y-%m-%d")))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Multi-Machine Log Ingestion for macOS Activity Logger
+
+複数のMac(仕事用・個人用、チームメンバーなど)の logs/YYYY/MM/ を
+1つのストアに集約し、ホストIDを付けて時系列順にマージします。
+
+ストアは次の構成になり、ストアのディレクトリで日報・週報の生成を実行できます。
+
+    <store>/sources/<host>/YYYY/MM/   rsyncで取得したリモートのログ
+    <store>/logs/YYYY/MM/             ホストIDを付けてマージしたログ
+    <store>/.ingest_state.json        マージ済みの入力ファイルの状態
+
+マージは各入力ファイルを1行ずつ読むヒープベースのk-wayマージで行うため、
+メモリ使用量はログのサイズによらず一定です。
+"""
+
+import os
+import re
+import json
+import heapq
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+# Configuration
+LOG_FILE_PATTERN = re.compile(r"(activity|hourly_summary)_(\d{4}-\d{2}-\d{2})\.jsonl$")
+STATE_FILE_NAME = ".ingest_state.json"
+
+
+def parse_source(spec: str) -> Tuple[str, str]:
+    """
+    ソース指定を (ホストID, パス) に分解
+
+    入力: spec - "host=path" 形式(pathはローカルディレクトリ or rsyncのリモート指定)
+    出力: (host_id, path)
+    """
+    if "=" not in spec:
+        raise ValueError(f"Invalid source (expected host=path): {spec}")
+    host_id, path = spec.split("=", 1)
+    return host_id.strip(), path.strip()
+
+
+def is_remote(path: str) -> bool:
+    """rsyncのリモート指定(user@host:path)かどうか"""
+    return ":" in path and not Path(path).exists()
+
+
+def pull_remote(host_id: str, remote: str, store: Path) -> Path:
+    """
+    リモートのログをrsyncでストアに取得
+
+    入力:
+        host_id - ホストID
+        remote - rsyncのリモート指定 (例: me@laptop:dev/maclogger/logs)
+        store - ストアのディレクトリ
+    出力: 取得先のローカルディレクトリ
+    """
+    target = store / "sources" / host_id
+    target.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        "rsync", "-a",
+        "--include=*/",
+        "--include=activity_*.jsonl",
+        "--include=hourly_summary_*.jsonl",
+        "--exclude=*",
+        f"{remote.rstrip('/')}/",
+        f"{target}/",
+    ]
+    print(f"Pulling {host_id} from {remote}...")
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error pulling {host_id}: {result.stderr.strip()}")
+    return target
+
+
+def collect_inputs(sources: List[Tuple[str, Path]]) -> Dict[str, List[Tuple[str, Path]]]:
+    """
+    全ソースのログファイルを出力ファイル名ごとにまとめる
+
+    入力: sources - [(ホストID, ローカルのlogsディレクトリ)]
+    出力: {"YYYY/MM/activity_YYYY-MM-DD.jsonl": [(ホストID, 入力ファイル)]}
+    """
+    inputs: Dict[str, List[Tuple[str, Path]]] = {}
+    for host_id, logs_dir in sources:
+        for path in logs_dir.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/*.jsonl"):
+            if not LOG_FILE_PATTERN.search(path.name):
+                continue
+            relative = path.relative_to(logs_dir).as_posix()
+            inputs.setdefault(relative, []).append((host_id, path))
+    return inputs
+
+
+def iter_records(host_id: str, path: Path) -> Iterator[Tuple[str, str, str, Dict]]:
+    """
+    ログファイルを1行ずつ読み、マージ用のキーとレコードを返す
+
+    各ファイルは記録順(時系列順)に並んでいる前提。
+
+    入力:
+        host_id - ホストID
+        path - ログファイル
+    出力: (timestamp, host, 重複判定用の正規化したJSON, レコード) のイテレータ
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "timestamp" not in record:
+                continue
+            # マージ済みストアを再集約する場合は元のホストIDを保持する
+            record.setdefault("host", host_id)
+            # 元のログとストアのコピー(host付き)が同じキーになるよう、正規化したJSONで比較する
+            yield record["timestamp"], record["host"], json.dumps(record, sort_keys=True, ensure_ascii=False), record
+
+
+def merge_files(inputs: List[Tuple[str, Path]], output: Path) -> Tuple[int, int]:
+    """
+    複数ホストの同じ日のログをk-wayマージして出力
+
+    同じタイムスタンプ・同じホストで内容が同一のレコードは1件にまとめる。
+    重複判定は同じタイムスタンプのレコードだけを保持して行うため、メモリは一定。
+
+    入力:
+        inputs - [(ホストID, 入力ファイル)]
+        output - 出力ファイル
+    出力: (書き込んだ件数, 除外した重複件数)
+    """
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_name(f".{output.name}.tmp")
+
+    written = 0
+    duplicates = 0
+    current_ts = None
+    seen_at_ts = set()
+
+    streams = [iter_records(host_id, path) for host_id, path in inputs]
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for ts, host, normalized, record in heapq.merge(*streams, key=lambda r: (r[0], r[1])):
+            if ts != current_ts:
+                current_ts = ts
+                seen_at_ts.clear()
+            dedup_key = (host, normalized)
+            if dedup_key in seen_at_ts:
+                duplicates += 1
+                continue
+            seen_at_ts.add(dedup_key)
+            json.dump(record, f, ensure_ascii=False)
+            f.write("\n")
+            written += 1
+    os.replace(tmp_path, output)
+    return written, duplicates
+
+
+def load_state(store: Path) -> Dict[str, Dict[str, List]]:
+    path = store / STATE_FILE_NAME
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(store: Path, state: Dict[str, Dict[str, List]]) -> None:
+    path = store / STATE_FILE_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def ingest(source_specs: List[str], store: Path, full: bool = False) -> None:
+    """
+    全ソースを取得し、変更のあった日だけをマージし直す
+
+    入力:
+        source_specs - ["host=path", ...]
+        store - ストアのディレクトリ
+        full - Trueの場合は変更の有無にかかわらず全日をマージし直す
+    """
+    store.mkdir(parents=True, exist_ok=True)
+
+    sources = []
+    for spec in source_specs:
+        host_id, path = parse_source(spec)
+        local = pull_remote(host_id, path, store) if is_remote(path) else Path(path)
+        if not local.exists():
+            print(f"⚠ Skipping {host_id}: {local} not found")
+            continue
+        sources.append((host_id, local))
+
+    state = {} if full else load_state(store)
+    merged_logs = store / "logs"
+    total_written = 0
+    total_duplicates = 0
+    merged_files = 0
+
+    for relative, inputs in sorted(collect_inputs(sources).items()):
+        fingerprint = {
+            str(path): [path.stat().st_size, path.stat().st_mtime] for _, path in inputs
+        }
+        output = merged_logs / relative
+        if state.get(relative) == fingerprint and output.exists():
+            continue
+
+        written, duplicates = merge_files(inputs, output)
+        state[relative] = fingerprint
+        save_state(store, state)
+        total_written += written
+        total_duplicates += duplicates
+        merged_files += 1
+        hosts = ", ".join(sorted({host for host, _ in inputs}))
+        print(f"  ✓ {relative}: {written} records from {hosts}")
+
+    print(
+        f"\nMerged {merged_files} file(s): {total_written} records, "
+        f"{total_duplicates} duplicate(s) removed"
+    )
+    print(f"Merged logs: {merged_logs}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="複数のMacのログを1つのストアに集約し、時系列順にマージします"
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        required=True,
+        help="host=path 形式のソース(ローカルのlogsディレクトリ または user@host:path)。複数指定可",
+    )
+    parser.add_argument(
+        "--store",
+        default="central",
+        help="集約先のストアディレクトリ (デフォルト: central)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="変更の有無にかかわらず全てマージし直す",
+    )
+    args = parser.parse_args()
+
+    ingest(args.source, Path(args.store), full=args.full)
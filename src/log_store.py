@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Log Store Utilities
+
+logs/YYYY/MM/ 配下のJSONLログを安全に読み書きするための共通処理を提供します。
+ロガー本体と、ログを書き換える補助プロセスの間で排他制御を行います。
+"""
+
+import os
+import json
+import fcntl
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+# Configuration
+LOGS_DIR = Path("logs")
+LOCK_FILE = LOGS_DIR / ".write.lock"
+
+
+@contextmanager
+def log_write_lock() -> Iterator[None]:
+    """
+    ログ書き込み用のプロセス間ロックを取得
+
+    追記(save_log_entry)と書き換え(OCRのバックフィル等)が
+    同時に走ってレコードが失われないようにするためのロック。
+    """
+    LOGS_DIR.mkdir(exist_ok=True)
+    with open(LOCK_FILE, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def append_jsonl(path: Path, entry: Dict) -> None:
+    """
+    JSONLファイルに1レコード追記(ロック取得済みであることが前提)
+
+    入力:
+        path - 追記先ファイル
+        entry - 追記するレコード
+    """
+    with open(path, "a", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+        f.write("\n")
+
+
+def read_jsonl(path: Path) -> List[Dict]:
+    """
+    JSONLファイルを読み込み(空行と壊れた行はスキップ)
+
+    入力: path - 読み込むファイル
+    出力: レコードのリスト
+    """
+    entries = []
+    if not path.exists():
+        return entries
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def write_jsonl_atomic(path: Path, entries: List[Dict]) -> None:
+    """
+    JSONLファイルを一時ファイル経由でアトミックに書き換え
+
+    入力:
+        path - 書き換えるファイル
+        entries - 書き込むレコードのリスト
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        # mkstempは0600で作成するため、元ファイルの権限を引き継ぐ
+        os.chmod(tmp_path, path.stat().st_mode & 0o777 if path.exists() else 0o644)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for entry in entries:
+                json.dump(entry, f, ensure_ascii=False)
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
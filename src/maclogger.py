@@ -15,15 +15,23 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional, Dict, List
 from dotenv import load_dotenv
-from google import genai
+
+import capture_queue
+from gemini_client import create_gemini_client, generate_content
+from gemini_limiter import PRIORITY_LIVE
+from capture_sources import CaptureSource, CaptureTarget, create_capture_source, run_capture_cycle
+from log_store import log_write_lock, append_jsonl, read_jsonl
+from redaction import REDACTED_FIELDS, redact_entry
+from sessions import format_session_line, load_sessions
+from rollups import record_entry as record_rollup
+from search_index import update_index as update_search_index
 
 # OCR imports
+# ocrmacはmacOS専用のため、未インストールでも読み込めるようにして(リプレイ用)起動時にチェックする
 try:
     from ocrmac import ocrmac
 except ImportError:
-    print("Error: ocrmac is required.")
-    print("Install with: pip install ocrmac")
-    sys.exit(1)
+    ocrmac = None
 
 # Load environment variables
 load_dotenv()
@@ -35,12 +43,40 @@ REPORTS_DIR = Path("reports")
 SCREENSHOT_PATH = "/tmp/maclogger_screenshot.png"
 CAPTURE_INTERVAL = 60  # seconds
 HOURLY_SUMMARY_INTERVAL = 3600  # 1 hour in seconds
+# 要約済みの時間帯のチェックポイント(再起動しても同じ時間帯を二重に要約しない)
+SCHEDULER_STATE_FILE = LOGS_DIR / ".scheduler_state.json"
+SUMMARY_RETRY_SECONDS = 600  # 要約に失敗した場合の再試行間隔
+SUMMARY_MAX_ATTEMPTS = 3  # 同じ時間帯の要約がこの回数失敗したら諦めて次の時間帯へ進む
+# OCR遅延モード: キャプチャのみ行い、OCRは ocr_drain.py でまとめて実行
+DEFERRED_OCR = os.getenv("MACLOGGER_DEFERRED_OCR", "").lower() in ("1", "true", "yes")
+# キャプチャ対象: frontmost(最前面ウィンドウのみ) / windows(上位N個のウィンドウ) / displays(全ディスプレイ)
+CAPTURE_MODE = os.getenv("MACLOGGER_CAPTURE_MODE", "frontmost")
+CAPTURE_MAX_WINDOWS = int(os.getenv("MACLOGGER_CAPTURE_MAX_WINDOWS", "3"))
+CAPTURE_WORKERS = int(os.getenv("MACLOGGER_CAPTURE_WORKERS", "4"))
 
 # Create directories
 LOGS_DIR.mkdir(exist_ok=True)
 REPORTS_DIR.mkdir(exist_ok=True)
 
 
+class Clock:
+    """
+    現在時刻の取得と待機(メインループの全ステージがこのクロックを参照する)
+
+    リプレイハーネス(replay.py)はモジュールの clock を仮想クロックに差し替えて、
+    実時間を待たずにパイプラインを動かす。
+    """
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+clock = Clock()
+
+
 def get_monthly_logs_dir(date: datetime) -> Path:
     """
     指定日の月ごとのログディレクトリを取得・作成
@@ -129,33 +165,68 @@ for window in window_list:
     return None
 
 
-def capture_screenshot(window_id: Optional[str] = None) -> bool:
+def capture_screenshot(
+    window_id: Optional[str] = None,
+    output_path: str = SCREENSHOT_PATH,
+    image_format: str = "png",
+    display_id: Optional[str] = None,
+) -> bool:
     """
     screencaptureコマンドでスクリーンショットをキャプチャ
-    window_idが指定されていればそのウィンドウのみ、なければ全画面
-
-    入力: window_id (Optional) - キャプチャするウィンドウのID
+    window_idが指定されていればそのウィンドウのみ、display_idが指定されていれば
+    そのディスプレイのみ、どちらもなければ全画面
+
+    入力:
+        window_id (Optional) - キャプチャするウィンドウのID
+        output_path - 保存先パス
+        image_format - 画像形式 (png / jpg)
+        display_id (Optional) - キャプチャするディスプレイ番号 (1がメイン)
     出力: 成功したらTrue、失敗したらFalse
     """
     try:
+        cmd = ["screencapture", "-x", "-t", image_format]
         if window_id:
             # Capture specific window
-            cmd = ["screencapture", "-x", "-l", window_id, SCREENSHOT_PATH]
-        else:
-            # Capture all screens
-            cmd = ["screencapture", "-x", SCREENSHOT_PATH]
+            cmd += ["-l", window_id]
+        elif display_id:
+            # Capture specific display
+            cmd += ["-D", display_id]
+        # Without -l / -D, capture all screens
+        cmd.append(output_path)
 
         result = subprocess.run(cmd, capture_output=True, timeout=10)
-        return result.returncode == 0 and Path(SCREENSHOT_PATH).exists()
+        return result.returncode == 0 and Path(output_path).exists()
     except Exception as e:
         print(f"Error capturing screenshot: {e}")
         return False
 
 
-def perform_ocr(image_path: str) -> str:
+def recognize_text(image_path: str) -> str:
     """
     ocrmacライブラリを使用してOCRを実行(macOS Vision Framework)
 
+    入力: 画像ファイルパス
+    出力: 抽出されたテキスト(失敗時は例外を送出する)
+    """
+    # Perform OCR using ocrmac (macOS Vision Framework wrapper)
+    annotations = ocrmac.OCR(
+        image_path, language_preference=["ja-JP", "en-US"]
+    ).recognize()
+
+    if not annotations:
+        return ""
+
+    # Extract text from annotations
+    # Each annotation is a tuple: (text, confidence, bbox)
+    text_lines = [annotation[0] for annotation in annotations if annotation[0]]
+
+    return "\n".join(text_lines)
+
+
+def perform_ocr(image_path: str) -> str:
+    """
+    OCRを実行(エラー時は空文字列を返す)
+
     入力: 画像ファイルパス
     出力: 抽出されたテキスト
     """
@@ -164,133 +235,244 @@ def perform_ocr(image_path: str) -> str:
         if not Path(image_path).exists():
             return ""
 
-        # Perform OCR using ocrmac (macOS Vision Framework wrapper)
-        annotations = ocrmac.OCR(
-            image_path, language_preference=["ja-JP", "en-US"]
-        ).recognize()
-
-        if not annotations:
-            return ""
-
-        # Extract text from annotations
-        # Each annotation is a tuple: (text, confidence, bbox)
-        text_lines = [annotation[0] for annotation in annotations if annotation[0]]
-
-        return "\n".join(text_lines)
+        return recognize_text(image_path)
 
     except Exception as e:
         print(f"Error performing OCR: {e}")
         return ""
 
 
-def summarize_hourly_activities() -> None:
+def generate_summary_text(prompt: str) -> Optional[str]:
     """
-    過去1時間分のアクティビティログを読み込んで要約し、hourly summaryとして保存
+    Gemini APIで要約を生成
+
+    入力: prompt - プロンプト文字列
+    出力: 生成されたテキスト、エラー・レート制限で呼び出せなかった場合はNone
+    """
+    client = create_gemini_client()
+    if not client:
+        return None
+    # 毎時要約は最優先(日報・バッチ処理より先にレートリミッタの枠を使える)
+    return generate_content(client, prompt, caller="hourly_summary", priority=PRIORITY_LIVE)
+
+
+def load_scheduler_state() -> Dict:
+    """
+    スケジューラのチェックポイントを読み込み
+
+    出力: {"last_summarized_hour": ISO形式の時刻,
+           "failed_attempts": {時間帯: 失敗回数}, "skipped_hours": [諦めた時間帯]}、
+          未作成・破損時は空のdict
+    """
+    if not SCHEDULER_STATE_FILE.exists():
+        return {}
+    try:
+        with open(SCHEDULER_STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_scheduler_state(state: Dict) -> None:
+    """
+    スケジューラのチェックポイントをアトミックに保存(再起動・クラッシュ後も残るようfsyncする)
+
+    入力: state - load_scheduler_state() と同じ形式の辞書
+    """
+    SCHEDULER_STATE_FILE.parent.mkdir(exist_ok=True)
+    tmp_path = SCHEDULER_STATE_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, SCHEDULER_STATE_FILE)
+
+
+def get_hour_bucket(ts: datetime) -> datetime:
+    """日時を含む正時区切りの時間帯の開始時刻"""
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def is_hour_summarized(hourly_summary_file: Path, hour_start: datetime) -> bool:
+    """
+    指定の時間帯の要約が既に保存されているか
+
+    入力:
+        hourly_summary_file - hourly summaryのファイル
+        hour_start - 時間帯の開始時刻
+    出力: 保存済みならTrue
+    """
+    bucket = hour_start.isoformat()
+    return any(entry.get("bucket") == bucket for entry in read_jsonl(hourly_summary_file))
+
+
+def summarize_hourly_activities(hour_start: datetime) -> bool:
+    """
+    正時区切りの1時間分(hour_start〜+1時間)のアクティビティログを要約し、hourly summaryとして保存
+
+    同じ時間帯の要約が既にあれば何もしない(再起動後の再実行でも重複しない)。
+
+    入力: hour_start - 要約する時間帯の開始時刻(正時)
+    出力: その時間帯の処理が完了したらTrue(保存済み・対象なしを含む)、
+          エラーやAPIキー未設定で要約できず再試行が必要ならFalse
     """
     if not GEMINI_API_KEY:
         print("Gemini API key not set. Skipping hourly summary.")
-        return
+        return False
 
-    now = datetime.now()
-    hour_ago = now - timedelta(hours=1)
-    today = now.strftime("%Y-%m-%d")
-    monthly_dir = get_monthly_logs_dir(now)
-    log_file = monthly_dir / f"activity_{today}.jsonl"
+    hour_end = hour_start + timedelta(hours=1)
+    day = hour_start.strftime("%Y-%m-%d")
+    monthly_dir = get_monthly_logs_dir(hour_start)
+    log_file = monthly_dir / f"activity_{day}.jsonl"
+    hourly_summary_file = monthly_dir / f"hourly_summary_{day}.jsonl"
 
     if not log_file.exists():
-        return
+        return True
+
+    if is_hour_summarized(hourly_summary_file, hour_start):
+        print(f"Hourly summary for {day} {hour_start.strftime('%H:00')} already exists.")
+        return True
 
-    # 過去1時間分のログを収集
-    activities = []
+    # 対象の時間帯の作業セッションを収集(1分ごとのレコードを連続した作業ごとにまとめたもの)
     try:
-        with open(log_file, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                entry = json.loads(line)
-                timestamp = datetime.fromisoformat(entry["timestamp"])
-                if timestamp >= hour_ago:
-                    activities.append(
-                        {
-                            "time": timestamp.strftime("%H:%M"),
-                            "app": entry["application"],
-                            "window": entry.get("window_title", ""),
-                            "ocr": entry.get("ocr_text", ""),  # 全文使用
-                        }
-                    )
+        hour_sessions = load_sessions(day, hour_start, hour_end)
     except Exception as e:
-        print(f"Error loading logs for hourly summary: {e}")
-        return
-
-    if not activities:
-        print("No activities found in the past hour. Skipping hourly summary.")
-        return
+        print(f"Error loading sessions for hourly summary: {e}")
+        return False
 
-    print(f"Generating hourly summary from {len(activities)} activities...")
+    if not hour_sessions:
+        print(f"No activities found in {day} {hour_start.strftime('%H:00')}. Skipping hourly summary.")
+        return True
 
-    # まとめて要約
-    summary_text = "\n".join(
-        [f"[{a['time']}] {a['app']} - {a['window']}: {a['ocr']}" for a in activities]
+    activities_count = sum(session["captures"] for session in hour_sessions)
+    print(
+        f"Generating hourly summary from {activities_count} activities "
+        f"({len(hour_sessions)} sessions)..."
     )
 
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
+    # まとめて要約(OCRテキストはセッション内で重複を除いたもの)
+    summary_text = "\n".join(format_session_line(session, with_ocr=True) for session in hour_sessions)
 
+    try:
         prompt = f"""あなたは作業ログから活動内容を要約するアシスタントです。
 
-以下は過去1時間の作業ログです。
+以下は{hour_start.strftime('%H:00')}からの1時間の作業ログです。
+各行は同じアプリで連続した作業のまとまり(時間帯・作業時間・ウィンドウタイトル・同時に表示していたウィンドウ・画面のテキスト)です。
 時系列で主な作業内容を3-5行で日本語で要約してください:
 
 {summary_text}
 """
 
-        response = client.models.generate_content(
-            model="gemini-3-pro-preview",
-            contents=prompt,
-        )
+        summary = generate_summary_text(prompt)
+        if not summary:
+            return False
 
-        summary = response.text
-        if summary:
-            # hourly summaryを保存
-            hourly_summary_file = monthly_dir / f"hourly_summary_{today}.jsonl"
-            with open(hourly_summary_file, "a", encoding="utf-8") as f:
-                json.dump(
+        # hourly summaryを保存(ロック中に再確認し、並行実行でも1時間帯1件にする)
+        with log_write_lock():
+            if not is_hour_summarized(hourly_summary_file, hour_start):
+                append_jsonl(
+                    hourly_summary_file,
                     {
-                        "timestamp": now.isoformat(),
-                        "hour": now.strftime("%H:00"),
-                        "activities_count": len(activities),
+                        "timestamp": clock.now().isoformat(),
+                        "hour": hour_start.strftime("%H:00"),
+                        "bucket": hour_start.isoformat(),
+                        "activities_count": activities_count,
                         "summary": summary.strip(),
                     },
-                    f,
-                    ensure_ascii=False,
                 )
-                f.write("\n")
 
-            print(f"Hourly summary saved: {now.strftime('%H:00')}")
+        print(f"Hourly summary saved: {day} {hour_start.strftime('%H:00')}")
+        return True
 
     except Exception as e:
         print(f"Error generating hourly summary: {e}")
+        return False
 
 
-def save_log_entry(entry: Dict) -> None:
+def summarize_pending_hours(last_summarized: datetime, current_hour: datetime) -> datetime:
+    """
+    チェックポイントの次の時間帯から、現在の時間帯の直前までを古い順に要約
+
+    1時間帯ごとにチェックポイントを保存するため、途中で停止しても続きから再開できる。
+    失敗した時間帯は失敗回数を記録して次回に再試行し、SUMMARY_MAX_ATTEMPTS 回失敗したら
+    skipped_hours に記録して次の時間帯へ進む(1時間帯のせいで以降の要約が止まらないように)。
+    APIキーが未設定の場合は失敗として数えず、チェックポイントも進めない
+    (キーを設定して再起動すれば、その間の時間帯も要約される)。
+
+    入力:
+        last_summarized - 要約済みの最後の時間帯の開始時刻
+        current_hour - 現在の時間帯の開始時刻(進行中のため要約しない)
+    出力: 更新後の、要約済みの最後の時間帯の開始時刻
+    """
+    if not GEMINI_API_KEY:
+        print("Gemini API key not set. Hourly summaries will be backfilled once it is set.")
+        return last_summarized
+
+    state = load_scheduler_state()
+    failed_attempts = state.get("failed_attempts", {})
+    skipped_hours = state.get("skipped_hours", [])
+
+    next_hour = last_summarized + timedelta(hours=1)
+    while next_hour < current_hour:
+        bucket = next_hour.isoformat()
+        if not summarize_hourly_activities(next_hour):
+            failed_attempts[bucket] = failed_attempts.get(bucket, 0) + 1
+            if failed_attempts[bucket] < SUMMARY_MAX_ATTEMPTS:
+                save_scheduler_state({**state, "failed_attempts": failed_attempts})
+                break
+            print(
+                f"Giving up hourly summary for {next_hour.strftime('%Y-%m-%d %H:00')} "
+                f"after {failed_attempts[bucket]} failed attempt(s)."
+            )
+            skipped_hours = (skipped_hours + [bucket])[-100:]
+        failed_attempts.pop(bucket, None)
+        last_summarized = next_hour
+        state = {
+            **state,
+            "last_summarized_hour": last_summarized.isoformat(),
+            "failed_attempts": failed_attempts,
+            "skipped_hours": skipped_hours,
+        }
+        save_scheduler_state(state)
+        next_hour += timedelta(hours=1)
+    return last_summarized
+
+
+def save_log_entry(entry: Dict) -> Path:
     """
     JSONL形式でログを記録
 
     入力: ログエントリ(dict)
+    出力: 記録先のログファイルパス
     """
-    now = datetime.now()
+    now = clock.now()
     today = now.strftime("%Y-%m-%d")
     monthly_dir = get_monthly_logs_dir(now)
     log_file = monthly_dir / f"activity_{today}.jsonl"
 
+    # 秘密情報・個人情報はディスクに書く前にマスク(以降の要約・検索・レポートにも残らない)
     try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            json.dump(entry, f, ensure_ascii=False)
-            f.write("\n")
+        redact_entry(entry)
+    except Exception as e:
+        # マスクできなかった場合は該当フィールドを残さない(ロールアップ・検索・要約に流さない)
+        print(f"Error redacting log entry: {e}")
+        for field in REDACTED_FIELDS:
+            if entry.get(field):
+                entry[field] = "[REDACTED:error]"
+
+    try:
+        with log_write_lock():
+            append_jsonl(log_file, entry)
+            # アプリ別の作業時間ロールアップを更新
+            try:
+                record_rollup(entry, CAPTURE_INTERVAL)
+            except Exception as e:
+                print(f"Error updating rollups: {e}")
     except Exception as e:
         print(f"Error saving log entry: {e}")
 
+    return log_file
+
 
 def load_todays_logs() -> List[Dict]:
     """
@@ -298,7 +480,7 @@ def load_todays_logs() -> List[Dict]:
 
     出力: ログエントリのリスト
     """
-    now = datetime.now()
+    now = clock.now()
     today = now.strftime("%Y-%m-%d")
     monthly_dir = get_monthly_logs_dir(now)
     log_file = monthly_dir / f"activity_{today}.jsonl"
@@ -319,74 +501,247 @@ def load_todays_logs() -> List[Dict]:
     return logs
 
 
-def main_loop() -> None:
+def capture_with_ocr(window_id: Optional[str], window_info: Dict[str, str]) -> bool:
     """
-    メインループ: 1分ごとに実行し、1時間ごとに要約
+    最前面ウィンドウをキャプチャしてその場でOCRし、ログを記録
+
+    入力:
+        window_id - キャプチャするウィンドウのID
+        window_info - アクティブウィンドウ情報
+    出力: 成功したらTrue、失敗したらFalse
     """
-    print("macOS Activity Logger started.")
-    print(f"Capturing every {CAPTURE_INTERVAL} seconds.")
-    print(f"Hourly summary will be generated every hour.")
-    print("Press Ctrl+C to stop.\n")
+    # Capture screenshot of the frontmost window
+    if not capture_screenshot(window_id):
+        return False
+
+    # Perform OCR
+    ocr_text = perform_ocr(SCREENSHOT_PATH)
 
-    last_hourly_summary = datetime.now().replace(minute=0, second=0, microsecond=0)
+    # Create log entry (OCR text only, no LLM summary yet)
+    log_entry = {
+        "timestamp": clock.now().isoformat(),
+        "application": window_info["application"],
+        "window_title": window_info["window_title"],
+        "ocr_text": ocr_text,  # Full OCR text for better context
+    }
 
+    # Save log
+    save_log_entry(log_entry)
+
+    # Clean up screenshot
     try:
-        while True:
-            # Get frontmost window ID for accurate capture
-            window_id = get_frontmost_window_id()
+        if Path(SCREENSHOT_PATH).exists():
+            Path(SCREENSHOT_PATH).unlink()
+    except Exception as e:
+        print(f"Error deleting screenshot: {e}")
 
-            # Get active window info
-            window_info = get_active_window_info()
+    return True
 
-            if not window_info["application"]:
-                print("No active window found. Skipping this cycle.")
-                time.sleep(CAPTURE_INTERVAL)
-                continue
 
-            print(
-                f"Capturing: {window_info['application']} - {window_info['window_title']}"
+def capture_deferred(window_id: Optional[str], window_info: Dict[str, str]) -> bool:
+    """
+    OCR遅延モードのキャプチャ: 圧縮画像をキューに積み、OCRなしでログを記録
+
+    入力:
+        window_id - キャプチャするウィンドウのID
+        window_info - アクティブウィンドウ情報
+    出力: 成功したらTrue、失敗したらFalse
+    """
+    now = clock.now()
+    capture_id = capture_queue.new_capture_id(now)
+    image_path = capture_queue.get_image_path(capture_id)
+
+    if not capture_screenshot(window_id, str(image_path), "jpg"):
+        return False
+
+    # ログを先に書いてからキューに登録する(ドレイン時に書き戻し先が必ず存在するように)
+    log_entry = {
+        "timestamp": now.isoformat(),
+        "application": window_info["application"],
+        "window_title": window_info["window_title"],
+        "ocr_text": "",
+        "capture_id": capture_id,
+        "ocr_pending": True,
+    }
+    log_file = save_log_entry(log_entry)
+
+    capture_queue.enqueue(
+        capture_id,
+        {
+            "timestamp": log_entry["timestamp"],
+            "application": log_entry["application"],
+            "window_title": log_entry["window_title"],
+            "log_file": str(log_file),
+        },
+    )
+    return True
+
+
+def capture_frontmost() -> bool:
+    """
+    最前面ウィンドウを1件キャプチャして記録(デフォルトのキャプチャモード)
+
+    出力: 記録できたらTrue、スキップした場合はFalse
+    """
+    # Get frontmost window ID for accurate capture
+    window_id = get_frontmost_window_id()
+
+    # Get active window info
+    window_info = get_active_window_info()
+
+    if not window_info["application"]:
+        print("No active window found. Skipping this cycle.")
+        return False
+
+    print(f"Capturing: {window_info['application']} - {window_info['window_title']}")
+
+    if DEFERRED_OCR:
+        # Capture and enqueue only; OCR is backfilled by the drain worker
+        captured = capture_deferred(window_id, window_info)
+    else:
+        captured = capture_with_ocr(window_id, window_info)
+
+    if not captured:
+        print("Failed to capture screenshot. Skipping this cycle.")
+        return False
+
+    print(f"Logged: {window_info['application']}\n")
+    return True
+
+
+def process_capture_target(index: int, target: CaptureTarget, cycle_id: str) -> Optional[Dict]:
+    """
+    複数キャプチャモードで1つの対象をキャプチャし、ログエントリを作成(保存はしない)
+
+    並列に呼び出されるため、画像の保存先は対象ごとに分ける。
+
+    入力:
+        index - サイクル内での対象の順番
+        target - キャプチャ対象
+        cycle_id - 同じサイクルのレコードで共有するID
+    出力: ログエントリ、キャプチャ失敗時はNone
+    """
+    now = clock.now()
+    window_id = target.target_id if target.kind == "window" else None
+    display_id = target.target_id if target.kind == "display" else None
+
+    log_entry = {
+        "timestamp": now.isoformat(),
+        "application": target.application,
+        "window_title": target.window_title,
+        "ocr_text": "",
+        "cycle_id": cycle_id,
+        "capture_source": f"{target.kind}:{target.target_id}",
+    }
+
+    if DEFERRED_OCR:
+        capture_id = f"{capture_queue.new_capture_id(now)}-{index:02d}"
+        image_path = capture_queue.get_image_path(capture_id)
+        if not capture_screenshot(window_id, str(image_path), "jpg", display_id):
+            return None
+        log_entry["capture_id"] = capture_id
+        log_entry["ocr_pending"] = True
+        return log_entry
+
+    image_path = f"/tmp/maclogger_screenshot_{target.kind}_{target.target_id}.png"
+    if not capture_screenshot(window_id, image_path, "png", display_id):
+        return None
+    try:
+        log_entry["ocr_text"] = perform_ocr(image_path)
+    finally:
+        Path(image_path).unlink(missing_ok=True)
+    return log_entry
+
+
+def capture_multiple(source: CaptureSource) -> int:
+    """
+    ソースが列挙した全対象を並列にキャプチャ・OCRし、共通のcycle_idで記録
+
+    入力: source - キャプチャ対象のソース
+    出力: 記録したレコード数
+    """
+    cycle_id = clock.now().strftime("%Y%m%d-%H%M%S")
+    entries = run_capture_cycle(
+        source,
+        lambda index, target: process_capture_target(index, target, cycle_id),
+        CAPTURE_WORKERS,
+    )
+
+    # 書き込みは列挙順に直列で行う
+    for entry in entries:
+        log_file = save_log_entry(entry)
+        if entry.get("ocr_pending"):
+            capture_queue.enqueue(
+                entry["capture_id"],
+                {
+                    "timestamp": entry["timestamp"],
+                    "application": entry["application"],
+                    "window_title": entry["window_title"],
+                    "log_file": str(log_file),
+                },
             )
+    return len(entries)
 
-            # Capture screenshot of the frontmost window
-            if not capture_screenshot(window_id):
-                print("Failed to capture screenshot. Skipping this cycle.")
-                time.sleep(CAPTURE_INTERVAL)
-                continue
-
-            # Perform OCR
-            ocr_text = perform_ocr(SCREENSHOT_PATH)
-
-            # Create log entry (OCR text only, no LLM summary yet)
-            log_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "application": window_info["application"],
-                "window_title": window_info["window_title"],
-                "ocr_text": ocr_text,  # Full OCR text for better context
-            }
 
-            # Save log
-            save_log_entry(log_entry)
-            print(f"Logged: {window_info['application']}\n")
+def main_loop() -> None:
+    """
+    メインループ: 1分ごとに実行し、1時間ごとに要約
+    """
+    print("macOS Activity Logger started.")
+    print(f"Capturing every {CAPTURE_INTERVAL} seconds.")
+    print(f"Hourly summary will be generated every hour.")
+    if DEFERRED_OCR:
+        print("Deferred OCR mode: run src/ocr_drain.py to process the capture queue.")
+    print("Press Ctrl+C to stop.\n")
 
-            # Clean up screenshot
-            try:
-                if Path(SCREENSHOT_PATH).exists():
-                    Path(SCREENSHOT_PATH).unlink()
-            except Exception as e:
-                print(f"Error deleting screenshot: {e}")
+    capture_source = create_capture_source(CAPTURE_MODE, CAPTURE_MAX_WINDOWS)
+    if capture_source:
+        print(f"Multi-capture mode: {CAPTURE_MODE} ({CAPTURE_WORKERS} workers)")
+
+    # チェックポイントがあれば停止中に過ぎた時間帯も要約し、なければ現在の時間帯から開始
+    state = load_scheduler_state()
+    try:
+        last_hourly_summary = datetime.fromisoformat(state["last_summarized_hour"])
+    except (KeyError, TypeError, ValueError):
+        last_hourly_summary = get_hour_bucket(clock.now()) - timedelta(hours=1)
+        save_scheduler_state({"last_summarized_hour": last_hourly_summary.isoformat()})
+    next_summary_retry = None
 
-            # Check if we should generate hourly summary (毎正時)
-            now = datetime.now()
-            current_hour = now.replace(minute=0, second=0, microsecond=0)
-            if current_hour > last_hourly_summary:
+    try:
+        while True:
+            if capture_source:
+                count = capture_multiple(capture_source)
+                if count:
+                    print(f"Logged {count} capture(s) in this cycle.\n")
+                else:
+                    print("No capture targets found. Skipping this cycle.")
+            else:
+                capture_frontmost()
+
+            # Check if we should generate hourly summary (毎正時、要約していない時間帯を順に)
+            now = clock.now()
+            current_hour = get_hour_bucket(now)
+            pending = last_hourly_summary + timedelta(hours=1) < current_hour
+            if pending and (next_summary_retry is None or now >= next_summary_retry):
                 print("\n" + "=" * 50)
                 print("Generating hourly summary...")
                 print("=" * 50 + "\n")
-                summarize_hourly_activities()
-                last_hourly_summary = current_hour
+                last_hourly_summary = summarize_pending_hours(last_hourly_summary, current_hour)
+                if last_hourly_summary + timedelta(hours=1) < current_hour:
+                    next_summary_retry = now + timedelta(seconds=SUMMARY_RETRY_SECONDS)
+                    print(f"Hourly summary will be retried after {next_summary_retry.strftime('%H:%M')}.")
+                else:
+                    next_summary_retry = None
+
+                # 検索インデックスを差分更新(追記分のみなので軽い)
+                try:
+                    added = update_search_index()
+                    print(f"Search index updated: {added} new document(s)")
+                except Exception as e:
+                    print(f"Error updating search index: {e}")
 
             # Wait for next cycle
-            time.sleep(CAPTURE_INTERVAL)
+            clock.sleep(CAPTURE_INTERVAL)
 
     except KeyboardInterrupt:
         print("\n\nStopping macOS Activity Logger...")
@@ -402,6 +757,11 @@ def main_loop() -> None:
 
 
 if __name__ == "__main__":
+    if ocrmac is None:
+        print("Error: ocrmac is required.")
+        print("Install with: pip install ocrmac")
+        sys.exit(1)
+
     if not GEMINI_API_KEY:
         print("Warning: GEMINI_API_KEY not set. LLM features will be disabled.")
         print("Set it with: export GEMINI_API_KEY=your_key")
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Deferred OCR Drain Worker
+
+OCR遅延モードでキューに溜まったキャプチャを、アイドル時またはAC電源接続時に
+まとめてOCRし、アクティビティログの ocr_text をバックフィルします。
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List
+from dotenv import load_dotenv
+
+import capture_queue
+from log_store import log_write_lock, read_jsonl, write_jsonl_atomic
+from maclogger import ocrmac, recognize_text
+from redaction import redact_text
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+DRAIN_BATCH_SIZE = int(os.getenv("OCR_DRAIN_BATCH_SIZE", "30"))
+DRAIN_IDLE_SECONDS = int(os.getenv("OCR_DRAIN_IDLE_SECONDS", "300"))
+DRAIN_POLL_INTERVAL = 60  # seconds
+
+
+def is_on_ac_power() -> bool:
+    """
+    AC電源に接続されているか確認
+
+    出力: AC電源ならTrue、バッテリー駆動または取得失敗時はFalse
+    """
+    try:
+        result = subprocess.run(
+            ["pmset", "-g", "batt"], capture_output=True, text=True, timeout=5
+        )
+        return result.returncode == 0 and "AC Power" in result.stdout
+    except Exception:
+        return False
+
+
+def get_idle_seconds() -> float:
+    """
+    最後のキーボード・マウス操作からの経過秒数を取得
+
+    出力: アイドル秒数、取得できない場合は0
+    """
+    try:
+        result = subprocess.run(
+            ["ioreg", "-c", "IOHIDSystem", "-d", "4"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+        match = re.search(r'"HIDIdleTime" = (\d+)', result.stdout)
+        if match:
+            return int(match.group(1)) / 1_000_000_000
+    except Exception:
+        pass
+    return 0.0
+
+
+def should_drain() -> bool:
+    """
+    キューを処理してよい状態か判定(AC電源接続中、またはアイドル中)
+
+    出力: 処理してよければTrue
+    """
+    return is_on_ac_power() or get_idle_seconds() >= DRAIN_IDLE_SECONDS
+
+
+def backfill_ocr_text(log_file: Path, ocr_results: Dict[str, str]) -> int:
+    """
+    アクティビティログの該当レコードに ocr_text を書き戻す
+
+    入力:
+        log_file - 対象のアクティビティログ
+        ocr_results - {capture_id: OCRテキスト}
+    出力: 更新したレコード数
+    """
+    with log_write_lock():
+        entries = read_jsonl(log_file)
+        updated = 0
+        for entry in entries:
+            capture_id = entry.get("capture_id")
+            if capture_id in ocr_results and entry.get("ocr_pending"):
+                entry["ocr_text"] = ocr_results[capture_id]
+                entry.pop("ocr_pending", None)
+                updated += 1
+        if updated:
+            write_jsonl_atomic(log_file, entries)
+    return updated
+
+
+def drain_once(batch_size: int = DRAIN_BATCH_SIZE) -> int:
+    """
+    キューから最大batch_size件を取り出してOCRし、ログにバックフィル
+
+    入力: batch_size - 1回に処理する最大件数
+    出力: 処理した件数(OCRに失敗してキューに残したものは含まない)
+    """
+    batch = capture_queue.list_pending()[:batch_size]
+    if not batch:
+        return 0
+
+    # ログファイルごとにまとめて書き戻す
+    results_by_file: Dict[str, Dict[str, str]] = {}
+    for item in batch:
+        try:
+            text = redact_text(recognize_text(item["image_path"]))
+        except Exception as e:
+            # 空のテキストで書き戻さず、キューに残して次回に再試行する
+            print(f"Error performing OCR on {item['capture_id']}: {e}")
+            if capture_queue.record_failure(item):
+                print(f"Dropped {item['capture_id']} after {capture_queue.MAX_OCR_ATTEMPTS} failed attempt(s)")
+            continue
+        results_by_file.setdefault(item["log_file"], {})[item["capture_id"]] = text
+
+    processed = 0
+    for log_file, ocr_results in results_by_file.items():
+        try:
+            updated = backfill_ocr_text(Path(log_file), ocr_results)
+            print(f"Backfilled {updated} record(s) in {log_file}")
+        except Exception as e:
+            print(f"Error backfilling OCR text into {log_file}: {e}")
+            continue
+        for capture_id in ocr_results:
+            capture_queue.complete(capture_id)
+        processed += len(ocr_results)
+
+    return processed
+
+
+def drain_loop(force: bool = False, once: bool = False) -> None:
+    """
+    キューを定期的に確認し、条件を満たしたときにOCRを実行
+
+    入力:
+        force - Trueの場合、電源・アイドル状態に関係なく処理する
+        once - Trueの場合、キューが空になるまで処理して終了
+    """
+    print("Deferred OCR drain worker started.")
+    try:
+        while True:
+            pending: List[Dict] = capture_queue.list_pending()
+            if pending and (force or should_drain()):
+                print(f"Draining OCR queue ({len(pending)} pending)...")
+                while drain_once() and (force or should_drain()):
+                    pass
+            if once:
+                break
+            time.sleep(DRAIN_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        print("\nStopping drain worker...")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="OCR遅延モードのキューを処理し、アクティビティログにOCR結果を書き戻します"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="電源・アイドル状態に関係なく処理する",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="キューを1回処理して終了する",
+    )
+    args = parser.parse_args()
+
+    if ocrmac is None:
+        print("Error: ocrmac is required.")
+        print("Install with: pip install ocrmac")
+        sys.exit(1)
+
+    drain_loop(force=args.force, once=args.once)
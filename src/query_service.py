@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Local Query Service for macOS Activity Logger
+
+ログストアへの時間範囲・アプリ絞り込み・要約のクエリを、localhost限定の
+HTTPサービス(asyncio)として提供します。
+
+ログファイルはパース済みのレコードをメモリにキャッシュし、ロガーが追記した分だけを
+ファイルオフセットから読み足します。書き換え(inodeの変化・サイズの縮小)を検出した
+場合は読み込み直します。
+
+Endpoints (GET, JSON):
+    /health
+    /activity?from=ISO&to=ISO&app=Slack&ocr=1&limit=100
+    /summaries?date=YYYY-MM-DD
+    /summaries/latest
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from dotenv import load_dotenv
+
+from log_store import LOGS_DIR
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+HOST = "127.0.0.1"
+PORT = int(os.getenv("QUERY_SERVICE_PORT", "8765"))
+CACHE_MAX_FILES = 64
+DEFAULT_LIMIT = 1000
+
+
+class LogFileCache:
+    """
+    JSONLファイルのパース結果をキャッシュし、追記分だけを読み足す
+
+    {path: (inode, offset, records)} をLRUで保持する。
+    """
+
+    def __init__(self, max_files: int = CACHE_MAX_FILES):
+        self.max_files = max_files
+        self.files: "OrderedDict[Path, Tuple[int, int, List[Dict]]]" = OrderedDict()
+        self.locks: Dict[Path, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "appends": 0, "loads": 0}
+
+    async def get(self, path: Path) -> List[Dict]:
+        """
+        ファイルのレコード一覧を取得(必要な分だけ読み込み)
+
+        入力: path - JSONLファイル
+        出力: レコードのリスト(ファイルがなければ空)
+        """
+        lock = self.locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                self.files.pop(path, None)
+                return []
+
+            cached = self.files.get(path)
+            if cached and cached[0] == stat.st_ino and cached[1] == stat.st_size:
+                self.stats["hits"] += 1
+                self.files.move_to_end(path)
+                return cached[2]
+
+            if cached and cached[0] == stat.st_ino and cached[1] < stat.st_size:
+                inode, offset, records = cached
+                self.stats["appends"] += 1
+            else:
+                inode, offset, records = stat.st_ino, 0, []
+                self.stats["loads"] += 1
+
+            new_records, offset = await asyncio.to_thread(read_from_offset, path, offset)
+            records = records + new_records if cached else new_records
+            self.files[path] = (inode, offset, records)
+            self.files.move_to_end(path)
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+            return records
+
+
+def read_from_offset(path: Path, offset: int) -> Tuple[List[Dict], int]:
+    """
+    ファイルのoffset以降の完結した行を読み込む
+
+    入力:
+        path - JSONLファイル
+        offset - 読み込み開始位置
+    出力: (レコードのリスト, 読み込んだ位置)
+    """
+    records = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw_line in f:
+            # 書き込み途中の最終行は次回に回す
+            if not raw_line.endswith(b"\n"):
+                break
+            offset += len(raw_line)
+            try:
+                records.append(json.loads(raw_line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+    return records, offset
+
+
+def parse_datetime_param(value: str) -> datetime:
+    """
+    クエリパラメータの日時を解析
+
+    ログのタイムスタンプはタイムゾーンなしのローカル時刻のため、
+    オフセット付きの値はローカル時刻に変換してからタイムゾーン情報を外す。
+
+    入力: value - ISO 8601形式の日時
+    出力: タイムゾーンなしのローカル時刻(不正な形式はValueError)
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+class QueryService:
+    """ログストアに対するクエリの実装"""
+
+    def __init__(self, logs_dir: Path = LOGS_DIR):
+        self.logs_dir = logs_dir
+        self.cache = LogFileCache()
+
+    def log_path(self, kind: str, day: datetime) -> Path:
+        date_str = day.strftime("%Y-%m-%d")
+        return self.logs_dir / day.strftime("%Y") / day.strftime("%m") / f"{kind}_{date_str}.jsonl"
+
+    async def activity(
+        self, start: datetime, end: datetime, app: Optional[str], include_ocr: bool, limit: int
+    ) -> List[Dict]:
+        """
+        期間内のアクティビティを取得
+
+        入力:
+            start, end - 期間 [start, end)
+            app - アプリ名(部分一致、大文字小文字を区別しない)
+            include_ocr - Falseの場合は ocr_text を除く
+            limit - 最大件数
+        出力: レコードのリスト(時系列順)
+        """
+        start_iso, end_iso = start.isoformat(), end.isoformat()
+        needle = app.lower() if app else None
+        results = []
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day < end and len(results) < limit:
+            for record in await self.cache.get(self.log_path("activity", day)):
+                ts = record.get("timestamp", "")
+                if not (start_iso <= ts < end_iso):
+                    continue
+                if needle and needle not in record.get("application", "").lower():
+                    continue
+                if not include_ocr:
+                    record = {k: v for k, v in record.items() if k != "ocr_text"}
+                results.append(record)
+                if len(results) >= limit:
+                    break
+            day += timedelta(days=1)
+        return results
+
+    async def summaries(self, day: datetime) -> List[Dict]:
+        """指定日の hourly summary を取得"""
+        return await self.cache.get(self.log_path("hourly_summary", day))
+
+    async def latest_summary(self, max_days: int = 7) -> Optional[Dict]:
+        """直近の hourly summary を1件取得(最大max_days日さかのぼる)"""
+        day = datetime.now()
+        for _ in range(max_days):
+            records = await self.summaries(day)
+            if records:
+                return records[-1]
+            day -= timedelta(days=1)
+        return None
+
+    async def handle(self, path: str, params: Dict[str, str]) -> Tuple[int, object]:
+        """
+        リクエストを処理
+
+        入力:
+            path - URLパス
+            params - クエリパラメータ
+        出力: (HTTPステータス, レスポンスのJSONオブジェクト)
+        """
+        try:
+            if path == "/health":
+                return 200, {"status": "ok", "cache": self.cache.stats}
+
+            if path == "/activity":
+                now = datetime.now()
+                start = (
+                    parse_datetime_param(params["from"])
+                    if "from" in params
+                    else now.replace(hour=0, minute=0, second=0, microsecond=0)
+                )
+                end = parse_datetime_param(params["to"]) if "to" in params else now + timedelta(seconds=1)
+                records = await self.activity(
+                    start,
+                    end,
+                    params.get("app"),
+                    params.get("ocr") == "1",
+                    int(params.get("limit", DEFAULT_LIMIT)),
+                )
+                return 200, {"count": len(records), "records": records}
+
+            if path == "/summaries":
+                day = datetime.strptime(params["date"], "%Y-%m-%d") if "date" in params else datetime.now()
+                records = await self.summaries(day)
+                return 200, {"count": len(records), "summaries": records}
+
+            if path == "/summaries/latest":
+                summary = await self.latest_summary()
+                if summary is None:
+                    return 404, {"error": "No hourly summary found"}
+                return 200, summary
+
+            return 404, {"error": f"Not found: {path}"}
+        except (KeyError, ValueError) as e:
+            return 400, {"error": f"Invalid parameter: {e}"}
+        except Exception as e:
+            # 想定外のエラーでも接続を切らずにJSONで返す
+            print(f"Error handling {path}: {e}")
+            return 500, {"error": "Internal error"}
+
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+async def handle_connection(
+    service: QueryService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """1接続 = 1リクエストの最小限のHTTP/1.1処理"""
+    try:
+        request_line = await reader.readline()
+        # ヘッダーは読み捨てる
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2:
+            return
+        method, target = parts[0], parts[1]
+        if method != "GET":
+            status, body = 405, {"error": "Only GET is supported"}
+        else:
+            url = urlsplit(target)
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            status, body = await service.handle(url.path, params)
+
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1")
+            + payload
+        )
+        await writer.drain()
+    except Exception as e:
+        print(f"Error handling request: {e}")
+    finally:
+        writer.close()
+
+
+async def start_server(service: QueryService, host: str = HOST, port: int = PORT) -> asyncio.AbstractServer:
+    """localhostでHTTPサービスを開始"""
+    return await asyncio.start_server(
+        lambda r, w: handle_connection(service, r, w), host, port
+    )
+
+
+async def serve(port: int) -> None:
+    """サービスを起動して待ち受ける"""
+    server = await start_server(QueryService(), HOST, port)
+    print(f"Query service listening on http://{HOST}:{port}")
+    print("Press Ctrl+C to stop.")
+    async with server:
+        await server.serve_forever()
+
+
+async def http_get(port: int, target: str) -> Tuple[int, bytes]:
+    """ベンチマーク用の最小限のHTTPクライアント"""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(f"GET {target} HTTP/1.1\r\nHost: {HOST}\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status = int(response.split(b" ", 2)[1])
+    return status, response
+
+
+async def run_benchmark(clients: int, requests_per_client: int, records_per_day: int) -> None:
+    """
+    合成ログに対して同時接続の読み取り負荷をかけ、スループットとレイテンシを計測
+
+    計測中もロガーと同様に当日のログへ追記し、キャッシュの差分読み込みを発生させる。
+
+    入力:
+        clients - 同時接続数
+        requests_per_client - 1クライアントあたりのリクエスト数
+        records_per_day - 当日ログの初期レコード数
+    """
+    rng = random.Random(0)
+    apps = ["Slack", "Code", "Google Chrome", "Terminal"]
+
+    with tempfile.TemporaryDirectory(prefix="maclogger_query_bench_") as tmp:
+        logs_dir = Path(tmp) / "logs"
+        now = datetime.now()
+        day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        month_dir = logs_dir / now.strftime("%Y") / now.strftime("%m")
+        month_dir.mkdir(parents=True)
+        activity_file = month_dir / f"activity_{now.strftime('%Y-%m-%d')}.jsonl"
+        with open(activity_file, "w", encoding="utf-8") as f:
+            for i in range(records_per_day):
+                f.write(json.dumps({
+                    "timestamp": (day_start + timedelta(seconds=i * 60 * 1440 // records_per_day)).isoformat(),
+                    "application": rng.choice(apps),
+                    "window_title": "bench",
+                    "ocr_text": "x" * 400,
+                }) + "\n")
+        with open(month_dir / f"hourly_summary_{now.strftime('%Y-%m-%d')}.jsonl", "w", encoding="utf-8") as f:
+            for h in range(8):
+                f.write(json.dumps({"timestamp": (day_start + timedelta(hours=9 + h)).isoformat(), "hour": f"{9 + h:02d}:00", "summary": "bench"}) + "\n")
+
+        service = QueryService(logs_dir)
+        server = await start_server(service, HOST, 0)
+        port = server.sockets[0].getsockname()[1]
+
+        targets = [
+            "/activity?app=slack",
+            f"/activity?from={(day_start + timedelta(hours=10)).isoformat()}&to={(day_start + timedelta(hours=11)).isoformat()}",
+            "/summaries/latest",
+            "/summaries",
+        ]
+        latencies: List[float] = []
+        errors = 0
+
+        async def client() -> None:
+            nonlocal errors
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                status, _ = await http_get(port, rng.choice(targets))
+                latencies.append((time.perf_counter() - start) * 1000)
+                if status != 200:
+                    errors += 1
+
+        async def appender() -> None:
+            # 1秒あたり数件のペースで追記(実際のロガーより高頻度)
+            while True:
+                with open(activity_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"timestamp": datetime.now().isoformat(), "application": "Code", "window_title": "bench", "ocr_text": "y"}) + "\n")
+                await asyncio.sleep(0.2)
+
+        async with server:
+            await http_get(port, "/activity")  # キャッシュを温める
+            append_task = asyncio.create_task(appender())
+            start = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(clients)))
+            elapsed = time.perf_counter() - start
+            append_task.cancel()
+
+        latencies.sort()
+        total = len(latencies)
+        print(f"{clients} clients x {requests_per_client} requests, {records_per_day} records today")
+        print(f"Throughput: {total / elapsed:,.0f} req/s ({errors} errors)")
+        print(
+            f"Latency: p50 {latencies[total // 2]:.1f}ms, "
+            f"p95 {latencies[int(total * 0.95)]:.1f}ms, "
+            f"p99 {latencies[int(total * 0.99)]:.1f}ms"
+        )
+        print(f"Cache: {service.cache.stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="ログストアへのクエリをlocalhostのHTTPサービスとして提供します"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    serve_parser = subparsers.add_parser("serve", help="サービスを起動(デフォルト)")
+    serve_parser.add_argument("--port", type=int, default=PORT, help=f"ポート番号 (デフォルト: {PORT})")
+
+    bench_parser = subparsers.add_parser("bench", help="同時接続の負荷試験")
+    bench_parser.add_argument("--clients", type=int, default=50)
+    bench_parser.add_argument("--requests", type=int, default=100, help="1クライアントあたりのリクエスト数")
+    bench_parser.add_argument("--records", type=int, default=960, help="当日ログの初期レコード数")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "bench":
+            asyncio.run(run_benchmark(args.clients, args.requests, args.records))
+        else:
+            asyncio.run(serve(getattr(args, "port", PORT)))
+    except KeyboardInterrupt:
+        print("\nStopping query service...")
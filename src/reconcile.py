@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Plan vs Actual Reconciler for evaluation-system
+
+週次目標(evaluation-system/weekly-plans/YYYY-WXX-plan.md)の各項目と、
+週報(reports/weekly/YYYY-WXX.md)の箇条書きを突合し、
+evaluation-system/reconcile/YYYY-WXX-reconcile.md に結果を出力します。
+
+- 文字n-gramのTF-IDFでベクトル化し、疎行列の積で類似度を計算
+- 類似度が明確なものはそのまま判定し、曖昧なペアだけをGeminiで判定
+- ファイルごとのn-gram頻度をキャッシュし、新しい文書だけを処理
+"""
+
+import re
+import json
+import math
+import argparse
+import unicodedata
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from gemini_client import create_gemini_client, generate_content
+from gemini_limiter import PRIORITY_BATCH
+from generate_weekly_report import WEEKLY_REPORTS_DIR, get_iso_week_string
+
+# Configuration
+EVALUATION_DIR = Path("evaluation-system")
+WEEKLY_PLANS_DIR = EVALUATION_DIR / "weekly-plans"
+RECONCILE_DIR = EVALUATION_DIR / "reconcile"
+CACHE_FILE = RECONCILE_DIR / ".vector_cache.json"
+NGRAM_SIZES = (2, 3)
+MATCH_THRESHOLD = 0.35  # これ以上は達成とみなす
+AMBIGUOUS_THRESHOLD = 0.12  # これ以上MATCH_THRESHOLD未満はGeminiで判定
+
+LIST_ITEM_PATTERN = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?(.+?)\s*$")
+
+
+def extract_list_items(markdown: str) -> List[str]:
+    """
+    Markdownから箇条書きの項目を抽出
+
+    入力: markdown - Markdownテキスト
+    出力: 項目テキストのリスト(装飾を除去済み)
+    """
+    items = []
+    for line in markdown.splitlines():
+        match = LIST_ITEM_PATTERN.match(line)
+        if not match:
+            continue
+        text = re.sub(r"[*_`]", "", match.group(1)).strip()
+        # 時間帯だけの行(例: 09:00-09:59)や日付だけの行は除外
+        if len(text) < 4 or re.fullmatch(r"[\d:\-/ 〜~]+", text):
+            continue
+        items.append(text)
+    return items
+
+
+def char_ngrams(text: str) -> Dict[str, int]:
+    """
+    文字n-gramの出現回数を計算
+
+    日本語は単語区切りがないため、正規化した文字列の2-gram・3-gramを特徴量とする。
+
+    入力: text - テキスト
+    出力: {n-gram: 出現回数}
+    """
+    normalized = unicodedata.normalize("NFKC", text).lower()
+    normalized = re.sub(r"[\s\W_]+", "", normalized)
+    counts: Dict[str, int] = {}
+    for n in NGRAM_SIZES:
+        for i in range(len(normalized) - n + 1):
+            gram = normalized[i : i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def load_cache() -> Dict[str, Dict]:
+    """ベクトルキャッシュを読み込み"""
+    if not CACHE_FILE.exists():
+        return {}
+    try:
+        with open(CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(cache: Dict[str, Dict]) -> None:
+    """ベクトルキャッシュを保存"""
+    RECONCILE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = CACHE_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    tmp_path.replace(CACHE_FILE)
+
+
+def load_document(path: Path, cache: Dict[str, Dict]) -> List[Dict]:
+    """
+    文書の箇条書きとn-gram頻度を取得(更新されていなければキャッシュを使用)
+
+    入力:
+        path - Markdownファイル
+        cache - ベクトルキャッシュ(更新される)
+    出力: [{"text": 項目, "tf": {n-gram: 回数}}]
+    """
+    stat = path.stat()
+    cached = cache.get(str(path))
+    if cached and cached["mtime"] == stat.st_mtime and cached["size"] == stat.st_size:
+        return cached["items"]
+
+    with open(path, "r", encoding="utf-8") as f:
+        items = [{"text": text, "tf": char_ngrams(text)} for text in extract_list_items(f.read())]
+    cache[str(path)] = {"mtime": stat.st_mtime, "size": stat.st_size, "items": items}
+    print(f"  Vectorized {path} ({len(items)} items)")
+    return items
+
+
+def compute_idf(items: List[Dict]) -> Dict[str, float]:
+    """
+    突合する計画と週報の項目だけをコーパスとしてIDFを計算
+
+    キャッシュにある他の週の文書は含めないため、同じ週を突合し直せば
+    キャッシュの内容に関係なく同じ類似度になる。
+
+    入力: items - 計画と週報の項目 [{"text", "tf"}]
+    出力: {n-gram: IDF}
+    """
+    doc_freq: Dict[str, int] = {}
+    for item in items:
+        for gram in item["tf"]:
+            doc_freq[gram] = doc_freq.get(gram, 0) + 1
+    num_docs = len(items)
+    return {gram: math.log((1 + num_docs) / (1 + df)) + 1 for gram, df in doc_freq.items()}
+
+
+def tfidf_vector(tf: Dict[str, int], idf: Dict[str, float]) -> Dict[str, float]:
+    """
+    n-gram頻度からL2正規化したTF-IDFベクトルを作成
+
+    入力:
+        tf - {n-gram: 回数}
+        idf - {n-gram: IDF}
+    出力: {n-gram: 重み}
+    """
+    vector = {gram: (1 + math.log(count)) * idf.get(gram, 1.0) for gram, count in tf.items()}
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm == 0:
+        return {}
+    return {gram: w / norm for gram, w in vector.items()}
+
+
+def similarity_matrix(
+    plan_vectors: List[Dict[str, float]], report_vectors: List[Dict[str, float]]
+) -> List[List[float]]:
+    """
+    計画項目×実績項目のコサイン類似度行列を計算
+
+    実績側の転置インデックス(n-gram → [(列, 重み)])を作り、
+    疎行列の積 P・Rᵀ として非ゼロ要素だけを計算する。
+
+    入力:
+        plan_vectors - 計画項目のTF-IDFベクトル
+        report_vectors - 実績項目のTF-IDFベクトル
+    出力: 類似度行列 [計画][実績]
+    """
+    postings: Dict[str, List[Tuple[int, float]]] = {}
+    for j, vector in enumerate(report_vectors):
+        for gram, weight in vector.items():
+            postings.setdefault(gram, []).append((j, weight))
+
+    matrix = []
+    for vector in plan_vectors:
+        row = [0.0] * len(report_vectors)
+        for gram, weight in vector.items():
+            for j, report_weight in postings.get(gram, ()):
+                row[j] += weight * report_weight
+        matrix.append(row)
+    return matrix
+
+
+def judge_ambiguous_pairs(pairs: List[Dict]) -> Dict[int, bool]:
+    """
+    曖昧なペアをまとめてGeminiで判定
+
+    入力: pairs - [{"index": 計画項目の番号, "plan": str, "actual": str}]
+    出力: {計画項目の番号: 達成しているか}、判定できなかったものは含まない
+    """
+    if not pairs:
+        return {}
+
+    client = create_gemini_client()
+    if not client:
+        return {}
+
+    pair_text = "\n".join(
+        f'{p["index"]}. 計画: {p["plan"]}\n   実績: {p["actual"]}' for p in pairs
+    )
+    prompt = f"""あなたは週次目標の達成状況を判定するアシスタントです。
+
+以下の各ペアについて、実績が計画項目を達成(または明確に前進)しているかを判定してください。
+出力はJSON配列のみとし、説明は不要です。
+形式: [{{"index": 番号, "match": true または false}}]
+
+{pair_text}
+"""
+    response = generate_content(client, prompt, caller="reconcile", priority=PRIORITY_BATCH)
+    if not response:
+        return {}
+
+    match = re.search(r"\[.*\]", response, re.DOTALL)
+    if not match:
+        print("Warning: Could not parse Gemini response for ambiguous pairs.")
+        return {}
+    try:
+        return {int(item["index"]): bool(item["match"]) for item in json.loads(match.group(0))}
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        print("Warning: Could not parse Gemini response for ambiguous pairs.")
+        return {}
+
+
+def reconcile_week(week_str: str, use_llm: bool = True) -> Optional[Path]:
+    """
+    指定週の計画と週報を突合し、結果をMarkdownで出力
+
+    入力:
+        week_str - YYYY-WNN形式の週
+        use_llm - Falseの場合は曖昧なペアをGeminiに送らず「要確認」とする
+    出力: 出力したファイルパス、入力が揃っていない場合はNone
+    """
+    plan_file = WEEKLY_PLANS_DIR / f"{week_str}-plan.md"
+    report_file = WEEKLY_REPORTS_DIR / f"{week_str}.md"
+    for path in (plan_file, report_file):
+        if not path.exists():
+            print(f"Error: {path} not found.")
+            return None
+
+    cache = load_cache()
+    plan_items = load_document(plan_file, cache)
+    report_items = load_document(report_file, cache)
+    # 削除された文書はキャッシュから外す
+    for source in [s for s in cache if not Path(s).exists()]:
+        del cache[source]
+    save_cache(cache)
+
+    if not plan_items or not report_items:
+        print("Error: No list items found in the plan or the weekly report.")
+        return None
+
+    idf = compute_idf(plan_items + report_items)
+    matrix = similarity_matrix(
+        [tfidf_vector(item["tf"], idf) for item in plan_items],
+        [tfidf_vector(item["tf"], idf) for item in report_items],
+    )
+
+    results = []
+    ambiguous = []
+    for i, (item, row) in enumerate(zip(plan_items, matrix)):
+        best = max(range(len(row)), key=row.__getitem__)
+        score = row[best]
+        if score >= MATCH_THRESHOLD:
+            status = "達成"
+        elif score >= AMBIGUOUS_THRESHOLD:
+            status = "要確認"
+            ambiguous.append({"index": i, "plan": item["text"], "actual": report_items[best]["text"]})
+        else:
+            status = "未達"
+        results.append({"plan": item["text"], "actual": report_items[best]["text"], "score": score, "status": status})
+
+    print(
+        f"Matched {len(plan_items)} plan items against {len(report_items)} report items "
+        f"({len(ambiguous)} ambiguous)"
+    )
+
+    if use_llm and ambiguous:
+        print(f"Asking Gemini to judge {len(ambiguous)} ambiguous pair(s)...")
+        for index, matched in judge_ambiguous_pairs(ambiguous).items():
+            if 0 <= index < len(results) and results[index]["status"] == "要確認":
+                results[index]["status"] = "達成(LLM判定)" if matched else "未達(LLM判定)"
+
+    done = sum(1 for r in results if r["status"].startswith("達成"))
+    lines = [
+        f"# 計画vs実績 突合結果 - {week_str}",
+        "",
+        f"- 計画: `{plan_file}`",
+        f"- 実績: `{report_file}`",
+        f"- 達成: {done}/{len(results)}",
+        "",
+        "| 計画項目 | 判定 | 対応する実績 | 類似度 |",
+        "|---------|------|-------------|-------|",
+    ]
+    for r in results:
+        actual = r["actual"] if not r["status"].startswith("未達") else "-"
+        plan_text = r["plan"].replace("|", "\\|")
+        actual_text = actual.replace("|", "\\|")
+        lines.append(f"| {plan_text} | {r['status']} | {actual_text} | {r['score']:.2f} |")
+
+    RECONCILE_DIR.mkdir(parents=True, exist_ok=True)
+    output_file = RECONCILE_DIR / f"{week_str}-reconcile.md"
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+    print(f"Reconcile result generated: {output_file}")
+    return output_file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="週次目標と週報を突合し、計画vs実績をまとめます"
+    )
+    parser.add_argument(
+        "--date",
+        help="基準日 (YYYY-MM-DD形式、デフォルト: 今日)",
+        default=datetime.now().strftime("%Y-%m-%d"),
+    )
+    parser.add_argument(
+        "--no-llm",
+        action="store_true",
+        help="曖昧なペアをGeminiで判定しない",
+    )
+    args = parser.parse_args()
+
+    try:
+        target_date = datetime.strptime(args.date, "%Y-%m-%d")
+    except ValueError:
+        print(f"Invalid date format: {args.date}")
+        print("Please use YYYY-MM-DD format")
+        exit(1)
+
+    reconcile_week(get_iso_week_string(target_date), use_llm=not args.no_llm)
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Redaction Stage for macOS Activity Logger
+
+OCRテキストとウィンドウタイトルに含まれるAPIキー・パスワード・個人情報を、
+ログに書き込む前(=Geminiに送られる前)にマスクします。
+
+- 組み込みのパターンと redaction_patterns.txt の追加パターンを
+  1つの正規表現(名前付きグループの選択)にまとめてコンパイルし、テキストを1回だけ走査する
+- 顧客名などの固定文字列はトライ木から作った正規表現にまとめ、数百件でも1つの選択肢として扱う
+- 一致した部分は [REDACTED:パターン名] に置き換える
+
+パターンファイルの書式(1行1パターン、# で始まる行はコメント):
+
+    パターン名: 正規表現
+    keyword: 固定文字列
+
+正規表現の中でキャプチャグループは使わず (?:...) を使ってください。
+(?P<value>...) を含むパターンは、そのグループの部分だけをマスクします。
+"""
+
+import os
+import re
+import time
+import random
+import string
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+# アンカー抽出はCPythonの正規表現パーサー(非公開)を使う。Python 3.11で動作確認済み。
+# 内部構造が変わって使えない場合は、アンカーなし(全パターンを常に適用)で動作する。
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    try:
+        import sre_parse
+    except ImportError:
+        sre_parse = None
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+REDACTION_ENABLED = os.getenv("MACLOGGER_REDACTION", "1").lower() not in ("0", "false", "no")
+PATTERNS_FILE = Path(os.getenv("MACLOGGER_REDACTION_PATTERNS", "redaction_patterns.txt"))
+REDACTED_FIELDS = ("ocr_text", "window_title")
+COMPILED_CACHE_SIZE = 256  # パターンの組み合わせごとにコンパイルした正規表現のキャッシュ
+
+# 組み込みのパターン: (名前, 正規表現)
+# re.ASCII でコンパイルするため、\b は日本語の文字と英数字の境界でも一致する
+BUILTIN_PATTERNS: List[Tuple[str, str]] = [
+    ("private_key", r"-----BEGIN [A-Z ]*PRIVATE KEY-----(?:[\s\S]{0,8000}?-----END [A-Z ]*PRIVATE KEY-----)?"),
+    ("aws_access_key", r"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b"),
+    ("aws_secret_key", r"(?i:aws_secret_access_key)\s*[:=]\s*(?P<value>[A-Za-z0-9/+=]{40})"),
+    ("github_token", r"\b(?:gh[pousr]_[A-Za-z0-9]{36,}|github_pat_[A-Za-z0-9_]{22,})"),
+    ("gitlab_token", r"\bglpat-[A-Za-z0-9_\-]{20,}"),
+    ("slack_token", r"\bxox[abprs]-[A-Za-z0-9\-]{10,}"),
+    ("slack_webhook", r"https://hooks\.slack\.com/services/[A-Za-z0-9/]+"),
+    ("google_api_key", r"\bAIza[0-9A-Za-z_\-]{35}"),
+    ("openai_api_key", r"\bsk-(?:proj-|ant-)?[A-Za-z0-9_\-]{20,}"),
+    ("stripe_key", r"\b[rs]k_(?:live|test)_[A-Za-z0-9]{16,}"),
+    ("azure_account_key", r"AccountKey=(?P<value>[A-Za-z0-9+/=]{40,})"),
+    ("jwt", r"\beyJ[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,}\.[A-Za-z0-9_\-]{10,}"),
+    ("bearer_token", r"(?i:bearer)\s+(?P<value>[A-Za-z0-9\-._~+/]{20,}=*)"),
+    ("url_credentials", r"\b[a-z][a-z0-9+.\-]*://[^\s/:@]+:(?P<value>[^\s/@]+)@"),
+    (
+        "password_assignment",
+        r"(?i:password|passwd|pwd|passphrase|secret|api[_\-]?key|access[_\-]?token|パスワード|暗証番号)"
+        r"[\"']?\s*[:=：]\s*[\"']?(?P<value>[^\s\"',;]{4,})",
+    ),
+    ("email", r"\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}\b"),
+    ("credit_card", r"(?<!\d)(?:\d{4}[ \-]?){3}\d{4}(?!\d)"),
+    ("phone_jp", r"(?<![\d\-])0(?:\d{1,4}-\d{1,4}-\d{3,4}|[789]0\d{8})(?![\d\-])"),
+    ("phone_intl", r"\+\d{1,3}[ \-]?\d{1,4}[ \-]?\d{2,4}[ \-]?\d{3,4}(?!\d)"),
+    ("postal_code_jp", r"〒\s?\d{3}-?\d{4}"),
+    ("my_number", r"(?<![\d\-])\d{4} \d{4} \d{4}(?![\d\-])"),
+]
+
+_redactor_cache: Dict[Path, Tuple[Optional[float], "Redactor"]] = {}
+
+
+def build_keyword_regex(keywords: List[str]) -> str:
+    """
+    固定文字列のリストを、共通の接頭辞をまとめた1つの正規表現に変換
+
+    "ACME株式会社" と "ACME商事" は ACME(?:株式会社|商事) のようになり、
+    件数が増えても先頭の文字で候補が絞られる。
+
+    入力: keywords - 固定文字列のリスト
+    出力: 正規表現(キャプチャグループなし)
+    """
+    trie: Dict = {}
+    for keyword in keywords:
+        if not keyword:
+            continue
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_regex(node: Dict) -> str:
+        branches = []
+        optional = False
+        for char in sorted(node):
+            if char == "":
+                optional = True
+                continue
+            branches.append(re.escape(char) + to_regex(node[char]))
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        if all(len(b) == 1 for b in branches):
+            body = "[" + "".join(branches) + "]"
+        else:
+            body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if optional else body
+
+    return to_regex(trie)
+
+
+def load_patterns_file(path: Path) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    追加パターンのファイルを読み込み
+
+    入力: path - パターンファイル
+    出力: ([(名前, 正規表現)], [固定文字列])
+    """
+    patterns = []
+    keywords = []
+    if not path.exists():
+        return patterns, keywords
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, sep, value = line.partition(":")
+            name, value = name.strip(), value.strip()
+            if not sep or not name or not value:
+                print(f"Warning: Invalid redaction pattern at {path}:{line_no}")
+                continue
+            if name == "keyword":
+                keywords.append(value)
+            else:
+                patterns.append((name, value))
+    return patterns, keywords
+
+
+def extract_anchors(regex: str) -> Optional[List[str]]:
+    """
+    パターンに一致するテキストに必ず含まれる固定文字列を抽出
+
+    例: \\b(?:AKIA|ASIA)[0-9A-Z]{16} → ["KIA", "SIA"] (どちらかが必ず含まれる)
+
+    入力: regex - 正規表現
+    出力: 固定文字列の候補(いずれか1つは必ず含まれる)、抽出できなければNone
+    """
+    if sre_parse is None:
+        return None
+    try:
+        parsed = sre_parse.parse(regex, re.ASCII)
+        if parsed.state.flags & sre_parse.SRE_FLAG_IGNORECASE:
+            return None
+        return _sequence_anchors(list(parsed))
+    except Exception:
+        # 非公開のパーサーの仕様が変わっても、アンカーなしとして常に適用する(マスク漏れを起こさない)
+        return None
+
+
+def _sequence_anchors(items: List) -> Optional[List[str]]:
+    best: Optional[List[str]] = None
+
+    def consider(candidates: Optional[List[str]]) -> None:
+        nonlocal best
+        if not candidates or min(len(c) for c in candidates) == 0:
+            return
+        if best is None or min(len(c) for c in candidates) > min(len(c) for c in best):
+            best = candidates
+
+    run: List[str] = []
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        if op is sre_parse.BRANCH and run:
+            # 共通の接頭辞が括り出された選択 (A(?:KIA|SIA)) は接頭辞と各選択肢の先頭をつなげる
+            leads = [_leading_literals(list(sub)) for sub in av[1]]
+            if all(leads):
+                consider(["".join(run) + lead for lead in leads])
+        consider(["".join(run)] if run else None)
+        run = []
+        if op is sre_parse.SUBPATTERN:
+            _, add_flags, _, sub = av
+            if not add_flags & sre_parse.SRE_FLAG_IGNORECASE:
+                consider(_sequence_anchors(list(sub)))
+        elif op is sre_parse.BRANCH:
+            alternatives = [_sequence_anchors(list(sub)) for sub in av[1]]
+            if all(alternatives):
+                consider([anchor for anchor_list in alternatives for anchor in anchor_list])
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            consider(_sequence_anchors(list(av[2])))
+    consider(["".join(run)] if run else None)
+    return best
+
+
+def _leading_literals(items: List) -> str:
+    lead = []
+    for op, av in items:
+        if op is not sre_parse.LITERAL:
+            break
+        lead.append(chr(av))
+    return "".join(lead)
+
+
+class Redactor:
+    """
+    複数のパターンを1つの正規表現にまとめ、1回の走査でマスクする
+
+    CPythonの正規表現は選択肢を位置ごとに1つずつ試すため、数百の選択肢を単純に
+    並べると遅くなる。そこで各パターンが必ず含む固定文字列(アンカー)を抽出しておき、
+    まずアンカー全体をまとめたトライ木の正規表現で1回走査して、テキストに現れた
+    アンカーを持つパターンと、アンカーのないパターンだけで選択肢を組み立てる。
+    組み立てた正規表現は組み合わせごとにキャッシュする。
+    """
+
+    def __init__(self, patterns: List[Tuple[str, str]], keywords: Optional[List[str]] = None):
+        self.names: List[str] = []
+        self.alternatives: List[str] = []
+        # マスクする範囲を (?P<value>...) で限定しているパターン: {pN: vN}
+        self.value_groups: Dict[str, str] = {}
+        # アンカーのないパターン(常に適用)と、アンカー → パターン番号
+        self.always: List[int] = []
+        anchors: Dict[str, List[int]] = {}
+
+        for name, regex in patterns:
+            try:
+                re.compile(regex, re.ASCII)
+            except re.error as e:
+                print(f"Warning: Skipping invalid redaction pattern {name}: {e}")
+                continue
+            index = len(self.names)
+            self.names.append(name)
+            pattern_anchors = extract_anchors(regex)
+            if "(?P<value>" in regex:
+                regex = regex.replace("(?P<value>", f"(?P<v{index}>")
+                self.value_groups[f"p{index}"] = f"v{index}"
+            self.alternatives.append(f"(?P<p{index}>{regex})")
+            if pattern_anchors:
+                for anchor in pattern_anchors:
+                    anchors.setdefault(anchor, []).append(index)
+            else:
+                self.always.append(index)
+        if keywords:
+            # 固定文字列はトライ木の正規表現で1つの選択肢にまとめる
+            self.names.append("keyword")
+            self.alternatives.append(f"(?P<p{len(self.names) - 1}>{build_keyword_regex(keywords)})")
+            self.always.append(len(self.names) - 1)
+
+        # トライ木は同じ位置で最長のアンカーを返すため、その接頭辞になっているアンカーのパターンも含める
+        self.anchor_patterns: Dict[str, Tuple[int, ...]] = {}
+        for anchor in anchors:
+            indices = set()
+            for k in range(1, len(anchor) + 1):
+                indices.update(anchors.get(anchor[:k], ()))
+            self.anchor_patterns[anchor] = tuple(sorted(indices))
+        self.anchor_pattern = (
+            re.compile(f"(?=({build_keyword_regex(list(anchors))}))") if anchors else None
+        )
+        self._compiled: Dict[Tuple[int, ...], Optional[re.Pattern]] = {}
+
+    def _get_pattern(self, indices: Tuple[int, ...]) -> Optional[re.Pattern]:
+        pattern = self._compiled.get(indices)
+        if pattern is None and indices not in self._compiled:
+            if len(self._compiled) >= COMPILED_CACHE_SIZE:
+                self._compiled.clear()
+            alternatives = "|".join(self.alternatives[i] for i in indices)
+            pattern = re.compile(alternatives, re.ASCII) if alternatives else None
+            self._compiled[indices] = pattern
+        return pattern
+
+    def _replace(self, match: re.Match) -> str:
+        group = match.lastgroup
+        label = f"[REDACTED:{self.names[int(group[1:])]}]"
+        value_group = self.value_groups.get(group)
+        if value_group and match.group(value_group) is not None:
+            text = match.group(0)
+            start = match.start(value_group) - match.start()
+            end = match.end(value_group) - match.start()
+            return text[:start] + label + text[end:]
+        return label
+
+    def redact(self, text: str) -> str:
+        """
+        テキスト中の一致箇所をマスク
+
+        入力: text - マスクするテキスト
+        出力: マスク後のテキスト
+        """
+        if not text:
+            return text
+        indices = set(self.always)
+        if self.anchor_pattern is not None:
+            for anchor in set(self.anchor_pattern.findall(text)):
+                indices.update(self.anchor_patterns[anchor])
+        pattern = self._get_pattern(tuple(sorted(indices)))
+        if pattern is None:
+            return text
+        return pattern.sub(self._replace, text)
+
+
+def get_redactor(patterns_file: Path = PATTERNS_FILE) -> Redactor:
+    """
+    組み込み+追加パターンのRedactorを取得(パターンファイルが更新されたときだけ再コンパイル)
+
+    入力: patterns_file - 追加パターンのファイル
+    出力: Redactor
+    """
+    mtime = patterns_file.stat().st_mtime if patterns_file.exists() else None
+    cached = _redactor_cache.get(patterns_file)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    extra_patterns, keywords = load_patterns_file(patterns_file)
+    redactor = Redactor(BUILTIN_PATTERNS + extra_patterns, keywords)
+    _redactor_cache[patterns_file] = (mtime, redactor)
+    return redactor
+
+
+def redact_text(text: str) -> str:
+    """設定に従ってテキストをマスク(無効化されていればそのまま返す)"""
+    if not REDACTION_ENABLED or not text:
+        return text
+    return get_redactor().redact(text)
+
+
+def redact_entry(entry: Dict) -> Dict:
+    """
+    ログエントリのOCRテキストとウィンドウタイトルをその場でマスク
+
+    入力: entry - ログエントリ(書き換えられる)
+    出力: 同じエントリ
+    """
+    if not REDACTION_ENABLED:
+        return entry
+    for field in REDACTED_FIELDS:
+        if entry.get(field):
+            entry[field] = redact_text(entry[field])
+    return entry
+
+
+def make_bench_text(size: int, rng: random.Random) -> str:
+    """OCRテキストに似たベンチマーク用の文字列(ときどき秘密情報を含む)"""
+    words = ["設計", "レビュー", "def", "return", "import", "会議", "資料", "main.py", "TODO", "2026-01-05"]
+    secrets = [
+        "password: hunter2hunter2",
+        "AKIA" + "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(16)),
+        "user@example.com",
+        "03-1234-5678",
+        "CUST000123",
+    ]
+    parts = []
+    length = 0
+    while length < size:
+        part = rng.choice(secrets) if rng.random() < 0.02 else rng.choice(words)
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts)
+
+
+def run_benchmark(pattern_counts: List[int], text_kb: int = 4, iterations: int = 20) -> None:
+    """
+    パターン数ごとのスループットを比較
+
+    - anchored: Redactor(アンカーで選択肢を絞った1つの正規表現)
+    - alternation: 全パターンを単純に1つの選択にまとめた正規表現
+    - one-by-one: パターンを1つずつ適用
+
+    追加分は半分を正規表現(顧客ID・プロジェクトID形式)、半分を顧客名の固定文字列とする。
+
+    入力:
+        pattern_counts - 計測するパターン数
+        text_kb - 1回あたりのテキストサイズ(KB、1キャプチャ分のOCRテキスト相当)
+        iterations - 計測の繰り返し回数
+    """
+    rng = random.Random(0)
+    texts = [make_bench_text(text_kb * 1024, rng) for _ in range(10)]
+    total_mb = sum(len(t.encode("utf-8")) for t in texts) * iterations / len(texts) / 1024 / 1024
+
+    def measure(redact) -> float:
+        start = time.perf_counter()
+        for i in range(iterations):
+            redact(texts[i % len(texts)])
+        return time.perf_counter() - start
+
+    print(f"Text: {text_kb}KB per capture, {iterations} captures per run (MB/s, higher is better)")
+    print(f"{'patterns':>8} {'compile ms':>11} {'anchored':>9} {'ms/capture':>11} {'alternation':>12} {'one-by-one':>11}")
+    for count in pattern_counts:
+        extra = max(0, count - len(BUILTIN_PATTERNS))
+        patterns = BUILTIN_PATTERNS + [
+            (f"customer_id_{i}", rf"\bCUST{i:04d}\d{{2}}\b") if i % 2 == 0
+            else (f"project_id_{i}", rf"\bPRJ{i}-\d{{3,6}}\b")
+            for i in range(extra // 2)
+        ]
+        keywords = [f"顧客{i:04d}株式会社" for i in range(extra - extra // 2)]
+
+        start = time.perf_counter()
+        redactor = Redactor(patterns, keywords)
+        compile_ms = (time.perf_counter() - start) * 1000
+        anchored = measure(redactor.redact)
+
+        alternation_pattern = re.compile("|".join(redactor.alternatives), re.ASCII)
+        alternation = measure(lambda text: alternation_pattern.sub(redactor._replace, text))
+
+        singles = [re.compile(alternative, re.ASCII) for alternative in redactor.alternatives]
+
+        def redact_one_by_one(text: str) -> str:
+            for single in singles:
+                text = single.sub(redactor._replace, text)
+            return text
+
+        one_by_one = measure(redact_one_by_one)
+
+        print(
+            f"{len(patterns) + len(keywords):>8} {compile_ms:>11.1f} {total_mb / anchored:>9.2f} "
+            f"{anchored * 1000 / iterations:>11.2f} {total_mb / alternation:>12.2f} {total_mb / one_by_one:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OCRテキストの秘密情報・個人情報をマスクします")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    test_parser = subparsers.add_parser("test", help="入力したテキストをマスクして表示(パターンの確認用)")
+    test_parser.add_argument("text", help="マスクするテキスト")
+
+    bench_parser = subparsers.add_parser("bench", help="パターン数ごとのスループットを計測")
+    bench_parser.add_argument(
+        "--patterns", default="25,100,250,500,1000", help="計測するパターン数(カンマ区切り)"
+    )
+    bench_parser.add_argument("--text-kb", type=int, default=4, help="1キャプチャあたりのテキストサイズ(KB)")
+    bench_parser.add_argument("--iterations", type=int, default=20, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    if args.command == "test":
+        print(get_redactor().redact(args.text))
+    else:
+        run_benchmark(
+            [int(n) for n in args.patterns.split(",")], text_kb=args.text_kb, iterations=args.iterations
+        )
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Accelerated Replay Harness for macOS Activity Logger
+
+記録済みのアクティビティログ(と任意で保存済みの画像)を、maclogger.main_loop の
+各ステージにN倍速で流し込みます。クロック・キャプチャ・OCR・LLMを差し替えるため、
+macOSやGemini APIがなくても(Linuxでも)1日分の挙動を数秒で再現できます。
+
+- 仮想クロック: 記録のタイムスタンプどおりに時刻を進め、記録のない時間帯は
+  キャプチャ間隔ずつ進める(--speed 0 で待ち時間なし)
+- 偽キャプチャ: 記録のアプリ・タイトルを返し、画像があればコピーする
+- 偽OCR: 記録の ocr_text を返す(--real-ocr で実際のOCRを使用)
+- 偽LLM: 入力件数を含む決定的な要約を返す
+
+出力先のディレクトリに logs/ が作られ、毎正時の要約・日付の切り替え・
+ステージごとの処理時間と最大スループットを集計します。
+--json の結果を --baseline に渡すと、挙動が変わっていないかを検証できます。
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import maclogger
+from log_store import read_jsonl
+
+# Configuration
+# ベースラインと比較する(実行環境に依存しない)項目
+BASELINE_KEYS = ("records", "cycles", "hourly_triggers", "summary_hours", "llm_calls", "day_files")
+
+
+class ReplayFinished(Exception):
+    """記録を最後まで再生した"""
+
+
+class VirtualClock:
+    """
+    リプレイ用の仮想クロック
+
+    sleep() は仮想時刻を進め、speed倍速になるよう実時間を待つ。
+    仮想時刻が end を過ぎたら ReplayFinished を送出してメインループを止める。
+    """
+
+    def __init__(self, start: datetime, end: datetime, speed: float = 0):
+        self.current = start
+        self.start = start
+        self.end = end
+        self.speed = speed
+        self.real_start = time.perf_counter()
+
+    def now(self) -> datetime:
+        return self.current
+
+    def advance_to(self, ts: datetime) -> None:
+        """仮想時刻を ts まで進める(巻き戻しはしない)"""
+        if ts > self.current:
+            self.current = ts
+            self._pace()
+
+    def sleep(self, seconds: float) -> None:
+        self.current += timedelta(seconds=seconds)
+        if self.current > self.end:
+            raise ReplayFinished()
+        self._pace()
+
+    def _pace(self) -> None:
+        if self.speed <= 0:
+            return
+        virtual_elapsed = (self.current - self.start).total_seconds()
+        wait = self.real_start + virtual_elapsed / self.speed - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+
+def load_records(logs_dir: Path, date_from: Optional[str], date_to: Optional[str]) -> List[Dict]:
+    """
+    記録済みのアクティビティログを時系列順に読み込み
+
+    複数キャプチャモードのログは同じ cycle_id のレコードが1サイクルにまとまっているため、
+    サイクルの先頭のレコードだけを再生する(リプレイは最前面モードで行う)。
+
+    入力:
+        logs_dir - 記録済みの logs ディレクトリ
+        date_from / date_to - 対象期間 (YYYY-MM-DD、省略時は全期間)
+    出力: レコードのリスト(各レコードに "_ts" としてdatetimeを付与)
+    """
+    records = []
+    seen_cycles = set()
+    for path in sorted(logs_dir.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/activity_*.jsonl")):
+        day = path.stem.split("_", 1)[1]
+        if (date_from and day < date_from) or (date_to and day > date_to):
+            continue
+        for entry in read_jsonl(path):
+            if "timestamp" not in entry:
+                continue
+            cycle_id = entry.get("cycle_id")
+            if cycle_id:
+                if cycle_id in seen_cycles:
+                    continue
+                seen_cycles.add(cycle_id)
+            entry["_ts"] = datetime.fromisoformat(entry["timestamp"])
+            records.append(entry)
+    records.sort(key=lambda r: r["_ts"])
+    return records
+
+
+class ReplayBackends:
+    """
+    maclogger のキャプチャ・OCR・LLMを記録の再生で置き換える偽バックエンド
+
+    get_active_window_info() が呼ばれるたびに次の記録を取り出し、
+    次のサイクルまでに記録があればクロックをその時刻に合わせて返す。
+    """
+
+    def __init__(self, records: List[Dict], clock: VirtualClock, images_dir: Optional[Path]):
+        self.records = records
+        self.clock = clock
+        self.images_dir = images_dir
+        self.cursor = 0
+        self.current: Optional[Dict] = None
+        self.cycles = 0
+        self.idle_cycles = 0
+        self.images_used = 0
+        self.llm_calls = 0
+        self.prompt_chars = 0
+
+    def get_frontmost_window_id(self) -> Optional[str]:
+        return "replay"
+
+    def get_active_window_info(self) -> Dict[str, str]:
+        self.cycles += 1
+        self.current = None
+        now = self.clock.now()
+        if self.cursor < len(self.records):
+            record = self.records[self.cursor]
+            if record["_ts"] < now + timedelta(seconds=maclogger.CAPTURE_INTERVAL):
+                self.cursor += 1
+                self.current = record
+                self.clock.advance_to(record["_ts"])
+                return {
+                    "application": record.get("application", ""),
+                    "window_title": record.get("window_title", ""),
+                }
+        self.idle_cycles += 1
+        return {"application": "", "window_title": ""}
+
+    def find_image(self) -> Optional[Path]:
+        if not self.images_dir or not self.current or not self.current.get("capture_id"):
+            return None
+        for path in self.images_dir.glob(f"{self.current['capture_id']}.*"):
+            if path.suffix != ".json":
+                return path
+        return None
+
+    def capture_screenshot(
+        self,
+        window_id: Optional[str] = None,
+        output_path: str = maclogger.SCREENSHOT_PATH,
+        image_format: str = "png",
+        display_id: Optional[str] = None,
+    ) -> bool:
+        image = self.find_image()
+        if image:
+            shutil.copyfile(image, output_path)
+            self.images_used += 1
+        else:
+            Path(output_path).write_bytes(b"")
+        return True
+
+    def perform_ocr(self, image_path: str) -> str:
+        return self.current.get("ocr_text", "") if self.current else ""
+
+    def generate_summary_text(self, prompt: str) -> Optional[str]:
+        self.llm_calls += 1
+        self.prompt_chars += len(prompt)
+        lines = [line for line in prompt.splitlines() if line.startswith("[")]
+        return f"[replay] {len(lines)} lines, {len(prompt)} chars"
+
+
+def timed(stats: Dict[str, List[float]], name: str, func: Callable) -> Callable:
+    """関数の呼び出し回数と処理時間をステージ別に記録するラッパー"""
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stat = stats.setdefault(name, [0, 0.0])
+            stat[0] += 1
+            stat[1] += time.perf_counter() - start
+
+    return wrapper
+
+
+def collect_outputs(output_dir: Path) -> Dict:
+    """リプレイで書き出された日別ファイルと要約の時刻を集計"""
+    logs_dir = output_dir / "logs"
+    day_files = sorted(p.name for p in logs_dir.glob("*/*/activity_*.jsonl"))
+    summary_hours = []
+    for path in sorted(logs_dir.glob("*/*/hourly_summary_*.jsonl")):
+        day = path.stem.split("_", 2)[2]
+        for entry in read_jsonl(path):
+            summary_hours.append(f"{day} {entry.get('hour', '')}")
+    return {"day_files": day_files, "summary_hours": summary_hours}
+
+
+def run_replay(
+    logs_dir: Path,
+    output_dir: Path,
+    speed: float = 0,
+    images_dir: Optional[Path] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    real_ocr: bool = False,
+    verbose: bool = False,
+) -> Dict:
+    """
+    記録済みログを main_loop に再生し、結果を集計
+
+    入力:
+        logs_dir - 記録済みの logs ディレクトリ
+        output_dir - リプレイの出力先(空または存在しないディレクトリ、logs/ が作られる)
+        speed - 再生速度の倍率(0は待ち時間なし)
+        images_dir - 保存済み画像のディレクトリ(<capture_id>.jpg 等)
+        date_from / date_to - 対象期間 (YYYY-MM-DD)
+        real_ocr - Trueの場合は画像に対して実際のOCRを行う
+        verbose - Trueの場合は main_loop の出力をそのまま表示
+    出力: 集計結果のdict
+    """
+    # 前回の出力(チェックポイント・ログ・セッション・ロールアップ)が残っていると結果が変わるため、空の出力先にだけ再生する
+    if output_dir.exists() and any(output_dir.iterdir()):
+        raise ValueError(f"Output directory is not empty: {output_dir}")
+
+    records = load_records(logs_dir, date_from, date_to)
+    if not records:
+        raise ValueError(f"No activity records found in {logs_dir}")
+
+    start = records[0]["_ts"]
+    # 最後の記録の次の正時まで進め、最後の1時間の要約も発生させる
+    end = records[-1]["_ts"].replace(minute=0, second=0, microsecond=0) + timedelta(
+        hours=1, seconds=maclogger.CAPTURE_INTERVAL
+    )
+    clock = VirtualClock(start, end, speed)
+    backends = ReplayBackends(records, clock, images_dir)
+    stats: Dict[str, List[float]] = {}
+
+    patches = {
+        "clock": clock,
+        "GEMINI_API_KEY": maclogger.GEMINI_API_KEY or "replay",
+        "CAPTURE_MODE": "frontmost",
+        "DEFERRED_OCR": False,
+        "get_frontmost_window_id": timed(stats, "window_id", backends.get_frontmost_window_id),
+        "get_active_window_info": timed(stats, "window_info", backends.get_active_window_info),
+        "capture_screenshot": timed(stats, "capture", backends.capture_screenshot),
+        "perform_ocr": timed(
+            stats, "ocr", maclogger.perform_ocr if real_ocr else backends.perform_ocr
+        ),
+        "generate_summary_text": timed(stats, "llm", backends.generate_summary_text),
+        "save_log_entry": timed(stats, "save", maclogger.save_log_entry),
+        "summarize_hourly_activities": timed(
+            stats, "hourly_summary", maclogger.summarize_hourly_activities
+        ),
+        "update_search_index": timed(stats, "search_index", maclogger.update_search_index),
+    }
+    originals = {name: getattr(maclogger, name) for name in patches}
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    cwd = Path.cwd()
+    real_start = time.perf_counter()
+    try:
+        for name, value in patches.items():
+            setattr(maclogger, name, value)
+        # 各モジュールの logs/ は相対パスのため、出力先で実行する
+        os.chdir(output_dir)
+        stdout = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with stdout:
+            try:
+                maclogger.main_loop()
+            except ReplayFinished:
+                pass
+    finally:
+        os.chdir(cwd)
+        for name, value in originals.items():
+            setattr(maclogger, name, value)
+    real_elapsed = time.perf_counter() - real_start
+
+    virtual_elapsed = (clock.now() - start).total_seconds()
+    outputs = collect_outputs(output_dir)
+    return {
+        "start": start.isoformat(),
+        "end": clock.now().isoformat(),
+        "records": len(records),
+        "replayed_records": backends.cursor,
+        "cycles": backends.cycles,
+        "idle_cycles": backends.idle_cycles,
+        "images_used": backends.images_used,
+        "hourly_triggers": stats.get("hourly_summary", [0, 0.0])[0],
+        "summary_hours": outputs["summary_hours"],
+        "llm_calls": backends.llm_calls,
+        "prompt_chars": backends.prompt_chars,
+        "day_files": outputs["day_files"],
+        "virtual_seconds": virtual_elapsed,
+        "real_seconds": real_elapsed,
+        "speedup": virtual_elapsed / real_elapsed if real_elapsed > 0 else 0,
+        "cycles_per_second": backends.cycles / real_elapsed if real_elapsed > 0 else 0,
+        "stages": {
+            name: {"calls": calls, "total_ms": total * 1000, "avg_ms": total * 1000 / calls}
+            for name, (calls, total) in sorted(stats.items())
+            if calls
+        },
+    }
+
+
+def print_result(result: Dict, output_dir: Path) -> None:
+    """集計結果を表示"""
+    print(f"Replayed {result['start']} → {result['end']}")
+    print(
+        f"  Records: {result['replayed_records']}/{result['records']}  "
+        f"Cycles: {result['cycles']} ({result['idle_cycles']} idle)  "
+        f"Images: {result['images_used']}"
+    )
+    print(
+        f"  Hourly summaries: {len(result['summary_hours'])} written / "
+        f"{result['hourly_triggers']} triggered, {result['llm_calls']} LLM call(s), "
+        f"{result['prompt_chars']:,} prompt chars"
+    )
+    for hour in result["summary_hours"]:
+        print(f"    {hour}")
+    print(f"  Day files: {', '.join(result['day_files'])}")
+    print(
+        f"  Virtual {result['virtual_seconds'] / 3600:.1f}h in {result['real_seconds']:.2f}s real "
+        f"(x{result['speedup']:.0f}, {result['cycles_per_second']:.0f} cycles/s)"
+    )
+    print("\n  Stage           calls   total ms   avg ms")
+    for name, stage in result["stages"].items():
+        print(f"  {name:<14} {stage['calls']:>6} {stage['total_ms']:>10.1f} {stage['avg_ms']:>8.3f}")
+    print(f"\nOutput: {output_dir}")
+
+
+def compare_baseline(result: Dict, baseline_file: Path) -> List[str]:
+    """
+    ベースラインのリプレイ結果と比較
+
+    入力:
+        result - 今回の集計結果
+        baseline_file - 以前に --json で保存した結果
+    出力: 差分の説明のリスト(一致していれば空)
+    """
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    return [
+        f"{key}: expected {baseline[key]!r}, got {result[key]!r}"
+        for key in BASELINE_KEYS
+        if key in baseline and baseline[key] != result[key]
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="記録済みのアクティビティログをメインループにN倍速で再生します"
+    )
+    parser.add_argument("--logs", default="logs", help="記録済みの logs ディレクトリ (デフォルト: logs)")
+    parser.add_argument("--images", help="保存済み画像のディレクトリ (例: logs/ocr_queue)")
+    parser.add_argument("--from", dest="date_from", help="開始日 (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="終了日 (YYYY-MM-DD)")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="再生速度の倍率 (例: 600 で1分を0.1秒に。デフォルト: 0 = 待ち時間なし)",
+    )
+    parser.add_argument("--output", help="出力先ディレクトリ (空または存在しないこと、デフォルト: 一時ディレクトリ)")
+    parser.add_argument("--real-ocr", action="store_true", help="保存済み画像に実際のOCRを行う (macOSのみ)")
+    parser.add_argument("--verbose", action="store_true", help="メインループの出力を表示")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    parser.add_argument("--baseline", help="以前の --json の結果と比較し、差分があれば終了コード1")
+    args = parser.parse_args()
+
+    if args.real_ocr and maclogger.ocrmac is None:
+        print("Error: --real-ocr requires ocrmac.")
+        sys.exit(1)
+
+    output_dir = Path(args.output) if args.output else Path(tempfile.mkdtemp(prefix="maclogger-replay-"))
+    try:
+        result = run_replay(
+            Path(args.logs).resolve(),
+            output_dir.resolve(),
+            speed=args.speed,
+            images_dir=Path(args.images).resolve() if args.images else None,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            real_ocr=args.real_ocr,
+            verbose=args.verbose,
+        )
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_result(result, output_dir)
+
+    if args.baseline:
+        differences = compare_baseline(result, Path(args.baseline))
+        if differences:
+            print("\nReplay differs from baseline:")
+            for line in differences:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nReplay matches baseline.")
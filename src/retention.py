@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Log Retention and Compaction for macOS Activity Logger
+
+logs/YYYY/MM/ 配下のログに保持ポリシーを適用し、ディスク使用量を削減します。
+
+- N日経過: activity ログから ocr_text を削除(他のフィールドは保持)
+- M日経過: activity ログを削除し、hourly summary のみ保持
+- 容量上限: 上限を超えている場合、hourly summary のある古い activity ログから削除
+
+処理済みのファイルは状態ファイルに記録し、次回以降はスキップします。
+"""
+
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from log_store import LOGS_DIR, log_write_lock, read_jsonl, write_jsonl_atomic
+from sessions import remove_sessions
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+STRIP_OCR_AFTER_DAYS = int(os.getenv("RETENTION_STRIP_OCR_DAYS", "90"))
+SUMMARY_ONLY_AFTER_DAYS = int(os.getenv("RETENTION_SUMMARY_ONLY_DAYS", "365"))
+MAX_LOGS_MB = int(os.getenv("RETENTION_MAX_LOGS_MB", "0"))  # 0 = 上限なし
+STATE_FILE = LOGS_DIR / ".retention_state.json"
+
+ACTIVITY_PATTERN = re.compile(r"activity_(\d{4}-\d{2}-\d{2})\.jsonl$")
+
+
+def load_state() -> Dict[str, Dict]:
+    """
+    処理済みファイルの状態を読み込み
+
+    出力: {ファイルパス: {"stage": str, "size": int, "mtime": float}}
+    """
+    if not STATE_FILE.exists():
+        return {}
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state: Dict[str, Dict]) -> None:
+    """
+    処理済みファイルの状態をアトミックに保存
+
+    入力: state - load_state() と同じ形式の辞書
+    """
+    tmp_path = STATE_FILE.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def list_activity_logs() -> List[Dict]:
+    """
+    logs/YYYY/MM/ 配下の activity ログを古い順に列挙
+
+    出力: [{"path": Path, "date": datetime, "size": int}]
+    """
+    logs = []
+    for path in LOGS_DIR.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/activity_*.jsonl"):
+        match = ACTIVITY_PATTERN.search(path.name)
+        if not match:
+            continue
+        logs.append(
+            {
+                "path": path,
+                "date": datetime.strptime(match.group(1), "%Y-%m-%d"),
+                "size": path.stat().st_size,
+            }
+        )
+    return sorted(logs, key=lambda log: log["date"])
+
+
+def get_logs_size() -> int:
+    """
+    logs/ 配下の合計サイズを取得
+
+    出力: バイト数
+    """
+    return sum(p.stat().st_size for p in LOGS_DIR.rglob("*") if p.is_file())
+
+
+def strip_ocr_entry(entry: Dict) -> Dict:
+    """
+    レコードから ocr_text だけを削除し、削除したことを ocr_stripped で示す
+
+    host・capture_id・ocr_pending などの他のフィールドはそのまま残す。
+    """
+    if "ocr_text" not in entry:
+        return entry
+    stripped = {key: value for key, value in entry.items() if key != "ocr_text"}
+    stripped["ocr_stripped"] = True
+    return stripped
+
+
+def strip_ocr_text(path: Path) -> int:
+    """
+    activity ログから ocr_text を削除(他のフィールドは保持)
+
+    入力: path - activity ログ
+    出力: 削減したバイト数
+    """
+    with log_write_lock():
+        before = path.stat().st_size
+        entries = [strip_ocr_entry(entry) for entry in read_jsonl(path)]
+        write_jsonl_atomic(path, entries)
+        remove_sessions(path)
+        return before - path.stat().st_size
+
+
+def delete_activity_log(path: Path) -> int:
+    """
+    activity ログを削除
+
+    入力: path - activity ログ
+    出力: 削減したバイト数
+    """
+    with log_write_lock():
+        size = path.stat().st_size
+        path.unlink()
+        remove_sessions(path)
+        return size
+
+
+def format_size(num_bytes: int) -> str:
+    """バイト数を読みやすい単位の文字列に変換"""
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def apply_retention(
+    strip_days: int = STRIP_OCR_AFTER_DAYS,
+    summary_days: int = SUMMARY_ONLY_AFTER_DAYS,
+    max_logs_mb: int = MAX_LOGS_MB,
+    dry_run: bool = False,
+    today: Optional[datetime] = None,
+) -> int:
+    """
+    保持ポリシーを適用
+
+    当日のログは記録中のため対象外とする。
+    M日経過のログは、同じ日の hourly summary が存在する場合のみ削除する。
+
+    入力:
+        strip_days - ocr_text を削除するまでの日数(0で無効)
+        summary_days - activity ログを削除するまでの日数(0で無効)
+        max_logs_mb - logs/ の容量上限MB(0で無効)
+        dry_run - Trueの場合は対象を表示するのみ
+        today - 基準日(デフォルト: 今日)
+    出力: 削減したバイト数
+    """
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    state = load_state()
+    reclaimed = 0
+
+    def mark(path: Path, stage: str) -> None:
+        if stage == "deleted":
+            state.pop(str(path), None)
+        else:
+            stat = path.stat()
+            state[str(path)] = {"stage": stage, "size": stat.st_size, "mtime": stat.st_mtime}
+        # 1ファイルごとに保存し、中断しても処理済みを失わないようにする
+        save_state(state)
+
+    for log in list_activity_logs():
+        path = log["path"]
+        age_days = (today - log["date"]).days
+        if age_days < 1:
+            continue
+
+        date_str = log["date"].strftime("%Y-%m-%d")
+        summary_file = path.parent / f"hourly_summary_{date_str}.jsonl"
+
+        if summary_days and age_days >= summary_days:
+            if not summary_file.exists():
+                # 要約がない日は activity ログが唯一の記録なので削除しない(OCR削除のみ)
+                print(f"  - Keeping {path.name} (no hourly summary for {date_str})")
+            elif dry_run:
+                print(f"[DRY RUN] Delete {path} ({format_size(log['size'])})")
+                continue
+            else:
+                freed = delete_activity_log(path)
+                mark(path, "deleted")
+                reclaimed += freed
+                print(f"  ✓ Deleted {path.name} (summary only, -{format_size(freed)})")
+                continue
+
+        if strip_days and age_days >= strip_days:
+            recorded = state.get(str(path))
+            if (
+                recorded
+                and recorded["stage"] == "stripped"
+                and recorded["size"] == log["size"]
+            ):
+                continue
+            if dry_run:
+                print(f"[DRY RUN] Strip OCR text from {path}")
+            else:
+                freed = strip_ocr_text(path)
+                mark(path, "stripped")
+                reclaimed += freed
+                print(f"  ✓ Stripped OCR text from {path.name} (-{format_size(freed)})")
+
+    if max_logs_mb:
+        quota = max_logs_mb * 1024 * 1024
+        total = get_logs_size()
+        # 容量上限で削除できるのは、hourly summary のある過去日の activity ログだけ
+        deletable = [
+            log
+            for log in list_activity_logs()
+            if (today - log["date"]).days >= 1
+            and (log["path"].parent / f"hourly_summary_{log['date'].strftime('%Y-%m-%d')}.jsonl").exists()
+        ]
+        unreclaimable = total - sum(log["size"] for log in deletable)
+        if total > quota and unreclaimable > quota:
+            # 検索インデックス・ロールアップ・当日分などだけで上限を超えている場合、
+            # activity ログを消しても上限に収まらないため削除しない
+            print(
+                f"Warning: logs/ is {format_size(total)} but {format_size(unreclaimable)} of it cannot be "
+                f"reclaimed by deleting activity logs (quota {max_logs_mb}MB). Nothing deleted."
+            )
+            deletable = []
+        for log in deletable:
+            if total <= quota:
+                break
+            if dry_run:
+                print(f"[DRY RUN] Delete {log['path']} (over quota)")
+                total -= log["size"]
+                continue
+            freed = delete_activity_log(log["path"])
+            mark(log["path"], "deleted")
+            reclaimed += freed
+            total -= freed
+            print(f"  ✓ Deleted {log['path'].name} (over quota, -{format_size(freed)})")
+        if deletable and total > quota:
+            print(f"Warning: logs/ is still {format_size(total)} (quota {max_logs_mb}MB)")
+
+    return reclaimed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="ログの保持ポリシーを適用し、ディスク使用量を削減します"
+    )
+    parser.add_argument(
+        "--strip-ocr-days",
+        type=int,
+        default=STRIP_OCR_AFTER_DAYS,
+        help=f"ocr_textを削除するまでの日数 (デフォルト: {STRIP_OCR_AFTER_DAYS}, 0で無効)",
+    )
+    parser.add_argument(
+        "--summary-only-days",
+        type=int,
+        default=SUMMARY_ONLY_AFTER_DAYS,
+        help=f"hourly summaryのみ残すまでの日数 (デフォルト: {SUMMARY_ONLY_AFTER_DAYS}, 0で無効)",
+    )
+    parser.add_argument(
+        "--max-logs-mb",
+        type=int,
+        default=MAX_LOGS_MB,
+        help="logs/の容量上限MB (デフォルト: 0=無効)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="実際には変更せず、対象を表示するのみ",
+    )
+    args = parser.parse_args()
+
+    print("Applying log retention policy...")
+    before = get_logs_size()
+    reclaimed = apply_retention(
+        strip_days=args.strip_ocr_days,
+        summary_days=args.summary_only_days,
+        max_logs_mb=args.max_logs_mb,
+        dry_run=args.dry_run,
+    )
+    print(f"\nReclaimed {format_size(reclaimed)} (logs/: {format_size(before)} → {format_size(get_logs_size())})")
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Time-Accounting Rollups for macOS Activity Logger
+
+アプリ別・ウィンドウタイトル別の滞在時間を1時間単位で集計し、
+月ごとのカラム型ファイルとして logs/YYYY/MM/ に保存します。
+
+- rollup_hour.u32 / rollup_app.u32 / rollup_title.u32 / rollup_seconds.u32:
+  1行 = (時間キー, アプリID, タイトルID, 秒数) の各列を array('I') で保存
+- rollup_dict.jsonl: アプリ名・タイトルのID辞書(追記のみ)
+
+save_log_entry からレコードごとに呼び出され、直前の行と同じ時間・アプリ・タイトルなら
+その行の秒数をその場で加算するため、ファイルは連続した作業の数だけしか増えません。
+"""
+
+import os
+import json
+import time
+import argparse
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from log_store import LOGS_DIR, log_write_lock, read_jsonl
+
+# Configuration
+COLUMNS = ("hour", "app", "title", "seconds")
+ITEM_SIZE = array("I").itemsize
+DEFAULT_DWELL_SECONDS = 60  # 1レコード = キャプチャ間隔分の滞在とみなす
+UNKNOWN_NAME = "(unknown)"  # 辞書にないID(辞書の行が失われた場合)の表示名
+
+# 辞書のキャッシュ: {辞書ファイル: (inode, size, {"app": [...], "title": [...]}, {"app": {...}, "title": {...}})}
+_dictionary_cache: Dict[Path, Tuple] = {}
+_last_cycle_id: Optional[str] = None
+
+
+def hour_key(ts: datetime) -> int:
+    """
+    日時を時間キー(ローカル日付の通し番号 × 24 + 時)に変換
+
+    入力: ts - 日時
+    出力: 時間キー(日単位の集計は hour_key // 24)
+    """
+    return ts.toordinal() * 24 + ts.hour
+
+
+def hour_key_to_datetime(key: int) -> datetime:
+    """時間キーを日時に戻す"""
+    return datetime.fromordinal(key // 24) + timedelta(hours=key % 24)
+
+
+def column_path(month_dir: Path, column: str) -> Path:
+    return month_dir / f"rollup_{column}.u32"
+
+
+def dictionary_path(month_dir: Path) -> Path:
+    return month_dir / "rollup_dict.jsonl"
+
+
+def load_dictionary(month_dir: Path) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, int]]]:
+    """
+    ID辞書を読み込み(ファイルが変わっていなければキャッシュを返す)
+
+    入力: month_dir - 月ごとのログディレクトリ
+    出力: (values, index)
+        values - {"app": [名前...], "title": [タイトル...]} (リストの位置がID、欠番はUNKNOWN_NAME)
+        index - {"app": {名前: ID}, "title": {タイトル: ID}}
+    """
+    path = dictionary_path(month_dir)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {"app": [], "title": []}, {"app": {}, "title": {}}
+
+    cached = _dictionary_cache.get(path)
+    if cached and cached[0] == stat.st_ino and cached[1] == stat.st_size:
+        return cached[2], cached[3]
+
+    # 行の位置ではなく保存されたIDで並べる(壊れた行が読み飛ばされても後続のIDがずれないように)
+    by_id: Dict[str, Dict[int, str]] = {"app": {}, "title": {}}
+    for item in read_jsonl(path):
+        try:
+            by_id[item["kind"]][int(item["id"])] = item["value"]
+        except (KeyError, TypeError, ValueError):
+            continue
+    values: Dict[str, List[str]] = {
+        kind: [ids.get(i, UNKNOWN_NAME) for i in range(max(ids) + 1 if ids else 0)]
+        for kind, ids in by_id.items()
+    }
+    index = {kind: {v: i for i, v in ids.items()} for kind, ids in by_id.items()}
+    _dictionary_cache[path] = (stat.st_ino, stat.st_size, values, index)
+    return values, index
+
+
+def truncate_partial_line(path: Path) -> None:
+    """
+    追記途中でクラッシュして残った末尾の不完全な行を切り詰める
+
+    入力: path - 辞書ファイル
+    """
+    try:
+        with open(path, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        return
+
+
+def get_or_add_id(month_dir: Path, kind: str, value: str) -> int:
+    """
+    辞書からIDを取得し、未登録なら追記して採番
+
+    入力:
+        month_dir - 月ごとのログディレクトリ
+        kind - "app" または "title"
+        value - アプリ名またはタイトル
+    出力: ID
+    """
+    values, index = load_dictionary(month_dir)
+    if value in index[kind]:
+        return index[kind][value]
+
+    new_id = len(values[kind])
+    path = dictionary_path(month_dir)
+    truncate_partial_line(path)
+    with open(path, "a", encoding="utf-8") as f:
+        json.dump({"kind": kind, "id": new_id, "value": value}, f, ensure_ascii=False)
+        f.write("\n")
+    values[kind].append(value)
+    index[kind][value] = new_id
+    stat = path.stat()
+    _dictionary_cache[path] = (stat.st_ino, stat.st_size, values, index)
+    return new_id
+
+
+def load_columns(month_dir: Path) -> Dict[str, array]:
+    """
+    カラムファイルを読み込み
+
+    追記途中でクラッシュして列の長さが揃っていない場合は短い方に合わせる。
+
+    入力: month_dir - 月ごとのログディレクトリ
+    出力: {列名: array('I')}
+    """
+    columns = {}
+    for column in COLUMNS:
+        data = array("I")
+        path = column_path(month_dir, column)
+        if path.exists():
+            with open(path, "rb") as f:
+                data.frombytes(f.read())
+        columns[column] = data
+
+    rows = min(len(data) for data in columns.values())
+    for data in columns.values():
+        del data[rows:]
+    return columns
+
+
+def read_last_row(month_dir: Path) -> Optional[Tuple[int, ...]]:
+    """
+    最終行だけをファイル末尾から読み込み
+
+    入力: month_dir - 月ごとのログディレクトリ
+    出力: (hour, app, title, seconds)、行がない・列の長さが揃っていない場合はNone
+    """
+    sizes = set()
+    for column in COLUMNS:
+        path = column_path(month_dir, column)
+        sizes.add(path.stat().st_size if path.exists() else 0)
+    if len(sizes) != 1 or 0 in sizes:
+        return None
+
+    row = []
+    for column in COLUMNS:
+        with open(column_path(month_dir, column), "rb") as f:
+            f.seek(-ITEM_SIZE, os.SEEK_END)
+            row.append(array("I", f.read(ITEM_SIZE))[0])
+    return tuple(row)
+
+
+def add_dwell(month_dir: Path, key: int, app: str, title: str, seconds: int) -> None:
+    """
+    滞在時間を加算(直前の行と同じキーならその行を更新、違えば行を追加)
+
+    入力:
+        month_dir - 月ごとのログディレクトリ
+        key - 時間キー
+        app, title - アプリ名・ウィンドウタイトル
+        seconds - 加算する秒数
+    """
+    app_id = get_or_add_id(month_dir, "app", app)
+    title_id = get_or_add_id(month_dir, "title", title)
+
+    last = read_last_row(month_dir)
+    if last is None:
+        # 列の長さが揃っていなければ揃えてから追記する
+        columns = load_columns(month_dir)
+        for column in COLUMNS:
+            path = column_path(month_dir, column)
+            if path.exists() and path.stat().st_size != len(columns[column]) * ITEM_SIZE:
+                with open(path, "r+b") as f:
+                    f.truncate(len(columns[column]) * ITEM_SIZE)
+
+    if last and last[:3] == (key, app_id, title_id):
+        with open(column_path(month_dir, "seconds"), "r+b") as f:
+            f.seek(-ITEM_SIZE, os.SEEK_END)
+            f.write(array("I", [last[3] + seconds]).tobytes())
+        return
+
+    for column, value in zip(COLUMNS, (key, app_id, title_id, seconds)):
+        with open(column_path(month_dir, column), "ab") as f:
+            f.write(array("I", [value]).tobytes())
+
+
+def record_entry(entry: Dict, seconds: int = DEFAULT_DWELL_SECONDS) -> None:
+    """
+    ログレコード1件分の滞在時間をロールアップに反映(save_log_entry から呼び出す)
+
+    複数キャプチャモードでは1サイクルに複数レコードがあるため、
+    サイクルの先頭(最前面)のレコードだけを滞在時間として数える。
+
+    入力:
+        entry - ログレコード
+        seconds - 1レコードあたりの秒数
+    """
+    global _last_cycle_id
+    cycle_id = entry.get("cycle_id")
+    if cycle_id:
+        if cycle_id == _last_cycle_id:
+            return
+        _last_cycle_id = cycle_id
+
+    ts = datetime.fromisoformat(entry["timestamp"])
+    month_dir = LOGS_DIR / ts.strftime("%Y") / ts.strftime("%m")
+    month_dir.mkdir(parents=True, exist_ok=True)
+    add_dwell(
+        month_dir,
+        hour_key(ts),
+        entry.get("application", ""),
+        entry.get("window_title", ""),
+        seconds,
+    )
+
+
+def rebuild_month(month_dir: Path, seconds: int = DEFAULT_DWELL_SECONDS) -> int:
+    """
+    月ごとのロールアップを activity ログから作り直す
+
+    入力:
+        month_dir - 月ごとのログディレクトリ
+        seconds - 1レコードあたりの秒数
+    出力: 作成した行数
+    """
+    totals: Dict[Tuple[int, str, str], int] = {}
+    for log_file in sorted(month_dir.glob("activity_*.jsonl")):
+        last_cycle = None
+        for entry in read_jsonl(log_file):
+            cycle_id = entry.get("cycle_id")
+            if cycle_id:
+                if cycle_id == last_cycle:
+                    continue
+                last_cycle = cycle_id
+            try:
+                ts = datetime.fromisoformat(entry["timestamp"])
+            except (KeyError, ValueError):
+                continue
+            key = (hour_key(ts), entry.get("application", ""), entry.get("window_title", ""))
+            totals[key] = totals.get(key, 0) + seconds
+
+    values: Dict[str, List[str]] = {"app": [], "title": []}
+    index: Dict[str, Dict[str, int]] = {"app": {}, "title": {}}
+    columns = {column: array("I") for column in COLUMNS}
+    for (key, app, title), total in sorted(totals.items()):
+        ids = []
+        for kind, value in (("app", app), ("title", title)):
+            if value not in index[kind]:
+                index[kind][value] = len(values[kind])
+                values[kind].append(value)
+            ids.append(index[kind][value])
+        for column, value in zip(COLUMNS, (key, ids[0], ids[1], total)):
+            columns[column].append(value)
+
+    with log_write_lock():
+        dict_tmp = dictionary_path(month_dir).with_suffix(".tmp")
+        with open(dict_tmp, "w", encoding="utf-8") as f:
+            for kind in ("app", "title"):
+                for i, value in enumerate(values[kind]):
+                    json.dump({"kind": kind, "id": i, "value": value}, f, ensure_ascii=False)
+                    f.write("\n")
+        # 列を先に空にしてから辞書を差し替え、最後に列を書き込む
+        for column in COLUMNS:
+            column_path(month_dir, column).unlink(missing_ok=True)
+        os.replace(dict_tmp, dictionary_path(month_dir))
+        for column in COLUMNS:
+            tmp = column_path(month_dir, column).with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                columns[column].tofile(f)
+            os.replace(tmp, column_path(month_dir, column))
+
+    return len(columns["hour"])
+
+
+def iter_month_dirs(date_from: datetime, date_to: datetime) -> Iterator[Path]:
+    """期間に含まれる月ごとのログディレクトリを列挙"""
+    month = date_from.replace(day=1)
+    while month <= date_to:
+        month_dir = LOGS_DIR / month.strftime("%Y") / month.strftime("%m")
+        if month_dir.exists():
+            yield month_dir
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def aggregate(
+    date_from: datetime,
+    date_to: datetime,
+    by: str = "app",
+    app_filter: Optional[str] = None,
+    per_day: bool = False,
+) -> Dict[Tuple, int]:
+    """
+    期間内の滞在時間を集計
+
+    入力:
+        date_from, date_to - 期間(両端の日を含む)
+        by - "app" または "title" で集計
+        app_filter - アプリ名で絞り込み(部分一致、大文字小文字を区別しない)
+        per_day - Trueの場合は日ごとに分けて集計
+    出力: {(日付文字列 or "", キー): 秒数}
+    """
+    start_key = hour_key(date_from.replace(hour=0))
+    end_key = hour_key(date_to.replace(hour=0)) + 24
+
+    totals: Dict[Tuple, int] = {}
+    for month_dir in iter_month_dirs(date_from, date_to):
+        values, _ = load_dictionary(month_dir)
+        columns = load_columns(month_dir)
+        apps = values["app"]
+        titles = values["title"]
+
+        allowed_apps = None
+        if app_filter:
+            needle = app_filter.lower()
+            allowed_apps = {i for i, name in enumerate(apps) if needle in name.lower()}
+
+        for key, app_id, title_id, seconds in zip(
+            columns["hour"], columns["app"], columns["title"], columns["seconds"]
+        ):
+            if key < start_key or key >= end_key:
+                continue
+            if allowed_apps is not None and app_id not in allowed_apps:
+                continue
+            day = datetime.fromordinal(key // 24).strftime("%Y-%m-%d") if per_day else ""
+            app = apps[app_id] if app_id < len(apps) else UNKNOWN_NAME
+            name = app if by == "app" else f"{app} - {titles[title_id] if title_id < len(titles) else UNKNOWN_NAME}"
+            totals[(day, name)] = totals.get((day, name), 0) + seconds
+
+    return totals
+
+
+def print_totals(totals: Dict[Tuple, int], limit: int) -> None:
+    """集計結果を時間の多い順に表示"""
+    if not totals:
+        print("No activity recorded in this period.")
+        return
+
+    days = sorted({day for day, _ in totals})
+    for day in days:
+        if day:
+            print(f"\n{day}")
+        rows = sorted(
+            ((name, sec) for (d, name), sec in totals.items() if d == day),
+            key=lambda row: row[1],
+            reverse=True,
+        )
+        total = sum(sec for _, sec in rows)
+        for name, sec in rows[:limit]:
+            print(f"  {sec / 3600:7.2f}h  {sec / total * 100:5.1f}%  {name}")
+        print(f"  {total / 3600:7.2f}h  total")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="アプリ別・ウィンドウタイトル別の作業時間を集計します"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser("report", help="期間内の作業時間を集計して表示")
+    report_parser.add_argument(
+        "--from", dest="date_from", help="開始日 (YYYY-MM-DD、デフォルト: 今月1日)"
+    )
+    report_parser.add_argument(
+        "--to", dest="date_to", help="終了日 (YYYY-MM-DD、デフォルト: 今日)"
+    )
+    report_parser.add_argument("--by", choices=["app", "title"], default="app", help="集計単位")
+    report_parser.add_argument("--app", help="アプリ名で絞り込み(部分一致)")
+    report_parser.add_argument("--daily", action="store_true", help="日ごとに表示")
+    report_parser.add_argument("--limit", type=int, default=20, help="表示する最大件数")
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="activityログからロールアップを作り直す")
+    rebuild_parser.add_argument("--month", help="対象月 (YYYY-MM、デフォルト: 全期間)")
+
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        if args.month:
+            month_dirs = [LOGS_DIR / args.month.replace("-", "/")]
+        else:
+            month_dirs = sorted(LOGS_DIR.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]"))
+        for month_dir in month_dirs:
+            rows = rebuild_month(month_dir)
+            print(f"  ✓ {month_dir}: {rows} rows")
+    else:
+        today = datetime.now()
+        date_from = (
+            datetime.strptime(args.date_from, "%Y-%m-%d")
+            if args.date_from
+            else today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        )
+        date_to = (
+            datetime.strptime(args.date_to, "%Y-%m-%d")
+            if args.date_to
+            else today.replace(hour=0, minute=0, second=0, microsecond=0)
+        )
+
+        start = time.perf_counter()
+        totals = aggregate(date_from, date_to, args.by, args.app, args.daily)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        print(f"{date_from.strftime('%Y-%m-%d')} 〜 {date_to.strftime('%Y-%m-%d')}")
+        print_totals(totals, args.limit)
+        print(f"\n({elapsed:.1f}ms)")
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Search Index for macOS Activity Logger
+
+activity ログ(OCRテキスト・ウィンドウタイトル)と hourly summary を
+SQLite FTS5 で全文検索できるようにします。
+
+取り込みはファイルごとの読み込み位置(オフセット)を記録して差分のみ行うため、
+毎時の更新はほぼ追記分の処理だけで済みます。
+"""
+
+import re
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from log_store import LOGS_DIR
+
+# Configuration
+INDEX_PATH = LOGS_DIR / "search_index.sqlite3"
+SNIPPET_TOKENS = 32
+LOG_FILE_PATTERN = re.compile(r"(activity|hourly_summary)_(\d{4}-\d{2}-\d{2})\.jsonl$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    app TEXT NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries (ts);
+CREATE INDEX IF NOT EXISTS entries_source ON entries (source);
+CREATE TABLE IF NOT EXISTS ingest_state (
+    source TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+"""
+
+
+def connect(index_path: Path = INDEX_PATH) -> sqlite3.Connection:
+    """
+    検索インデックスに接続(未作成ならスキーマを作成)
+
+    日本語のOCRテキストは空白で区切られないため、trigramトークナイザを使用する。
+
+    入力: index_path - インデックスファイルのパス
+    出力: sqlite3.Connection
+    """
+    conn = sqlite3.connect(index_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts "
+        "USING fts5(title, body, tokenize='trigram')"
+    )
+    return conn
+
+
+def list_log_files(logs_dir: Path = LOGS_DIR) -> List[Path]:
+    """
+    インデックス対象のログファイルを列挙
+
+    入力: logs_dir - ログディレクトリ
+    出力: activity / hourly_summary のJSONLファイルのリスト
+    """
+    return sorted(
+        p
+        for p in logs_dir.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9]/*.jsonl")
+        if LOG_FILE_PATTERN.search(p.name)
+    )
+
+
+def to_document(kind: str, entry: Dict) -> Optional[Dict[str, str]]:
+    """
+    ログレコードを検索用のドキュメントに変換
+
+    入力:
+        kind - "activity" または "hourly_summary"
+        entry - ログレコード
+    出力: {"ts", "app", "title", "body"}、変換できない場合はNone
+    """
+    if "timestamp" not in entry:
+        return None
+    if kind == "activity":
+        return {
+            "ts": entry["timestamp"],
+            "app": entry.get("application", ""),
+            "title": entry.get("window_title", ""),
+            "body": entry.get("ocr_text", ""),
+        }
+    return {
+        "ts": entry["timestamp"],
+        "app": "",
+        "title": f"Hourly summary {entry.get('hour', '')}",
+        "body": entry.get("summary", ""),
+    }
+
+
+def remove_source(conn: sqlite3.Connection, source: str) -> None:
+    """
+    指定ファイル由来のドキュメントをインデックスから削除
+
+    入力:
+        conn - インデックスへの接続
+        source - ログファイルパス
+    """
+    conn.execute(
+        "DELETE FROM entries_fts WHERE rowid IN (SELECT id FROM entries WHERE source = ?)",
+        (source,),
+    )
+    conn.execute("DELETE FROM entries WHERE source = ?", (source,))
+    conn.execute("DELETE FROM ingest_state WHERE source = ?", (source,))
+
+
+def ingest_file(conn: sqlite3.Connection, path: Path) -> int:
+    """
+    ログファイルの未取り込み部分をインデックスに追加
+
+    ファイルが書き換えられた場合(OCRのバックフィルや保持ポリシーの適用など)は
+    inodeの変化またはサイズの縮小で検出し、そのファイルを取り込み直す。
+
+    入力:
+        conn - インデックスへの接続
+        path - ログファイル
+    出力: 追加したドキュメント数
+    """
+    source = str(path)
+    kind = LOG_FILE_PATTERN.search(path.name).group(1)
+    stat = path.stat()
+
+    row = conn.execute(
+        "SELECT inode, offset FROM ingest_state WHERE source = ?", (source,)
+    ).fetchone()
+    offset = 0
+    if row:
+        inode, offset = row
+        if inode != stat.st_ino or stat.st_size < offset:
+            remove_source(conn, source)
+            offset = 0
+        elif stat.st_size == offset:
+            return 0
+
+    added = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for raw_line in f:
+            # 書き込み途中の最終行は次回に回す
+            if not raw_line.endswith(b"\n"):
+                break
+            offset += len(raw_line)
+            try:
+                doc = to_document(kind, json.loads(raw_line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if not doc:
+                continue
+            cursor = conn.execute(
+                "INSERT INTO entries (kind, ts, app, source) VALUES (?, ?, ?, ?)",
+                (kind, doc["ts"], doc["app"], source),
+            )
+            conn.execute(
+                "INSERT INTO entries_fts (rowid, title, body) VALUES (?, ?, ?)",
+                (cursor.lastrowid, doc["title"], doc["body"]),
+            )
+            added += 1
+
+    conn.execute(
+        "INSERT OR REPLACE INTO ingest_state (source, inode, offset) VALUES (?, ?, ?)",
+        (source, stat.st_ino, offset),
+    )
+    return added
+
+
+def update_index(logs_dir: Path = LOGS_DIR, index_path: Path = INDEX_PATH) -> int:
+    """
+    全ログファイルの差分をインデックスに取り込む
+
+    ファイルごとにコミットするため、中断しても次回は続きから取り込む。
+
+    入力:
+        logs_dir - ログディレクトリ
+        index_path - インデックスファイルのパス
+    出力: 追加したドキュメント数
+    """
+    conn = connect(index_path)
+    total = 0
+    try:
+        files = list_log_files(logs_dir)
+        known = {source for (source,) in conn.execute("SELECT source FROM ingest_state")}
+        # 削除されたログ(保持ポリシー等)のドキュメントを除去
+        for source in known - {str(p) for p in files}:
+            with conn:
+                remove_source(conn, source)
+        for path in files:
+            with conn:
+                total += ingest_file(conn, path)
+    finally:
+        conn.close()
+    return total
+
+
+def build_match_query(query: str) -> tuple[str, List[str]]:
+    """
+    検索語をFTS5のMATCH式に変換
+
+    trigramは3文字未満の語を検索できないため、短い語はLIKE検索に回す。
+
+    入力: query - 空白区切りの検索語
+    出力: (MATCH式, LIKE検索する短い語のリスト)
+    """
+    phrases = []
+    short_terms = []
+    for term in query.split():
+        if len(term) < 3:
+            short_terms.append(term)
+        else:
+            phrases.append('"' + term.replace('"', '""') + '"')
+    return " AND ".join(phrases), short_terms
+
+
+def search(
+    query: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    app: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 20,
+    index_path: Path = INDEX_PATH,
+) -> List[Dict]:
+    """
+    インデックスを検索
+
+    入力:
+        query - 検索語(空白区切りでAND検索)
+        date_from, date_to - 期間(YYYY-MM-DD、両端を含む)
+        app - アプリ名(部分一致)
+        kind - "activity" または "hourly_summary"
+        limit - 最大件数
+        index_path - インデックスファイルのパス
+    出力: [{"ts", "kind", "app", "title", "snippet"}] 新しい順
+    """
+    match_expr, short_terms = build_match_query(query)
+    conditions = []
+    params: List = []
+
+    if match_expr:
+        conditions.append("entries_fts MATCH ?")
+        params.append(match_expr)
+    for term in short_terms:
+        conditions.append("(entries_fts.title LIKE ? OR entries_fts.body LIKE ?)")
+        params += [f"%{term}%", f"%{term}%"]
+    if date_from:
+        conditions.append("e.ts >= ?")
+        params.append(date_from)
+    if date_to:
+        next_day = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        conditions.append("e.ts < ?")
+        params.append(next_day.strftime("%Y-%m-%d"))
+    if app:
+        conditions.append("e.app LIKE ?")
+        params.append(f"%{app}%")
+    if kind:
+        conditions.append("e.kind = ?")
+        params.append(kind)
+
+    where = " AND ".join(conditions) if conditions else "1"
+    if match_expr:
+        snippet_expr = f"snippet(entries_fts, 1, '[', ']', '…', {SNIPPET_TOKENS})"
+        match_filter = " AND entries_fts MATCH ?"
+    else:
+        # MATCHがない場合はsnippet()が使えないため本文の先頭を表示する
+        snippet_expr = "substr(entries_fts.body, 1, 120)"
+        match_filter = ""
+    # snippet() は重いため、絞り込み・並べ替え後の上位limit件だけで計算する
+    sql = f"""
+        WITH hits AS (
+            SELECT entries_fts.rowid AS id
+            FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+            WHERE {where}
+            ORDER BY e.ts DESC
+            LIMIT ?
+        )
+        SELECT e.ts, e.kind, e.app, entries_fts.title, {snippet_expr}
+        FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+        WHERE entries_fts.rowid IN (SELECT id FROM hits){match_filter}
+        ORDER BY e.ts DESC
+    """
+    params.append(limit)
+    if match_expr:
+        params.append(match_expr)
+
+    conn = connect(index_path)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    return [
+        {"ts": ts, "kind": kind_, "app": app_, "title": title, "snippet": snippet}
+        for ts, kind_, app_, title, snippet in rows
+    ]
+
+
+def print_results(results: List[Dict]) -> None:
+    """検索結果を表示"""
+    if not results:
+        print("No results found.")
+        return
+    for r in results:
+        ts = r["ts"][:16].replace("T", " ")
+        label = r["app"] or "summary"
+        print(f"{ts}  [{label}] {r['title']}")
+        if r["snippet"]:
+            print(f"    {' '.join(r['snippet'].split())}")
+
+
+def run_benchmark(days: int, records_per_day: int) -> None:
+    """
+    合成データで取り込み・検索の性能を計測
+
+    入力:
+        days - 生成する日数
+        records_per_day - 1日あたりのactivityレコード数
+    """
+    apps = ["Slack", "Code", "Google Chrome", "Terminal", "Notion", "Zoom"]
+    words = ["デプロイ", "レビュー", "障害対応", "設計", "ミーティング", "テスト", "リリース", "調査"]
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory(prefix="maclogger_search_bench_") as tmp:
+        logs_dir = Path(tmp) / "logs"
+        index_path = Path(tmp) / "index.sqlite3"
+
+        start = time.perf_counter()
+        first_day = datetime(2025, 1, 1, 9)
+        for d in range(days):
+            day = first_day + timedelta(days=d)
+            month_dir = logs_dir / day.strftime("%Y") / day.strftime("%m")
+            month_dir.mkdir(parents=True, exist_ok=True)
+            with open(month_dir / f"activity_{day.strftime('%Y-%m-%d')}.jsonl", "w", encoding="utf-8") as f:
+                for i in range(records_per_day):
+                    ocr = " ".join(rng.choice(words) for _ in range(40))
+                    f.write(json.dumps({
+                        "timestamp": (day + timedelta(minutes=i)).isoformat(),
+                        "application": rng.choice(apps),
+                        "window_title": f"PROJ-{rng.randint(1, 2000)} {rng.choice(words)}",
+                        "ocr_text": ocr,
+                    }, ensure_ascii=False) + "\n")
+            with open(month_dir / f"hourly_summary_{day.strftime('%Y-%m-%d')}.jsonl", "w", encoding="utf-8") as f:
+                for h in range(8):
+                    f.write(json.dumps({
+                        "timestamp": (day + timedelta(hours=h)).isoformat(),
+                        "hour": f"{9 + h:02d}:00",
+                        "summary": " ".join(rng.choice(words) for _ in range(30)),
+                    }, ensure_ascii=False) + "\n")
+        print(f"Generated {days} days x {records_per_day} records in {time.perf_counter() - start:.1f}s")
+
+        start = time.perf_counter()
+        added = update_index(logs_dir, index_path)
+        print(f"Initial ingest: {added} docs in {time.perf_counter() - start:.1f}s")
+
+        # 1時間分の追記を取り込むコスト
+        last_day = first_day + timedelta(days=days - 1)
+        last_file = logs_dir / last_day.strftime("%Y/%m") / f"activity_{last_day.strftime('%Y-%m-%d')}.jsonl"
+        with open(last_file, "a", encoding="utf-8") as f:
+            for i in range(60):
+                f.write(json.dumps({
+                    "timestamp": (last_day + timedelta(hours=12, minutes=i)).isoformat(),
+                    "application": "Code",
+                    "window_title": "PROJ-9999",
+                    "ocr_text": "追加分",
+                }, ensure_ascii=False) + "\n")
+        start = time.perf_counter()
+        added = update_index(logs_dir, index_path)
+        print(f"Hourly update:  {added} docs in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        queries = [
+            ("PROJ-1234", {}),
+            ("障害対応", {"app": "Slack"}),
+            ("デプロイ レビュー", {"date_from": "2025-06-01", "date_to": "2025-06-30"}),
+            ("リリース", {"kind": "hourly_summary"}),
+        ]
+        for q, filters in queries:
+            timings = []
+            for _ in range(20):
+                start = time.perf_counter()
+                search(q, index_path=index_path, **filters)
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"Query {q!r} {filters}: p50 {timings[10]:.1f}ms, p95 {timings[18]:.1f}ms")
+
+        print(f"Index size: {index_path.stat().st_size / 1024 / 1024:.0f}MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="OCRテキスト・ウィンドウタイトル・hourly summaryを全文検索します"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("update", help="インデックスを差分更新")
+
+    search_parser = subparsers.add_parser("search", help="検索(実行前にインデックスを差分更新)")
+    search_parser.add_argument("query", help="検索語(空白区切りでAND検索)")
+    search_parser.add_argument("--from", dest="date_from", help="開始日 (YYYY-MM-DD)")
+    search_parser.add_argument("--to", dest="date_to", help="終了日 (YYYY-MM-DD)")
+    search_parser.add_argument("--app", help="アプリ名で絞り込み(部分一致)")
+    search_parser.add_argument(
+        "--kind", choices=["activity", "hourly_summary"], help="ログの種類で絞り込み"
+    )
+    search_parser.add_argument("--limit", type=int, default=20, help="最大件数")
+
+    bench_parser = subparsers.add_parser("bench", help="合成データで性能を計測")
+    bench_parser.add_argument("--days", type=int, default=365)
+    bench_parser.add_argument("--records-per-day", type=int, default=480)
+
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        run_benchmark(args.days, args.records_per_day)
+    elif args.command == "update":
+        print(f"Indexed {update_index()} new document(s).")
+    else:
+        update_index()
+        print_results(
+            search(
+                args.query,
+                date_from=args.date_from,
+                date_to=args.date_to,
+                app=args.app,
+                kind=args.kind,
+                limit=args.limit,
+            )
+        )
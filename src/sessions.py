@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Session Segmentation for macOS Activity Logger
+
+1分ごとのキャプチャを、同じアプリで連続した作業のまとまり(セッション)に分割し、
+logs/YYYY/MM/sessions_YYYY-MM-DD.jsonl に保存します。
+
+- 1セッション = 開始・終了時刻、アプリ、ウィンドウタイトルの一覧、キャプチャ数、
+  タイトルの切り替え回数、重複を除いたOCRテキスト
+- 複数キャプチャモードでは最前面のレコードで区切り、同じサイクルの他のウィンドウ・ディスプレイは
+  other_windows とOCRテキストとしてセッションに含める
+- アプリが変わったとき、記録が SESSION_GAP_SECONDS 以上途切れたとき、正時をまたいだときに区切る
+  (正時で区切るため、毎時の要約はその時間帯のセッションだけを読めばよい)
+- activity ログは前回の読み込み位置から追記分だけを読み、終了していないセッションは
+  状態ファイルに保存して次回に続きから処理する
+
+毎時の要約と日報は、生の1分ごとのレコードの代わりにこのファイルを使います。
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from log_store import LOGS_DIR, log_write_lock
+from rollups import DEFAULT_DWELL_SECONDS
+
+# Load environment variables
+load_dotenv()
+
+# Configuration
+SESSION_GAP_SECONDS = int(os.getenv("SESSION_GAP_SECONDS", "300"))
+SESSION_MAX_OCR_CHARS = int(os.getenv("SESSION_MAX_OCR_CHARS", "4000"))
+STATE_FILE_NAME = ".sessions_state.json"
+SESSIONS_VERSION = 2  # 形式を変えたら上げる(古いセッションファイルは作り直される)
+
+
+def get_sessions_file(day: str) -> Path:
+    """指定日(YYYY-MM-DD)のセッションファイルのパス"""
+    return LOGS_DIR / day[:4] / day[5:7] / f"sessions_{day}.jsonl"
+
+
+def get_activity_file(day: str) -> Path:
+    """指定日(YYYY-MM-DD)の activity ログのパス"""
+    return LOGS_DIR / day[:4] / day[5:7] / f"activity_{day}.jsonl"
+
+
+class SessionSegmenter:
+    """
+    レコードを1件ずつ受け取り、終了したセッションを返すストリーミング分割器
+
+    複数Macを集約したログではホストごとにセッションを持つ。
+    途中の状態(終了していないセッション)は to_state() / 引数の state で引き継げる。
+    """
+
+    def __init__(self, state: Optional[Dict] = None):
+        state = state or {}
+        self.open: Dict[str, Dict] = state.get("open", {})
+        self.last_cycle: Dict[str, str] = state.get("last_cycle", {})
+
+    def to_state(self) -> Dict:
+        return {"open": self.open, "last_cycle": self.last_cycle}
+
+    def add(self, entry: Dict) -> List[Dict]:
+        """
+        レコードを追加
+
+        入力: entry - activity ログのレコード
+        出力: このレコードによって終了したセッションのリスト
+        """
+        if "timestamp" not in entry:
+            return []
+        host = entry.get("host", "")
+
+        # 複数キャプチャモードでは同じサイクルの先頭(最前面)のレコードだけで区切り、
+        # 2件目以降(背面のウィンドウ・他のディスプレイ)はタイトルとOCRテキストだけを合流させる
+        cycle_id = entry.get("cycle_id")
+        if cycle_id:
+            if self.last_cycle.get(host) == cycle_id:
+                current = self.open.get(host)
+                if current is not None:
+                    merge_other_window(current, entry)
+                return []
+            self.last_cycle[host] = cycle_id
+
+        ts = datetime.fromisoformat(entry["timestamp"])
+        application = entry.get("application", "")
+        title = entry.get("window_title", "")
+        current = self.open.get(host)
+
+        closed = []
+        if current is not None:
+            last = datetime.fromisoformat(current["end"])
+            start = datetime.fromisoformat(current["start"])
+            if (
+                current["application"] != application
+                or (ts - last).total_seconds() > SESSION_GAP_SECONDS
+                or ts.replace(minute=0, second=0, microsecond=0)
+                != start.replace(minute=0, second=0, microsecond=0)
+            ):
+                closed.append(finalize_session(current))
+                current = None
+
+        if current is None:
+            current = {
+                "start": entry["timestamp"],
+                "end": entry["timestamp"],
+                "application": application,
+                "window_titles": [title] if title else [],
+                "last_title": title,
+                "captures": 0,
+                "switches": 0,
+                "other_windows": [],
+                "ocr_lines": [],
+                "ocr_chars": 0,
+            }
+            if host:
+                current["host"] = host
+            self.open[host] = current
+
+        current["end"] = entry["timestamp"]
+        current["captures"] += 1
+        if title != current["last_title"]:
+            current["switches"] += 1
+            current["last_title"] = title
+            if title and title not in current["window_titles"]:
+                current["window_titles"].append(title)
+        merge_ocr_lines(current, entry.get("ocr_text", ""))
+        return closed
+
+    def flush(self) -> List[Dict]:
+        """終了していないセッションも含めて全て返す(状態は変更しない)"""
+        return [finalize_session(session) for session in self.open.values()]
+
+
+def merge_other_window(session: Dict, entry: Dict) -> None:
+    """
+    同じサイクルの2件目以降のレコード(同時に表示していたウィンドウ)をセッションに合流
+
+    キャプチャ数・作業時間・切り替え回数には数えず、ウィンドウ名とOCRテキストだけを追加する。
+
+    入力:
+        session - 終了していないセッション(更新される)
+        entry - 同じサイクルの2件目以降のレコード
+    """
+    application = entry.get("application", "")
+    title = entry.get("window_title", "")
+    name = f"{application} - {title}" if title else application
+    other_windows = session.setdefault("other_windows", [])
+    if name and name not in other_windows:
+        other_windows.append(name)
+    merge_ocr_lines(session, entry.get("ocr_text", ""))
+
+
+def merge_ocr_lines(session: Dict, ocr_text: str) -> None:
+    """
+    OCRテキストのうち、セッション内でまだ出てきていない行だけを追加
+
+    同じウィンドウの連続したキャプチャはほとんどの行が共通なので、重複を除くと大きく縮む。
+
+    入力:
+        session - 終了していないセッション(更新される)
+        ocr_text - 追加するOCRテキスト
+    """
+    if not ocr_text or session["ocr_chars"] >= SESSION_MAX_OCR_CHARS:
+        return
+    seen = set(session["ocr_lines"])
+    for line in ocr_text.splitlines():
+        line = line.strip()
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        session["ocr_lines"].append(line)
+        session["ocr_chars"] += len(line) + 1
+        if session["ocr_chars"] >= SESSION_MAX_OCR_CHARS:
+            break
+
+
+def finalize_session(session: Dict) -> Dict:
+    """
+    終了していないセッションを保存用の形式に変換
+
+    入力: session - SessionSegmenter 内部のセッション
+    出力: {"start", "end", "application", "window_titles", "captures", "switches",
+           "other_windows", "seconds", "ocr_text"(, "host")}
+    """
+    record = {
+        "start": session["start"],
+        "end": session["end"],
+        "application": session["application"],
+        "window_titles": session["window_titles"],
+        "captures": session["captures"],
+        "switches": session["switches"],
+        "other_windows": session.get("other_windows", []),
+        "seconds": session["captures"] * DEFAULT_DWELL_SECONDS,
+        "ocr_text": "\n".join(session["ocr_lines"]),
+    }
+    if "host" in session:
+        record["host"] = session["host"]
+    return record
+
+
+def load_state(month_dir: Path) -> Dict[str, Dict]:
+    path = month_dir / STATE_FILE_NAME
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(month_dir: Path, state: Dict[str, Dict]) -> None:
+    path = month_dir / STATE_FILE_NAME
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def update_sessions(day: str) -> Optional[Dict]:
+    """
+    指定日のセッションファイルを activity ログの追記分まで更新
+
+    activity ログが書き換えられた場合(OCRのバックフィル・保持ポリシー)は作り直す。
+
+    入力: day - YYYY-MM-DD形式の日付
+    出力: この日の分割器の状態(終了していないセッションを含む)、activity ログがなければNone
+    """
+    activity_file = get_activity_file(day)
+    sessions_file = get_sessions_file(day)
+    month_dir = activity_file.parent
+
+    with log_write_lock():
+        if not activity_file.exists():
+            return None
+        stat = activity_file.stat()
+        state = load_state(month_dir)
+        day_state = state.get(day)
+        if (
+            not day_state
+            or day_state["inode"] != stat.st_ino
+            or day_state["offset"] > stat.st_size
+            or day_state.get("version") != SESSIONS_VERSION
+            or not sessions_file.exists()
+        ):
+            day_state = {"version": SESSIONS_VERSION, "inode": stat.st_ino, "offset": 0, "segmenter": {}}
+            sessions_file.unlink(missing_ok=True)
+        if day_state["offset"] == stat.st_size:
+            return day_state["segmenter"]
+
+        segmenter = SessionSegmenter(day_state["segmenter"])
+        with open(activity_file, "rb") as f:
+            f.seek(day_state["offset"])
+            data = f.read(stat.st_size - day_state["offset"])
+        # 書き込み途中の最終行は次回に回す
+        complete = data[: data.rfind(b"\n") + 1]
+
+        closed = []
+        for line in complete.decode("utf-8", errors="replace").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                closed.extend(segmenter.add(json.loads(line)))
+            except (json.JSONDecodeError, ValueError):
+                continue
+
+        if closed or not sessions_file.exists():
+            with open(sessions_file, "a", encoding="utf-8") as f:
+                for session in closed:
+                    json.dump(session, f, ensure_ascii=False)
+                    f.write("\n")
+
+        day_state["offset"] += len(complete)
+        day_state["segmenter"] = segmenter.to_state()
+        state[day] = day_state
+        save_state(month_dir, state)
+        return day_state["segmenter"]
+
+
+def load_sessions(
+    day: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+) -> List[Dict]:
+    """
+    指定日のセッションを取得(記録中の日は終了していないセッションも含む)
+
+    入力:
+        day - YYYY-MM-DD形式の日付
+        start / end - この範囲 [start, end) に開始したセッションだけを返す
+    出力: 開始時刻順のセッションのリスト
+    """
+    segmenter_state = update_sessions(day)
+    sessions_file = get_sessions_file(day)
+    sessions = []
+    if sessions_file.exists():
+        with open(sessions_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        sessions.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+    if segmenter_state:
+        sessions.extend(SessionSegmenter(segmenter_state).flush())
+
+    sessions.sort(key=lambda s: s["start"])
+    return [
+        s
+        for s in sessions
+        if (start is None or datetime.fromisoformat(s["start"]) >= start)
+        and (end is None or datetime.fromisoformat(s["start"]) < end)
+    ]
+
+
+def remove_sessions(activity_file: Path) -> None:
+    """
+    activity ログに対応するセッションファイルと状態を削除(ロック取得済みであることが前提)
+
+    保持ポリシーで activity ログを書き換え・削除したときに、古いOCRテキストを含む
+    セッションファイルが残らないようにする。必要になれば activity ログから作り直される。
+
+    入力: activity_file - activity ログ
+    """
+    day = activity_file.stem.split("_", 1)[1]
+    (activity_file.parent / f"sessions_{day}.jsonl").unlink(missing_ok=True)
+    state = load_state(activity_file.parent)
+    if state.pop(day, None) is not None:
+        save_state(activity_file.parent, state)
+
+
+def format_session_line(session: Dict, with_ocr: bool = False) -> str:
+    """
+    セッションをプロンプト・表示用の1行に整形
+
+    入力:
+        session - セッション
+        with_ocr - TrueならOCRテキストも含める
+    出力: "[10:02-10:25] Code (24分, 切替3回) タイトル1 / タイトル2 [同時に表示: Safari - 資料]: OCRテキスト"
+    """
+    start = datetime.fromisoformat(session["start"])
+    end = datetime.fromisoformat(session["end"]) + timedelta(seconds=DEFAULT_DWELL_SECONDS)
+    minutes = session["seconds"] // 60
+    host = f" @{session['host']}" if session.get("host") else ""
+    line = (
+        f"[{start.strftime('%H:%M')}-{end.strftime('%H:%M')}] {session['application']}{host} "
+        f"({minutes}分, 切替{session['switches']}回) {' / '.join(session['window_titles'])}"
+    )
+    if session.get("other_windows"):
+        line += f" [同時に表示: {' / '.join(session['other_windows'])}]"
+    if with_ocr and session.get("ocr_text"):
+        line += ": " + session["ocr_text"].replace("\n", " ")
+    return line
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="activityログを作業セッションに分割して表示します"
+    )
+    parser.add_argument(
+        "--date",
+        help="対象日 (YYYY-MM-DD形式、デフォルト: 今日)",
+        default=datetime.now().strftime("%Y-%m-%d"),
+    )
+    parser.add_argument("--ocr", action="store_true", help="OCRテキストも表示")
+    parser.add_argument("--rebuild", action="store_true", help="セッションファイルを作り直す")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        with log_write_lock():
+            remove_sessions(get_activity_file(args.date))
+
+    sessions = load_sessions(args.date)
+    if not sessions:
+        print(f"No sessions found for {args.date}.")
+    for session in sessions:
+        print(format_session_line(session, with_ocr=args.ocr))
+
+    activity_file = get_activity_file(args.date)
+    sessions_file = get_sessions_file(args.date)
+    if activity_file.exists() and sessions_file.exists():
+        print(
+            f"\n{sum(s['captures'] for s in sessions)} captures → {len(sessions)} sessions "
+            f"({activity_file.stat().st_size:,} → {sessions_file.stat().st_size:,} bytes)"
+        )
@@ -0,0 +1,82 @@
+"""
+capture_sources の並列キャプチャを、実機のQuartzの代わりに偽のソースで確認するテスト
+"""
+
+from typing import Dict, List
+
+import capture_sources
+import maclogger
+from capture_sources import CaptureSource, CaptureTarget, DisplaySource, run_capture_cycle
+
+
+class FakeSource(CaptureSource):
+    """固定のウィンドウ一覧を返すソース"""
+
+    def __init__(self, targets: List[CaptureTarget]):
+        self.targets = targets
+
+    def list_targets(self) -> List[CaptureTarget]:
+        return list(self.targets)
+
+
+def fake_targets() -> List[CaptureTarget]:
+    return [
+        CaptureTarget(kind="window", target_id="101", application="Code", window_title="main.py"),
+        CaptureTarget(kind="window", target_id="102", application="Safari", window_title="Python docs"),
+        CaptureTarget(kind="window", target_id="103", application="Slack", window_title="general"),
+    ]
+
+
+def patch_capture(monkeypatch) -> List[Dict]:
+    """スクリーンショット・OCR・保存を偽物に差し替え、保存されたエントリを返すリストを用意"""
+    saved: List[Dict] = []
+    monkeypatch.setattr(maclogger, "DEFERRED_OCR", False)
+    monkeypatch.setattr(maclogger, "capture_screenshot", lambda *args, **kwargs: True)
+    monkeypatch.setattr(maclogger, "perform_ocr", lambda image_path: f"text of {image_path}")
+    monkeypatch.setattr(maclogger, "save_log_entry", lambda entry: saved.append(entry) or "activity.jsonl")
+    return saved
+
+
+def test_run_capture_cycle_keeps_order_and_skips_failures():
+    def process(index: int, target: CaptureTarget):
+        if target.target_id == "102":
+            raise RuntimeError("capture failed")
+        return (index, target.application)
+
+    results = run_capture_cycle(FakeSource(fake_targets()), process, max_workers=3)
+
+    assert results == [(0, "Code"), (2, "Slack")]
+
+
+def test_capture_multiple_records_share_one_cycle_id(monkeypatch):
+    saved = patch_capture(monkeypatch)
+
+    count = maclogger.capture_multiple(FakeSource(fake_targets()))
+
+    assert count == 3
+    assert [entry["application"] for entry in saved] == ["Code", "Safari", "Slack"]
+    assert len({entry["cycle_id"] for entry in saved}) == 1
+    assert [entry["capture_source"] for entry in saved] == ["window:101", "window:102", "window:103"]
+
+
+def test_display_source_skips_displays_without_user_window(monkeypatch):
+    layout = {
+        "windows": [
+            {"id": "1", "owner": "Dock", "name": "", "x": 0, "y": 1000, "width": 1920, "height": 80},
+            {"id": "2", "owner": "Code", "name": "main.py", "x": 100, "y": 100, "width": 800, "height": 600},
+        ],
+        "displays": [
+            {"index": 1, "x": 0, "y": 0, "width": 1920, "height": 1080},
+            {"index": 2, "x": 1920, "y": 0, "width": 1920, "height": 1080},
+        ],
+    }
+    monkeypatch.setattr(capture_sources, "query_screen_layout", lambda: layout)
+    saved = patch_capture(monkeypatch)
+
+    targets = DisplaySource().list_targets()
+    count = maclogger.capture_multiple(DisplaySource())
+
+    assert [(t.kind, t.target_id, t.application) for t in targets] == [("display", "1", "Code")]
+    assert count == 1
+    assert saved[0]["application"] == "Code"
+    assert saved[0]["capture_source"] == "display:1"